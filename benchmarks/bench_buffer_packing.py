@@ -0,0 +1,77 @@
+"""
+Compare building the VoxelRenderer storage buffer with struct.pack(*list)
+against the numpy header + float32 block handed to Buffer.write.
+
+usage: python benchmarks/bench_buffer_packing.py [--sizes 32 64 128] [--repeats 3]
+"""
+
+import argparse
+import tracemalloc
+from struct import pack
+from time import perf_counter
+
+import numpy as np
+
+from pyMRI.processing import ORIENTATION_MAP
+from pyMRI.rendering.volume import pack_header, orient_volume, normalised_density
+
+
+def struct_pack(voxel_data, orientation, voxel_dimensions) -> bytes:
+    orientation_shape = ORIENTATION_MAP[orientation]
+    transposed = np.einsum(f"ijk...->{orientation_shape}...", voxel_data)
+    linear_data = np.reshape(np.abs(transposed), -1, "F")
+    linear_data = linear_data / np.max(linear_data)
+    return pack(
+        f"i i i f f f {len(linear_data)}f",
+        *transposed.shape,
+        *voxel_dimensions,
+        *linear_data,
+    )
+
+
+def numpy_pack(voxel_data, orientation, voxel_dimensions):
+    # Buffer.write takes each part through the buffer protocol as is
+    volume, sizes = orient_volume(voxel_data, orientation, voxel_dimensions)
+    return pack_header(volume.shape, sizes), memoryview(normalised_density(volume))
+
+
+def measure(func, args, repeats: int) -> tuple[float, float]:
+    best = float("inf")
+    for _ in range(repeats):
+        start = perf_counter()
+        func(*args)
+        best = min(best, perf_counter() - start)
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"best of {args.repeats}")
+    print(f"{'size':>6} {'struct':>9} {'MiB':>8} {'numpy':>9} {'MiB':>8} {'speedup':>8}")
+    for size in args.sizes:
+        shape = (size,) * 3
+        voxel_data = (
+            rng.standard_normal(shape) + 1j * rng.standard_normal(shape)
+        ).astype(np.complex64)
+        call = (voxel_data, "zyx", (1.0, 1.0, 1.0))
+
+        struct_time, struct_peak = measure(struct_pack, call, args.repeats)
+        numpy_time, numpy_peak = measure(numpy_pack, call, args.repeats)
+        print(
+            f"{size:>5}³ {struct_time:>8.3f}s {struct_peak:>8.1f}"
+            f" {numpy_time:>8.3f}s {numpy_peak:>8.1f} {struct_time / numpy_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
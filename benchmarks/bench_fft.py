@@ -0,0 +1,46 @@
+"""
+Compare the available FFT backends of the FourierStep across volume sizes.
+
+usage: python benchmarks/bench_fft.py [--sizes 64 128 256] [--workers -1] [--repeats 3]
+"""
+
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from pyMRI.processing import FFTBackend
+from pyMRI.processing.fft import available_backends, fftn, resolve_workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 128, 256])
+    parser.add_argument("--workers", type=int, default=-1)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    backends = available_backends()
+    rng = np.random.default_rng(0)
+
+    print(f"3D fftn, complex64, {resolve_workers(args.workers)} workers, best of {args.repeats}")
+    print(f"{'size':>6}" + "".join(f"{FFTBackend.to_str(b):>10}" for b in backends))
+    for size in args.sizes:
+        shape = (size,) * 3
+        data = (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(
+            np.complex64
+        )
+        row = f"{size:>6}"
+        for backend in backends:
+            fftn(data, (-3, -2, -1), backend=backend, workers=args.workers)  # warm up
+            best = float("inf")
+            for _ in range(args.repeats):
+                start = perf_counter()
+                fftn(data, (-3, -2, -1), backend=backend, workers=args.workers)
+                best = min(best, perf_counter() - start)
+            row += f"{best:>9.3f}s"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
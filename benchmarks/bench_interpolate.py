@@ -0,0 +1,80 @@
+"""
+Compare the InterpolateStep's separable resampler against RegularGridInterpolator.
+
+usage: python benchmarks/bench_interpolate.py [--sizes 32 64 128] [--factor 2] [--repeats 3]
+                                              [--kernels LINEAR CUBIC LANCZOS FOURIER]
+"""
+
+import argparse
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+from pyMRI.processing import InterpolateKernel
+from pyMRI.processing.adjust import _interpolate
+
+
+def regular_grid(data, spaces, new_spaces):
+    interp = RegularGridInterpolator(spaces, data, "linear")
+    ix, iy, iz = np.meshgrid(*new_spaces, sparse=True, indexing="ij")
+    return interp((ix, iy, iz)).astype(data.dtype, copy=False)
+
+
+def measure(func, repeats, *args) -> tuple[float, int]:
+    """The best time of repeats calls and the peak memory of one."""
+    func(*args)  # warm up
+    best = float("inf")
+    for _ in range(repeats):
+        start = perf_counter()
+        func(*args)
+        best = min(best, perf_counter() - start)
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("--factor", type=int, default=2)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--kernels", nargs="+", default=["LINEAR"], choices=[k.name for k in InterpolateKernel]
+    )
+    args = parser.parse_args()
+    kernels = [InterpolateKernel[name] for name in args.kernels]
+
+    rng = np.random.default_rng(0)
+    print(f"x{args.factor} upsample, complex64, best of {args.repeats}")
+    print(
+        f"{'size':>6}{'grid':>10}{'peak':>10}"
+        + "".join(f"{InterpolateKernel.to_str(k):>10}{'peak':>10}" for k in kernels)
+        + f"{'error':>10}"
+    )
+    for size in args.sizes:
+        shape = (size,) * 3
+        data = (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(
+            np.complex64
+        )
+        spaces = [np.linspace(0, 1, size)] * 3
+        new_spaces = [np.linspace(0, 1, args.factor * size)] * 3
+
+        grid_time, grid_peak = measure(regular_grid, args.repeats, data, spaces, new_spaces)
+        row = f"{size:>6}{grid_time:>9.3f}s{grid_peak / 2**20:>8.0f}MB"
+        for kernel in kernels:
+            time, peak = measure(_interpolate, args.repeats, data, spaces, new_spaces, kernel)
+            row += f"{time:>9.3f}s{peak / 2**20:>8.0f}MB"
+        # How far the linear kernel is from RegularGridInterpolator
+        error = np.abs(
+            regular_grid(data, spaces, new_spaces) - _interpolate(data, spaces, new_spaces)
+        ).max()
+        print(row + f"{error:>10.1e}")
+
+
+if __name__ == "__main__":
+    main()
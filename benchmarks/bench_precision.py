@@ -0,0 +1,92 @@
+"""
+Compare the time and peak memory of the processing pipeline when working in
+single (complex64) and double (complex128) precision on a synthetic 3D volume.
+
+usage: python benchmarks/bench_precision.py [--size 128] [--repeats 3]
+"""
+
+import argparse
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+from pyMRI.processing import (
+    FileData,
+    Precision,
+    Unit,
+    InterpolateModes,
+    FilterStep,
+    FourierStep,
+    InterpolateStep,
+)
+
+
+def run_pipeline(data: FileData) -> dict[str, float]:
+    interpolate = InterpolateStep(None)
+    fourier = FourierStep(interpolate)
+    filtering = FilterStep(fourier)
+    with filtering.unready():
+        filtering.low_pass = True
+        filtering.low_pass_radius = data.voxel_counts[0] / 4.0
+    with fourier.unready():
+        fourier.should = True
+    with interpolate.unready():
+        interpolate.mode = InterpolateModes.DOUBLE
+
+    timings = {}
+    start = perf_counter()
+    filtered = filtering._recalculate(data)
+    timings["filter"] = perf_counter() - start
+
+    start = perf_counter()
+    transformed = fourier._recalculate(filtered)
+    timings["fourier"] = perf_counter() - start
+
+    start = perf_counter()
+    interpolate._recalculate(transformed)
+    timings["interpolate"] = perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=128)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    shape = (args.size,) * 3
+    raw = (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(
+        np.complex64
+    )
+
+    print(f"volume {shape}, best of {args.repeats}")
+    print(f"{'precision':>10} {'filter':>9} {'fourier':>9} {'interp':>9} {'peak MiB':>9}")
+    for precision in Precision:
+        data = FileData(
+            "xyz",
+            (1.0, 1.0, 1.0),
+            Unit.MM,
+            shape,
+            raw.astype(Precision.to_dtype(precision)),
+        )
+        best = None
+        for _ in range(args.repeats):
+            timings = run_pipeline(data)
+            best = timings if best is None else {k: min(best[k], v) for k, v in timings.items()}
+
+        tracemalloc.start()
+        run_pipeline(data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"{Precision.to_str(precision):>10}"
+            f" {best['filter']:>8.3f}s {best['fourier']:>8.3f}s {best['interpolate']:>8.3f}s"
+            f" {peak / 2**20:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
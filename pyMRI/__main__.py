@@ -2,16 +2,23 @@
 # nuitka-project: --force-stderr-spec=err.txt
 # nuitka-project: --windows-console-mode=disable
 # nuitka-project: --product-name=pyMRI
-from pyMRI.windowing import launch
-from pyMRI.config import configure
+from pyMRI.config import configure, BatchConfig
 from pyMRI.data_loading import get_scan_config, load_scan
-from sys import argv
+from sys import argv, exit
 
 from pyMRI.loading.prospa import ProspaDataLoader
 
 
 def main():
     launch_config = configure(*argv[1:])
+    if isinstance(launch_config, BatchConfig):
+        # Batch processing never opens a window, so don't import one
+        from pyMRI.batch import run_batch
+
+        exit(1 if run_batch(launch_config) else 0)
+
+    from pyMRI.windowing import launch
+
     launch(launch_config)
 
 
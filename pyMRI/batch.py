@@ -0,0 +1,192 @@
+"""
+Headless batch processing of Prospa scans.
+
+Runs every .1d/.2d/.3d file found in a directory through the processing
+pipeline (load -> shift -> filter -> fourier -> shift -> convert -> reorient ->
+interpolate) using the settings from a JSON file, and writes each result to
+an .npz file. Scans are processed in parallel across a process pool.
+
+The settings file maps step names to the output of that step's serialise:
+{
+    "file_loader": {"precision": "SINGLE", ...},
+    "pre_shift": {"shifts": [0, 0, 0]},
+    "filter": {"low_pass": true, "low_pass_radius": 12.0, ...},
+    "fourier": {"should": true, "mode": "THREE", "norm": "backward", ...},
+    "post_shift": {"shifts": [0, 0, 0]},
+    "convert": {"new_unit": null},
+    "reorient": {"new_orientation": null},
+    "interpolate": {"mode": "NONE", "kernel": "LINEAR", "cubify": false}
+}
+Any missing step or setting uses its default.
+"""
+
+from __future__ import annotations
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from zipfile import ZipFile, ZIP_STORED
+
+import numpy as np
+
+from pyMRI.config import BatchConfig
+from pyMRI.processing import (
+    FileData,
+    FileLoaderStep,
+    ShiftStep,
+    FilterStep,
+    FourierStep,
+    ConvertStep,
+    ReorientStep,
+    InterpolateStep,
+)
+from pyMRI.processing.chunked import ChunkedVolume
+from pyMRI.processing.step import Step
+
+DATA_SUFFIXES: tuple[str, ...] = (".3d", ".2d", ".1d")
+DEFAULT_PARAMETER_FILE = "acqu.par"
+
+
+def load_settings(path: str | Path) -> dict[str, dict]:
+    with open(path, "r") as settings_file:
+        return json.load(settings_file)
+
+
+def build_pipeline(settings: dict[str, dict]) -> tuple[FileLoaderStep, Step, Step]:
+    """
+    Create a fresh, unscheduled, pipeline from the settings. Returns the file
+    loader (which is left unlinked so loading a file can't reset the other
+    steps), the first step after it, and the last step.
+    """
+    interpolate = InterpolateStep.deserialise(settings.get("interpolate", {})).named("interpolate")
+    reorient = ReorientStep.deserialise(settings.get("reorient", {}), interpolate).named("reorient")
+    convert = ConvertStep.deserialise(settings.get("convert", {}), reorient).named("convert")
+    post_shift = ShiftStep.deserialise(settings.get("post_shift", {}), convert).named("post_shift")
+    fourier = FourierStep.deserialise(settings.get("fourier", {}), post_shift).named("fourier")
+    filtering = FilterStep.deserialise(settings.get("filter", {}), fourier).named("filter")
+    pre_shift = ShiftStep.deserialise(settings.get("pre_shift", {}), filtering).named("pre_shift")
+    loader = FileLoaderStep.deserialise(settings.get("file_loader", {})).named("file_loader")
+    return loader, pre_shift, interpolate
+
+
+def find_scans(directory: Path, recursive: bool = False) -> list[tuple[Path, Path | None]]:
+    """
+    Pair every data file in the directory with its parameter file. That is a
+    .par file with the same name, otherwise the acqu.par next to it.
+    """
+    scans = []
+    paths = directory.rglob("*") if recursive else directory.glob("*")
+    for data_path in sorted(paths):
+        if data_path.suffix.lower() not in DATA_SUFFIXES or not data_path.is_file():
+            continue
+
+        parameter_path = data_path.with_suffix(".par")
+        if not parameter_path.is_file():
+            parameter_path = data_path.parent / DEFAULT_PARAMETER_FILE
+        scans.append((data_path, parameter_path if parameter_path.is_file() else None))
+    return scans
+
+
+def load_scan(loader: FileLoaderStep, data_path: Path, parameter_path: Path | None) -> FileData:
+    # Opening a data file forgets the parameter file, and opening a parameter
+    # file forgets the overrides, so they are each set once the last has loaded
+    overrides = loader.orient_override, loader.dimension_override, loader.unit_override
+    with loader.unready():
+        loader.data_path = str(data_path)
+        loader.exclude_parameter_file = loader.exclude_parameter_file or parameter_path is None
+    loader.load_data = True
+
+    if not loader.exclude_parameter_file:
+        with loader.unready():
+            loader.parameter_path = str(parameter_path)
+        loader.load_data = True
+
+    if any(override is not None for override in overrides):
+        orient, dimensions, unit = overrides
+        with loader.unready():
+            loader.orient_override = orient or loader.orient_override
+            loader.dimension_override = dimensions or loader.dimension_override
+            loader.unit_override = unit or loader.unit_override
+        loader.load_data = True
+
+    if not loader.has_processed:
+        raise ValueError(f"Failed to load {data_path} with parameters {parameter_path}")
+    return loader.data
+
+
+def process_scan(
+    data_path: Path, parameter_path: Path | None, settings: dict[str, dict], output_path: Path
+) -> Path:
+    loader, head, tail = build_pipeline(settings)
+    head.update(load_scan(loader, data_path, parameter_path))
+    if not tail.has_processed:
+        raise ValueError(f"The pipeline produced no output for {data_path}")
+
+    result: FileData = tail.data
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    save_result(output_path, result)
+    return output_path
+
+
+def save_result(output_path: Path, result: FileData) -> None:
+    """
+    Write the result as an .npz like np.savez, except chunked voxel data is
+    streamed into the archive a slab at a time so it never has to fit in memory.
+    """
+    arrays = {
+        "voxel_data": result.voxel_data,
+        "orientation": result.orientation,
+        "voxel_dimensions": result.voxel_dimensions,
+        "voxel_unit": result.voxel_unit.name,
+        "voxel_counts": result.voxel_counts,
+    }
+    with ZipFile(output_path, "w", ZIP_STORED, allowZip64=True) as archive:
+        for name, value in arrays.items():
+            with archive.open(f"{name}.npy", "w", force_zip64=True) as member:
+                if isinstance(value, ChunkedVolume):
+                    header = {
+                        "descr": np.lib.format.dtype_to_descr(value.dtype),
+                        "fortran_order": False,
+                        "shape": value.shape,
+                    }
+                    np.lib.format.write_array_header_1_0(member, header)
+                    for rows in value.slabs():
+                        member.write(np.ascontiguousarray(value[rows]).tobytes())
+                else:
+                    np.lib.format.write_array(member, np.asanyarray(value))
+
+
+def run_batch(config: BatchConfig) -> int:
+    """Process every scan, returning how many failed."""
+    settings = load_settings(config.settings_path)
+    scans = find_scans(config.directory, config.recursive)
+    if not scans:
+        print(f"No prospa data files found in {config.directory}")
+        return 0
+
+    # Each process runs a scan, so don't let every FFT try to use every core too
+    if config.jobs != 1:
+        settings.setdefault("fourier", {}).setdefault("workers", 1)
+
+    failed = 0
+    with ProcessPoolExecutor(config.jobs) as pool:
+        futures = {
+            pool.submit(
+                process_scan,
+                data_path,
+                parameter_path,
+                settings,
+                config.output_directory
+                / data_path.relative_to(config.directory).with_suffix(".npz"),
+            ): data_path
+            for data_path, parameter_path in scans
+        }
+        for future in as_completed(futures):
+            data_path = futures[future]
+            try:
+                print(f"{data_path} -> {future.result()}")
+            except Exception as e:
+                failed += 1
+                print(f"FAILED {data_path}: {e}")
+
+    print(f"Processed {len(scans) - failed} of {len(scans)} scans")
+    return failed
@@ -1,4 +1,5 @@
 import argparse
+from pathlib import Path
 from typing import NamedTuple
 
 
@@ -7,9 +8,20 @@ class LaunchConfig(NamedTuple):
     screen_height: int = 720
     window_name: str = "Prospa 3D MRI visualiser"
     fullscreen: bool = False
+    background_processing: bool = True
+    use_cache: bool = True
+    cache_directory: Path | None = None  # None uses ~/.cache/pyMRI
 
 
-def configure(*args) -> LaunchConfig:
+class BatchConfig(NamedTuple):
+    settings_path: Path
+    directory: Path
+    output_directory: Path
+    jobs: int | None = None  # None uses every core
+    recursive: bool = False
+
+
+def configure(*args) -> LaunchConfig | BatchConfig:
     parser = argparse.ArgumentParser(
         prog="Prospa 3D MRI visualiser",
         description="visualise a 3D density cloud of an MRI scan"
@@ -19,11 +31,37 @@ def configure(*args) -> LaunchConfig:
     parser.add_argument('--h', '--height', dest='screen_height', action='store', type=int, default=720)
     parser.add_argument('--window', '--window-name', '--name', dest='window', action='store', type=str, default='Prospa 3D MRI visualiser')
     parser.add_argument('--f', '--fs', '--fullscreen', dest='fullscreen', action='store_true', default=False)
+    parser.add_argument('--sync', '--synchronous', dest='background_processing', action='store_false', default=True)
+    parser.add_argument('--cache-dir', dest='cache_directory', action='store', type=Path, default=None, help="where processed scans are cached, defaults to ~/.cache/pyMRI")
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false', default=True)
+
+    commands = parser.add_subparsers(dest='command')
+    batch = commands.add_parser(
+        'batch',
+        description="process every prospa scan in a directory without a window"
+    )
+    batch.add_argument('settings', action='store', type=Path, help="JSON file of pipeline settings")
+    batch.add_argument('directory', action='store', type=Path, help="directory of .3d/.2d/.1d and .par files")
+    batch.add_argument('--o', '--output', dest='output', action='store', type=Path, default=None, help="defaults to <directory>/processed")
+    batch.add_argument('--j', '--jobs', dest='jobs', action='store', type=int, default=None, help="number of processes, defaults to every core")
+    batch.add_argument('--r', '--recursive', dest='recursive', action='store_true', default=False)
 
     parsed_args = parser.parse_args(args)
+    if parsed_args.command == 'batch':
+        return BatchConfig(
+            parsed_args.settings,
+            parsed_args.directory,
+            parsed_args.output or parsed_args.directory / 'processed',
+            parsed_args.jobs,
+            parsed_args.recursive,
+        )
+
     return LaunchConfig(
         parsed_args.screen_width,
         parsed_args.screen_height,
         parsed_args.window,
-        parsed_args.fullscreen
+        parsed_args.fullscreen,
+        parsed_args.background_processing,
+        parsed_args.use_cache,
+        parsed_args.cache_directory,
     )
@@ -7,6 +7,8 @@ from struct import unpack
 
 import numpy as np
 
+from pyMRI.loading.prospa import read_prospa_images
+
 
 class MRIConfig(NamedTuple):
     orient: str
@@ -57,26 +59,12 @@ _COMPLEX_SIZE = 0x00008
 
 
 def load_scan(
-    config: MRIConfig, data_path: str
+    config: MRIConfig, data_path: str, dtype: np.dtype = np.complex64
 ) -> np.ndarray[..., np.dtype[np.complexfloating]]:
-    image_count = config.phase_2_count
-    image_size = config.phase_1_count, config.read_count
-    image_chunk_size = _COMPLEX_SIZE * image_size[0] * image_size[1]
-    image_chunk_format = "<" + "f" * 2 * image_size[0] * image_size[1]
-
-    image_array = np.zeros(
-        (image_count, image_size[0], image_size[1]), dtype=np.complexfloating
-    )
-
     with open(data_path, "rb") as data_file:
         header = unpack(_HEADER_FORMAT, data_file.read(_HEADER_SIZE))
-        for img_idx in range(image_count):
-            data = unpack(image_chunk_format, data_file.read(image_chunk_size))
-            image = np.zeros(image_size, dtype=np.complexfloating)
-            for idx in range(0, 2 * image_size[0] * image_size[1], 2):
-                x = (idx // 2) % image_size[0]
-                y = (idx // 2) // image_size[0]
-                image[x, y] = data[idx] + 1j * data[idx + 1]
-            image_array[img_idx] = image
+        image_array = read_prospa_images(
+            data_file, config.phase_2_count, config.phase_1_count, config.read_count
+        )
 
-    return image_array
+    return image_array.astype(dtype, copy=False)
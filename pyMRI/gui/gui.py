@@ -1,3 +1,5 @@
+from contextlib import nullcontext
+
 from imgui_bundle import imgui
 from pyMRI._distutil_workaround import PygletProgrammablePipelineRenderer
 from arcade import Window as ArcadeWindow, get_window
@@ -11,6 +13,12 @@ from pyMRI.gui.menu.load import LoadingTab
 from pyMRI.gui.menu.transform import TransformTab
 from pyMRI.gui.menu.adjust import AdjustmentTab
 from pyMRI.gui.menu.style import VisualiseTab
+from pyMRI.gui.menu.stats import StatsTab
+
+from pyMRI.instrumentation import INSTRUMENTS
+from pyMRI.rendering.query import GpuTimer
+
+from pyMRI.rendering.voxel import VoxelRenderer
 
 
 class Gui:
@@ -20,37 +28,45 @@ class Gui:
         self._renderer = None
 
         self._menu = None
+        self._gpu_timer = None
         self._popups: list[GuiPopup] = []
 
-    def initialise(self):
+    def initialise(self, voxel_renderer: VoxelRenderer):
         imgui.create_context()
         imgui.get_io().fonts.get_tex_data_as_rgba32()
         self._win = get_window()
         self._renderer = PygletProgrammablePipelineRenderer(self._win)
+        self._gpu_timer = (
+            GpuTimer("gpu/gui") if GpuTimer.available(self._win.ctx) else nullcontext()
+        )
         # fmt: off
         self._menu = GuiMenu(
             (
                 LoadingTab(),
                 TransformTab(), 
                 AdjustmentTab(),
-                VisualiseTab()
+                VisualiseTab(voxel_renderer),
+                StatsTab(),
             )
         )
         # fmt: on
 
     def update(self):
-        self._renderer.process_inputs()
-        imgui.new_frame()
-        if self._popups:
-            self._popups[-1].update()
-        else:
-            self._menu.update()
+        with INSTRUMENTS.time("cpu/gui update"):
+            self._renderer.process_inputs()
+            imgui.new_frame()
+            if self._popups:
+                self._popups[-1].update()
+            else:
+                self._menu.update()
 
-        imgui.end_frame()
+            imgui.end_frame()
 
     def draw(self):
-        imgui.render()
-        self._renderer.render(imgui.get_draw_data())
+        with INSTRUMENTS.time("cpu/gui draw"):
+            imgui.render()
+            with self._gpu_timer:
+                self._renderer.render(imgui.get_draw_data())
 
     def enable_menu(self):
         self._win.set_exclusive_mouse(False)
@@ -3,6 +3,7 @@ from pyMRI.gui.menu.tab import GuiTab
 from pyMRI.processing import (
     Unit,
     InterpolateModes,
+    InterpolateKernel,
     ORIENTATIONS,
     CONVERT_STEP,
     REORIENT_STEP,
@@ -55,3 +56,28 @@ class AdjustmentTab(GuiTab):
                     if is_selected:
                         imgui.set_item_default_focus()
                 imgui.end_combo()
+
+            imgui.text("Kernel")
+            imgui.same_line()
+            if imgui.begin_combo(
+                "##kernel", InterpolateKernel.to_str(INTERPOLATE_STEP.kernel)
+            ):
+                for kernel in InterpolateKernel:
+                    is_selected = kernel == INTERPOLATE_STEP.kernel
+                    select, is_selected = imgui.selectable(
+                        InterpolateKernel.to_str(kernel), is_selected
+                    )
+                    if select:
+                        INTERPOLATE_STEP.kernel = kernel
+                    if is_selected:
+                        imgui.set_item_default_focus()
+                imgui.end_combo()
+
+            # Outputs larger than this are interpolated to a temporary file a slab at a time
+            imgui.text("Memory Budget (MiB)")
+            imgui.same_line()
+            changed, budget = imgui.slider_int(
+                "##interp budget", INTERPOLATE_STEP.memory_budget // 2**20, 64, 16384
+            )
+            if changed:
+                INTERPOLATE_STEP.memory_budget = budget * 2**20
@@ -1,7 +1,7 @@
 from imgui_bundle import imgui, imgui_ctx
 
 from pyMRI.gui.menu.tab import GuiTab
-from pyMRI.processing import Unit, ORIENTATIONS, FILE_LOADER_STEP
+from pyMRI.processing import Unit, Precision, ORIENTATIONS, FILE_LOADER_STEP
 
 
 class LoadingTab(GuiTab):
@@ -71,6 +71,45 @@ class LoadingTab(GuiTab):
             if not use_parameter_file:
                 imgui.end_disabled()
 
+        # Memory map the data file rather than reading it all into memory
+        imgui.text("Memory Map Data")
+        imgui.same_line()
+        changed, memory_map = imgui.checkbox(
+            "##memory map", FILE_LOADER_STEP.memory_map
+        )
+        if changed:
+            FILE_LOADER_STEP.memory_map = memory_map
+            FILE_LOADER_STEP.load_data = True
+
+        # Process the data a slab at a time through temporary files, for scans larger than RAM
+        imgui.text("Out Of Core")
+        imgui.same_line()
+        changed, chunked = imgui.checkbox("##chunked", FILE_LOADER_STEP.chunked)
+        if changed:
+            FILE_LOADER_STEP.chunked = chunked
+            FILE_LOADER_STEP.load_data = True
+
+        # Working precision for the whole pipeline
+        imgui.text("Precision:")
+        imgui.same_line()
+        changed = False
+        if imgui.begin_combo(
+            "##precision", Precision.to_str(FILE_LOADER_STEP.precision)
+        ):
+            for precision in Precision:
+                is_selected = precision == FILE_LOADER_STEP.precision
+                select, is_selected = imgui.selectable(
+                    f"{Precision.to_str(precision)}", is_selected
+                )
+                if select:
+                    FILE_LOADER_STEP.precision = precision
+                    changed = True
+                if is_selected:
+                    imgui.set_item_default_focus()
+            imgui.end_combo()
+        if changed:
+            FILE_LOADER_STEP.load_data = True
+
         disabled = not FILE_LOADER_STEP.has_processed
         if disabled:
             imgui.begin_disabled()
@@ -109,10 +148,10 @@ class LoadingTab(GuiTab):
             "##dimension",
             voxel_dimensions,
         )
-        if voxel_dimensions[0] != float("inf"):
+        # Only on a change, any write marks the loader dirty
+        if changed and voxel_dimensions[0] != float("inf"):
             FILE_LOADER_STEP.dimension_override = tuple(dimensions)
-            if changed:
-                FILE_LOADER_STEP.load_data = True
+            FILE_LOADER_STEP.load_data = True
 
         # Units
         imgui.text("Units:")
@@ -0,0 +1,53 @@
+from imgui_bundle import imgui
+
+from pyMRI.gui.menu.tab import GuiTab
+from pyMRI.instrumentation import INSTRUMENTS, PERCENTILES
+
+
+class StatsTab(GuiTab):
+
+    def __init__(self):
+        super().__init__("Stats")
+        self._csv_path: str = "pyMRI_timings.csv"
+        self._export_message: str = ""
+
+    def update(self):
+        imgui.text("Record Timings")
+        imgui.same_line()
+        changed, enabled = imgui.checkbox("##record timings", INSTRUMENTS.enabled)
+        if changed:
+            INSTRUMENTS.enabled = enabled
+        imgui.same_line()
+        if imgui.button("Reset"):
+            INSTRUMENTS.reset()
+
+        # Rolling percentiles over the last few hundred samples of each channel
+        columns = ("Channel", "Mean") + tuple(f"{q:g}%" for q in PERCENTILES) + ("Max",)
+        if imgui.begin_table("##timings", len(columns)):
+            for column in columns:
+                imgui.table_setup_column(column)
+            imgui.table_headers_row()
+            for name, count, _, mean, percentiles, maximum in INSTRUMENTS.summaries():
+                if count == 0:
+                    continue
+                imgui.table_next_row()
+                imgui.table_next_column()
+                imgui.text(name)
+                for seconds in (mean, *percentiles, maximum):
+                    imgui.table_next_column()
+                    imgui.text(f"{1e3 * seconds:.2f} ms")
+            imgui.end_table()
+
+        # Written for comparing runs against each other
+        imgui.text("CSV File:")
+        imgui.same_line()
+        _, self._csv_path = imgui.input_text("##csv path", self._csv_path)
+        imgui.same_line()
+        if imgui.button("Export"):
+            try:
+                path = INSTRUMENTS.export_csv(self._csv_path)
+                self._export_message = f"Exported to {path.resolve()}"
+            except OSError as e:
+                self._export_message = f"Failed to export: {e}"
+        if self._export_message:
+            imgui.text(self._export_message)
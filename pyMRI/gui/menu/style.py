@@ -1,7 +1,202 @@
+import numpy as np
+
+from imgui_bundle import imgui, imgui_ctx
+
 from pyMRI.gui.menu.tab import GuiTab
+from pyMRI.rendering.voxel import VoxelRenderer
+from pyMRI.rendering.volume import VolumeFormat, Reduction
 
 
 class VisualiseTab(GuiTab):
 
-    def __init__(self):
+    def __init__(self, voxel_renderer: VoxelRenderer):
         super().__init__("Visualise")
+        self._renderer: VoxelRenderer = voxel_renderer
+        self._histogram = np.array([1.0], dtype=np.float32)
+        self._histogram_source = None
+
+    def update(self):
+        # How the volume is stored on the GPU
+        imgui.text("Volume Format:")
+        imgui.same_line()
+        if imgui.begin_combo(
+            "##volume format", VolumeFormat.to_str(self._renderer.volume_format)
+        ):
+            for volume_format in VolumeFormat:
+                is_selected = volume_format == self._renderer.volume_format
+                select, is_selected = imgui.selectable(
+                    f"{VolumeFormat.to_str(volume_format)}", is_selected
+                )
+                if select:
+                    self._renderer.volume_format = volume_format
+                if is_selected:
+                    imgui.set_item_default_focus()
+            imgui.end_combo()
+
+        # Level of detail
+        imgui.text("GPU Memory Budget (MiB):")
+        imgui.same_line()
+        changed, budget = imgui.slider_int(
+            "##memory budget", self._renderer.memory_budget // 2**20, 16, 4096
+        )
+        if changed:
+            self._renderer.memory_budget = budget * 2**20
+
+        imgui.text("Level of Detail Distance:")
+        imgui.same_line()
+        changed, lod_distance = imgui.slider_float(
+            "##lod distance", self._renderer.lod_distance, 0.0, 10.0
+        )
+        if changed:
+            self._renderer.lod_distance = lod_distance
+
+        imgui.text("Downsample By:")
+        imgui.same_line()
+        if imgui.begin_combo("##lod reduction", Reduction.to_str(self._renderer.lod_reduction)):
+            for reduction in Reduction:
+                is_selected = reduction == self._renderer.lod_reduction
+                select, is_selected = imgui.selectable(
+                    f"{Reduction.to_str(reduction)}", is_selected
+                )
+                if select:
+                    self._renderer.lod_reduction = reduction
+                if is_selected:
+                    imgui.set_item_default_focus()
+            imgui.end_combo()
+
+        if self._renderer.level is not None:
+            imgui.text(f"Level: {self._renderer.level} of {self._renderer.level_count - 1}")
+
+        # Empty space skipping
+        imgui.text("Skip Empty Space")
+        imgui.same_line()
+        changed, skip = imgui.checkbox("##skip empty", self._renderer.skip_empty_space)
+        if changed:
+            self._renderer.skip_empty_space = skip
+
+        if not skip:
+            imgui.begin_disabled()
+
+        imgui.text("Empty Below:")
+        imgui.same_line()
+        changed, threshold = imgui.slider_float(
+            "##empty threshold", self._renderer.empty_threshold, 0.0, 0.1
+        )
+        if changed:
+            self._renderer.empty_threshold = threshold
+
+        imgui.text("Brick Size:")
+        imgui.same_line()
+        changed, brick_size = imgui.slider_int(
+            "##brick size", self._renderer.brick_size, 2, 32
+        )
+        if changed:
+            self._renderer.brick_size = brick_size
+
+        if not skip:
+            imgui.end_disabled()
+
+        # Ray limits
+        budget = self._renderer.ray_budget
+        imgui.text("Max Steps:")
+        imgui.same_line()
+        changed, max_steps = imgui.slider_int("##max steps", budget.max_steps, 16, 8192)
+        if changed:
+            budget.max_steps = max_steps
+
+        imgui.text("Stop Below Transmission:")
+        imgui.same_line()
+        changed, min_transmission = imgui.slider_float(
+            "##min transmission", budget.min_transmission, 0.0, 0.2
+        )
+        if changed:
+            budget.min_transmission = min_transmission
+
+        imgui.text("Progressive Refinement")
+        imgui.same_line()
+        changed, progressive = imgui.checkbox("##progressive", budget.progressive)
+        if changed:
+            budget.progressive = progressive
+
+        if not progressive:
+            imgui.begin_disabled()
+
+        imgui.text("Moving Max Steps:")
+        imgui.same_line()
+        changed, moving_max_steps = imgui.slider_int(
+            "##moving max steps", budget.moving_max_steps, 16, 2048
+        )
+        if changed:
+            budget.moving_max_steps = moving_max_steps
+
+        imgui.text("Moving Stop Below:")
+        imgui.same_line()
+        changed, moving_min_transmission = imgui.slider_float(
+            "##moving min transmission", budget.moving_min_transmission, 0.0, 0.5
+        )
+        if changed:
+            budget.moving_min_transmission = moving_min_transmission
+
+        if not progressive:
+            imgui.end_disabled()
+
+        # Resolution the volume is drawn at
+        render_scale = self._renderer.render_scale
+        imgui.text("Dynamic Resolution")
+        imgui.same_line()
+        changed, dynamic = imgui.checkbox("##dynamic resolution", render_scale.dynamic)
+        if changed:
+            render_scale.dynamic = dynamic
+
+        if dynamic:
+            imgui.text("Target FPS:")
+            imgui.same_line()
+            changed, fps = imgui.slider_int(
+                "##target fps", round(1.0 / render_scale.target_frame_time), 15, 144
+            )
+            if changed:
+                render_scale.target_frame_time = 1.0 / fps
+
+            imgui.begin_disabled()
+        imgui.text("Resolution Scale:")
+        imgui.same_line()
+        changed, scale = imgui.slider_float(
+            "##resolution scale", render_scale.scale, render_scale.min_scale, 1.0
+        )
+        if changed:
+            render_scale.scale = scale
+        if dynamic:
+            imgui.end_disabled()
+
+        # How much of a new level is sent to the GPU each frame
+        imgui.text("Upload Budget (MiB/frame):")
+        imgui.same_line()
+        changed, upload_budget = imgui.slider_int(
+            "##upload budget", self._renderer.upload_budget // 2**20, 0, 256
+        )
+        if changed:
+            self._renderer.upload_budget = upload_budget * 2**20
+        if self._renderer.uploading:
+            imgui.text("Uploading...")
+
+        stats = self._renderer.upload_stats
+        imgui.text(f"Uploaded: {stats.frame / 2**10:.1f} KiB last frame")
+        imgui.text(f"Total Uploaded: {stats.total / 2**20:.1f} MiB ({stats.payloads} volumes)")
+        imgui.text(
+            f"Pooled: {self._renderer.staging_pool.nbytes / 2**20:.1f} MiB host, "
+            f"{self._renderer.gpu_pool.nbytes / 2**20:.1f} MiB GPU"
+        )
+
+        # Gathered once per volume by the pipeline and shared with the renderer
+        statistics = self._renderer.statistics
+        if statistics is not None:
+            if statistics is not self._histogram_source:
+                self._histogram_source = statistics
+                self._histogram = statistics.histogram.astype(np.float32)
+            with imgui_ctx.push_item_width(-1):
+                x, _ = imgui.get_content_region_avail()
+                imgui.plot_histogram("##histogram", self._histogram, graph_size=(x, 80))
+
+            low, _, median, _, high = statistics.percentiles
+            imgui.text(f"Magnitude: {statistics.minimum:.3g} - {statistics.maximum:.3g}")
+            imgui.text(f"1% / 50% / 99%: {low:.3g} / {median:.3g} / {high:.3g}")
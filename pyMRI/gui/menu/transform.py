@@ -1,3 +1,5 @@
+from os import cpu_count
+
 from pyMRI.gui.menu.tab import GuiTab
 
 from pyMRI.processing import (
@@ -8,7 +10,9 @@ from pyMRI.processing import (
     FILE_LOADER_STEP,
     FourierMode,
     FourierNorm,
+    FFTBackend,
 )
+from pyMRI.processing.fft import available_backends
 
 from imgui_bundle import imgui, imgui_ctx
 
@@ -166,5 +170,27 @@ class TransformTab(GuiTab):
                 if is_selected:
                     imgui.set_item_default_focus()
             imgui.end_combo()
+
+        imgui.text("Backend:")
+        imgui.same_line()
+        if imgui.begin_combo("##fourier-backend", FFTBackend.to_str(FOURIER_STEP.backend)):
+            for backend in available_backends():
+                is_selected = backend == FOURIER_STEP.backend
+                select, is_selected = imgui.selectable(
+                    f"{FFTBackend.to_str(backend)}", is_selected
+                )
+                if select:
+                    FOURIER_STEP.backend = backend
+                if is_selected:
+                    imgui.set_item_default_focus()
+            imgui.end_combo()
+
+        imgui.text("Workers:")
+        imgui.same_line()
+        changed, workers = imgui.slider_int(
+            "##fourier-workers", FOURIER_STEP.workers, -1, cpu_count() or 1
+        )
+        if changed and workers != 0:
+            FOURIER_STEP.workers = workers
         if not should:
             imgui.end_disabled()
@@ -0,0 +1,141 @@
+"""
+Timings of the frame, the renderer, the GUI and the pipeline steps.
+
+Every measurement goes into a named channel holding the last few hundred
+samples in a ring buffer, so the rolling percentiles shown in the stats tab
+only ever describe recent frames. CPU times are taken with perf_counter
+around a block of code. GPU times come from timer queries which are only
+read back once the GPU has finished with them, a few frames later, so
+measuring never stalls the pipeline (see pyMRI.rendering.query).
+
+Steps record from the scheduler's worker threads as well as the main
+thread so every channel is guarded by the instruments' lock. The summary
+of each channel can be written as CSV to track regressions between runs.
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager
+from csv import writer
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+from typing import NamedTuple, Iterator
+
+import numpy as np
+
+RING_SIZE = 512
+PERCENTILES: tuple[float, ...] = (50.0, 95.0, 99.0)
+
+
+class ChannelSummary(NamedTuple):
+    name: str
+    count: int  # samples currently held, at most RING_SIZE
+    total: int  # samples ever recorded
+    mean: float  # seconds
+    percentiles: tuple[float, ...]  # seconds at each of PERCENTILES
+    maximum: float  # seconds
+
+
+class TimingRing:
+    """The last size samples of one channel, oldest overwritten first."""
+
+    def __init__(self, size: int = RING_SIZE):
+        self._samples: np.ndarray = np.zeros(size, np.float64)
+        self._next: int = 0
+        self.total: int = 0
+
+    @property
+    def count(self) -> int:
+        return min(self.total, len(self._samples))
+
+    def append(self, seconds: float) -> None:
+        self._samples[self._next] = seconds
+        self._next = (self._next + 1) % len(self._samples)
+        self.total += 1
+
+    def samples(self) -> np.ndarray:
+        """A copy of the held samples, oldest first."""
+        if self.total < len(self._samples):
+            return self._samples[: self._next].copy()
+        return np.roll(self._samples, -self._next)
+
+    def summary(self, name: str) -> ChannelSummary:
+        samples = self._samples[: self.count]
+        if samples.size == 0:
+            return ChannelSummary(name, 0, self.total, 0.0, (0.0,) * len(PERCENTILES), 0.0)
+        return ChannelSummary(
+            name,
+            samples.size,
+            self.total,
+            float(samples.mean()),
+            tuple(float(p) for p in np.percentile(samples, PERCENTILES)),
+            float(samples.max()),
+        )
+
+
+class Instruments:
+
+    def __init__(self, ring_size: int = RING_SIZE):
+        self.enabled: bool = True
+        self._ring_size: int = ring_size
+        self._channels: dict[str, TimingRing] = {}
+        self._lock: Lock = Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            ring = self._channels.get(name)
+            if ring is None:
+                ring = self._channels[name] = TimingRing(self._ring_size)
+            ring.append(seconds)
+
+    @contextmanager
+    def time(self, name: str) -> Iterator[None]:
+        """Record how long the block took on the CPU, even if it raises."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    @property
+    def names(self) -> tuple[str, ...]:
+        with self._lock:
+            return tuple(sorted(self._channels))
+
+    def samples(self, name: str) -> np.ndarray:
+        with self._lock:
+            ring = self._channels.get(name)
+            return np.zeros(0) if ring is None else ring.samples()
+
+    def summaries(self) -> tuple[ChannelSummary, ...]:
+        with self._lock:
+            return tuple(
+                self._channels[name].summary(name) for name in sorted(self._channels)
+            )
+
+    def reset(self) -> None:
+        with self._lock:
+            self._channels.clear()
+
+    def export_csv(self, path: Path | str) -> Path:
+        """Write one row per channel, times in milliseconds."""
+        path = Path(path)
+        with path.open("w", newline="") as f:
+            csv = writer(f)
+            csv.writerow(
+                ("channel", "count", "total", "mean_ms")
+                + tuple(f"p{q:g}_ms" for q in PERCENTILES)
+                + ("max_ms",)
+            )
+            for name, count, total, mean, percentiles, maximum in self.summaries():
+                csv.writerow(
+                    (name, count, total, f"{1e3 * mean:.4f}")
+                    + tuple(f"{1e3 * p:.4f}" for p in percentiles)
+                    + (f"{1e3 * maximum:.4f}",)
+                )
+        return path
+
+
+INSTRUMENTS = Instruments()
@@ -26,7 +26,7 @@ class FileLoader[T: NamedTuple]:
         return self._data is not None
 
     @classmethod
-    def fetch(cls, start_folder: Path = None) -> Self | None:
+    def fetch(cls, start_folder: Path = None, **kwargs) -> Self | None:
         path_str = askopenfilename(
             title=cls.dialog_title,
             filetypes=cls.accepted_file_types,
@@ -34,7 +34,7 @@ class FileLoader[T: NamedTuple]:
         )
         if not path_str:
             return
-        return cls(Path(path_str))
+        return cls(Path(path_str), **kwargs)
 
     def load(self) -> T:
         raise NotImplementedError
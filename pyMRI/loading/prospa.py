@@ -25,7 +25,9 @@ this means that for 'XYZ', X is the phase 2, Y is the phase 1, and Z is the read
 from typing import NamedTuple
 from struct import unpack
 
-from numpy import ndarray, complexfloating, zeros
+from pathlib import Path
+
+from numpy import ndarray, complexfloating, dtype, frombuffer, memmap
 
 from pyMRI.loading.generic import FileLoader
 
@@ -33,6 +35,52 @@ _HEADER_SIZE = 0x00020
 _HEADER_FORMAT = "<4s 4s 4s i i i i i"
 _LINE_SIZE = 0x00010
 _COMPLEX_SIZE = 0x00008
+_COMPLEX_FORMAT = dtype("<c8")
+
+
+def read_prospa_header(data_file) -> tuple[int, int, int]:
+    """
+    Read the header of a prospa file, returning the (count, height, width) of the
+    images stored within. Leaves the file handle positioned at the first image.
+    """
+    _, _, _, _, img_width, img_height, img_count, _ = unpack(
+        _HEADER_FORMAT, data_file.read(_HEADER_SIZE)
+    )
+    return img_count, img_height, img_width
+
+
+def read_prospa_images(
+    data_file, img_count: int, img_height: int, img_width: int
+) -> ndarray[complexfloating]:
+    """
+    Read every image of a prospa file in one go. The file handle must be
+    positioned just past the header.
+
+    Each image is stored column-major as interleaved little endian floats, so
+    the payload is a C ordered (count, width, height) array of complex64. The
+    returned array is a transposed view of that buffer with no extra copy.
+    """
+    sample_count = img_count * img_height * img_width
+    payload = data_file.read(sample_count * _COMPLEX_SIZE)
+    images = frombuffer(payload, _COMPLEX_FORMAT, sample_count)
+    return images.reshape(img_count, img_width, img_height).transpose(0, 2, 1)
+
+
+def map_prospa_images(
+    path: str | Path, img_count: int, img_height: int, img_width: int
+) -> memmap:
+    """
+    Memory map every image of a prospa file without reading it. Only the pages
+    touched by slicing or reading the returned (read only) view are loaded.
+    """
+    images = memmap(
+        path,
+        _COMPLEX_FORMAT,
+        "r",
+        _HEADER_SIZE,
+        (img_count, img_width, img_height),
+    )
+    return images.transpose(0, 2, 1)
 
 
 class ProspaData(NamedTuple):
@@ -49,23 +97,20 @@ class ProspaDataLoader(FileLoader[ProspaData]):
         ("Prospa Density Data 1D", "*.1d"),
     ]
 
+    def __init__(self, path: str | Path, memory_map: bool = False):
+        super().__init__(path)
+        self.memory_map: bool = memory_map
+
     def load(self) -> ProspaData:
         with open(self.path, "rb") as data_file:
-            _, _, _, _, img_width, img_height, img_count, _ = unpack(
-                _HEADER_FORMAT, data_file.read(_HEADER_SIZE)
-            )
-            image_chunk_size = _COMPLEX_SIZE * img_width * img_height
-            image_chunk_format = "<" + "f" * (2 * img_width * img_height)
-            images = zeros([img_count, img_height, img_width], dtype=complexfloating)
-
-            for img in images[:]:
-                data = unpack(image_chunk_format, data_file.read(image_chunk_size))
-                for idx in range(img_width * img_height):
-                    value = data[2 * idx] + 1j * data[2 * idx + 1]
-                    img[idx % img_height, idx // img_height] = value
-
-            self._data = ProspaData((img_count, img_height, img_width), images)
-            return self._data
+            img_count, img_height, img_width = read_prospa_header(data_file)
+            if self.memory_map:
+                images = map_prospa_images(self.path, img_count, img_height, img_width)
+            else:
+                images = read_prospa_images(data_file, img_count, img_height, img_width)
+
+        self._data = ProspaData((img_count, img_height, img_width), images)
+        return self._data
 
 
 class ProspaParameters(NamedTuple):
@@ -8,14 +8,18 @@ from pyMRI.processing.data import (
     Unit,
     UNIT_CONVERSIONS,
     InterpolateModes,
+    InterpolateKernel,
     FourierMode,
     FourierNorm,
+    FFTBackend,
+    Precision,
 )
 
 from pyMRI.processing.loading import FileLoaderStep
 from pyMRI.processing.fourier import ShiftStep, FilterStep, FourierStep
 from pyMRI.processing.adjust import ConvertStep, ReorientStep, InterpolateStep
 from pyMRI.processing.style import ColourStep, CameraStep
+from pyMRI.processing.scheduler import StepScheduler
 
 __all__ = (
     "Orientation",
@@ -23,6 +27,7 @@ __all__ = (
     "ORIENTATION_MAP",
     "Unit",
     "UNIT_CONVERSIONS",
+    "Precision",
     "FileData",
     "FILE_LOADER_STEP",
     "FourierData",
@@ -30,15 +35,18 @@ __all__ = (
     "FILTER_STEP",
     "FourierMode",
     "FourierNorm",
+    "FFTBackend",
     "FOURIER_STEP",
     "POST_SHIFT_STEP",
     "InterpolateModes",
+    "InterpolateKernel",
     "CONVERT_STEP",
     "REORIENT_STEP",
     "INTERPOLATE_STEP",
     "RenderData",
     "COLOUR_STEP",
     "CAMERA_STEP",
+    "SCHEDULER",
 )
 
 
@@ -59,13 +67,16 @@ Steps:
 
 SAVE_STEP = None
 MESH_STEP = None
-CAMERA_STEP = CameraStep(MESH_STEP)
-COLOUR_STEP = ColourStep(CAMERA_STEP)
-INTERPOLATE_STEP = InterpolateStep(COLOUR_STEP)
-REORIENT_STEP = ReorientStep(INTERPOLATE_STEP)
-CONVERT_STEP = ConvertStep(REORIENT_STEP)
-POST_SHIFT_STEP = ShiftStep(CONVERT_STEP)
-FOURIER_STEP = FourierStep(POST_SHIFT_STEP)
-FILTER_STEP = FilterStep(FOURIER_STEP)
-PRE_SHIFT_STEP = ShiftStep(FILTER_STEP)
-FILE_LOADER_STEP = FileLoaderStep(PRE_SHIFT_STEP)
+CAMERA_STEP = CameraStep(MESH_STEP).named("camera")
+COLOUR_STEP = ColourStep(CAMERA_STEP).named("colour")
+INTERPOLATE_STEP = InterpolateStep(COLOUR_STEP).named("interpolate")
+REORIENT_STEP = ReorientStep(INTERPOLATE_STEP).named("reorient")
+CONVERT_STEP = ConvertStep(REORIENT_STEP).named("convert")
+POST_SHIFT_STEP = ShiftStep(CONVERT_STEP).named("post_shift")
+FOURIER_STEP = FourierStep(POST_SHIFT_STEP).named("fourier")
+FILTER_STEP = FilterStep(FOURIER_STEP).named("filter")
+PRE_SHIFT_STEP = ShiftStep(FILTER_STEP).named("pre_shift")
+FILE_LOADER_STEP = FileLoaderStep(PRE_SHIFT_STEP).named("file_loader")
+
+# Coalesce every setting changed in a frame into one update of the chain
+SCHEDULER = StepScheduler(FILE_LOADER_STEP)
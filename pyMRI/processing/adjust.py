@@ -1,8 +1,11 @@
-from scipy.interpolate import RegularGridInterpolator
 from math import floor
+from typing import Self
 import numpy as np
+from scipy.signal import resample
 
 from pyMRI.processing.step import Step
+from pyMRI.processing.chunked import ChunkedVolume, chunk_rows, free_bytes
+from pyMRI.processing.statistics import volume_statistics
 
 from pyMRI.processing.data import (
     Unit,
@@ -10,12 +13,160 @@ from pyMRI.processing.data import (
     ORIENTATIONS,
     UNIT_CONVERSIONS,
     InterpolateModes,
+    InterpolateKernel,
     FourierData,
 )
 
 # TODO: crop
 
 
+# How many grid points either side of a sample each kernel reaches
+_KERNEL_SUPPORT = {
+    InterpolateKernel.LINEAR: 1,
+    InterpolateKernel.CUBIC: 2,
+    InterpolateKernel.LANCZOS: 3,
+}
+
+
+def _kernel(kernel: InterpolateKernel, distance: np.ndarray) -> np.ndarray:
+    """The weight of a grid point distance grid spacings from the sample."""
+    x = np.abs(distance)
+    match kernel:
+        case InterpolateKernel.LINEAR:
+            return np.maximum(1.0 - x, 0.0)
+        case InterpolateKernel.CUBIC:
+            # Keys with a = -0.5, which reproduces quadratics
+            a = -0.5
+            near = ((a + 2.0) * x - (a + 3.0)) * x * x + 1.0
+            far = ((a * x - 5.0 * a) * x + 8.0 * a) * x - 4.0 * a
+            return np.where(x <= 1.0, near, np.where(x < 2.0, far, 0.0))
+        case InterpolateKernel.LANCZOS:
+            support = _KERNEL_SUPPORT[kernel]
+            return np.where(x < support, np.sinc(x) * np.sinc(x / support), 0.0)
+
+
+def _kernel_weights(
+    space: np.ndarray, new_space: np.ndarray, kernel: InterpolateKernel
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    For every new position the grid points the kernel reaches and their
+    weights, both shaped (new positions, taps). Points past either end of
+    the grid repeat the edge.
+    """
+    count = len(space)
+    if count == 1:
+        position = np.zeros(len(new_space))
+    else:
+        position = np.interp(new_space, space, np.arange(count))
+
+    support = _KERNEL_SUPPORT[kernel]
+    base = np.floor(position)
+    offsets = np.arange(1 - support, support + 1)
+    weights = _kernel(kernel, position[:, None] - (base[:, None] + offsets))
+    if kernel == InterpolateKernel.LANCZOS:
+        # The windowed sinc only nearly sums to one between grid points
+        weights /= weights.sum(axis=1, keepdims=True)
+    indices = np.clip(base[:, None] + offsets, 0, count - 1).astype(np.intp)
+    return indices, weights
+
+
+def _resample_axis(
+    data: np.ndarray, axis: int, weights: tuple[np.ndarray, np.ndarray]
+) -> np.ndarray:
+    indices, weights = weights
+    shape = [1, 1, 1]
+    shape[axis] = len(indices)
+    weights = weights.astype(np.finfo(data.dtype).dtype)
+
+    out = np.take(data, indices[:, 0], axis)
+    out *= weights[:, 0].reshape(shape)
+    for tap in range(1, indices.shape[1]):
+        if not weights[:, tap].any():
+            continue  # i.e. linear resampling onto the grid points
+        out += np.take(data, indices[:, tap], axis) * weights[:, tap].reshape(shape)
+    return out
+
+
+def _resample(data: np.ndarray, weights: tuple[tuple[np.ndarray, np.ndarray], ...]) -> np.ndarray:
+    """
+    Resample with a separable kernel as three 1D resamples, one axis at a
+    time. The weights are real so complex data is resampled as is.
+    """
+    for axis, axis_weights in enumerate(weights):
+        data = _resample_axis(data, axis, axis_weights)
+    return data
+
+
+def _fourier_resample(data: np.ndarray, counts: tuple[int, ...], axes: tuple[int, ...]) -> np.ndarray:
+    """
+    Zero pad (or truncate) the spectrum of each axis to its new count. The
+    samples stay evenly spread over a periodic field of view, so unlike the
+    other kernels the last sample doesn't land on the far edge of the volume.
+    """
+    for axis, count in zip(axes, counts):
+        if data.shape[axis] not in (1, count):
+            data = resample(data, count, axis=axis).astype(data.dtype, copy=False)
+    return data
+
+
+def _interpolate(
+    data: np.ndarray,
+    spaces: tuple[np.ndarray, np.ndarray, np.ndarray],
+    new_spaces: tuple[np.ndarray, np.ndarray, np.ndarray],
+    kernel: InterpolateKernel = InterpolateKernel.LINEAR,
+) -> np.ndarray:
+    if kernel == InterpolateKernel.FOURIER:
+        # The same axis order as the tiled version so they agree exactly
+        counts = tuple(len(new_space) for new_space in new_spaces)
+        data = _fourier_resample(data, counts[1:], (1, 2))
+        return _fourier_resample(data, counts[:1], (0,))
+
+    weights = tuple(
+        _kernel_weights(space, new_space, kernel) for space, new_space in zip(spaces, new_spaces)
+    )
+    return _resample(data, weights)
+
+
+def _interpolate_tiled(
+    data: ChunkedVolume | np.ndarray,
+    spaces: tuple[np.ndarray, np.ndarray, np.ndarray],
+    new_spaces: tuple[np.ndarray, np.ndarray, np.ndarray],
+    kernel: InterpolateKernel = InterpolateKernel.LINEAR,
+) -> ChunkedVolume:
+    """
+    Interpolate into a chunked volume on disk a slab of output rows at a
+    time from only the input rows surrounding them, giving exactly what
+    _interpolate does.
+    """
+    shape = tuple(len(new_space) for new_space in new_spaces)
+    out = ChunkedVolume.empty(shape, data.dtype, chunk_rows(shape, data.dtype))
+
+    if kernel == InterpolateKernel.FOURIER:
+        # Every output row needs every input row, so resample the rows of
+        # each input slab first then the columns of each output slab
+        rows_shape = (data.shape[0], *shape[1:])
+        resampled = ChunkedVolume.empty(rows_shape, data.dtype, chunk_rows(rows_shape, data.dtype))
+        for rows in resampled.slabs():
+            resampled[rows] = _fourier_resample(data[rows], shape[1:], (1, 2))
+
+        column_chunk = chunk_rows((shape[1], data.shape[0] + shape[0], shape[2]), data.dtype)
+        for columns in out.slabs(column_chunk, axis=1):
+            out[:, columns] = _fourier_resample(resampled[:, columns], shape[:1], (0,))
+        return out
+
+    indices, weights = _kernel_weights(spaces[0], new_spaces[0], kernel)
+    other_weights = tuple(
+        _kernel_weights(space, new_space, kernel)
+        for space, new_space in zip(spaces[1:], new_spaces[1:])
+    )
+    for rows in out.slabs():
+        start, stop = indices[rows].min(), indices[rows].max() + 1
+        out[rows] = _resample(
+            data[start:stop], ((indices[rows] - start, weights[rows]), *other_weights)
+        )
+    return out
+
+
 class ConvertStep(Step[FourierData, FourierData]):
 
     def __init__(self, next: Step):
@@ -26,6 +177,17 @@ class ConvertStep(Step[FourierData, FourierData]):
     def _reset(self) -> None:
         self.new_unit = None
 
+    def serialise(self) -> dict:
+        return {"new_unit": None if self.new_unit is None else self.new_unit.name}
+
+    @classmethod
+    def deserialise(cls, config: dict, next_step: Step = None) -> Self:
+        step = cls(next_step)
+        unit = config.get("new_unit")
+        with step.unready():
+            step.new_unit = None if unit is None else Unit[unit]
+        return step
+
     def _recalculate(self, _input: FourierData) -> FourierData | None:
         if self.new_unit is None or self.new_unit == _input.voxel_unit:
             return _input
@@ -55,6 +217,16 @@ class ReorientStep(Step[FourierData, FourierData]):
     def _reset(self) -> None:
         self.new_orientation = None
 
+    def serialise(self) -> dict:
+        return {"new_orientation": self.new_orientation}
+
+    @classmethod
+    def deserialise(cls, config: dict, next_step: Step = None) -> Self:
+        step = cls(next_step)
+        with step.unready():
+            step.new_orientation = config.get("new_orientation")
+        return step
+
     def _recalculate(self, _input: FourierData) -> FourierData:
         if self.new_orientation is None or self.new_orientation == _input.orientation:
             return _input
@@ -75,10 +247,47 @@ class InterpolateStep(Step[FourierData, FourierData]):
         with self.unready():
             self.cubify: bool = False
             self.mode: InterpolateModes = InterpolateModes.NONE
+            self.kernel: InterpolateKernel = InterpolateKernel.LINEAR
+            # Larger outputs are written to disk a slab at a time instead
+            self.memory_budget: int = 1 * 2**30
 
     def _reset(self) -> None:
         self.cubify = False
         self.mode = InterpolateModes.NONE
+        self.kernel = InterpolateKernel.LINEAR
+        # The memory budget is a machine preference, so it survives resets
+
+    def serialise(self) -> dict:
+        return {
+            "cubify": self.cubify,
+            "mode": self.mode.name,
+            "kernel": self.kernel.name,
+            "memory_budget": self.memory_budget,
+        }
+
+    def _provenance_settings(self) -> dict:
+        # Whether the output was tiled to disk doesn't change its values
+        settings = self.serialise()
+        settings.pop("memory_budget")
+        return settings
+
+    def _process(self, _input: FourierData, key: str | None = None) -> FourierData | None:
+        _output = super()._process(_input, key)
+        # The last step before rendering, so on the scheduler's worker gather
+        # the statistics the renderer and GUI read before the output is published
+        if _output is not None and self._scheduler is not None:
+            volume_statistics(_output.voxel_data)
+        return _output
+
+    @classmethod
+    def deserialise(cls, config: dict, next_step: Step = None) -> Self:
+        step = cls(next_step)
+        with step.unready():
+            step.cubify = config.get("cubify", False)
+            step.mode = InterpolateModes[config.get("mode", InterpolateModes.NONE.name)]
+            step.kernel = InterpolateKernel[config.get("kernel", InterpolateKernel.LINEAR.name)]
+            step.memory_budget = config.get("memory_budget", 1 * 2**30)
+        return step
 
     def _recalculate(self, _input: FourierData) -> FourierData:
         if self.mode is None or self.mode == InterpolateModes.NONE:
@@ -95,10 +304,6 @@ class InterpolateStep(Step[FourierData, FourierData]):
         y_space = np.linspace(0, y_dim, y_count)
         z_space = np.linspace(0, z_dim, z_count)
 
-        interp = RegularGridInterpolator(
-            (x_space, y_space, z_space), _input.voxel_data, "linear"
-        )
-
         match self.mode:
             case InterpolateModes.CUBE:
                 # I don't think this is safe at all
@@ -154,13 +359,29 @@ class InterpolateStep(Step[FourierData, FourierData]):
         """
         # fmt: on
 
+        # MINIMUM in particular can ask for thousands of samples along every axis
+        output_bytes = nx_count * ny_count * nz_count * _input.voxel_data.itemsize
+        tiled = (
+            isinstance(_input.voxel_data, ChunkedVolume) or output_bytes > self.memory_budget
+        )
+        if tiled and output_bytes > free_bytes():
+            print(
+                f"WARNING, INTERPOLATING TO {nx_count}x{ny_count}x{nz_count} NEEDS "
+                f"{output_bytes / 2**30:.1f} GiB, MORE THAN IS FREE FOR TEMPORARY FILES"
+            )
+            return _input
+
         nx_space = np.linspace(0, x_dim, nx_count)
         ny_space = np.linspace(0, y_dim, ny_count)
         nz_space = np.linspace(0, z_dim, nz_count)
-        ix, iy, iz = np.meshgrid(
-            nx_space, ny_space, nz_space, sparse=True, indexing="ij"
+
+        interpolate = _interpolate_tiled if tiled else _interpolate
+        interpolated_data = interpolate(
+            _input.voxel_data,
+            (x_space, y_space, z_space),
+            (nx_space, ny_space, nz_space),
+            self.kernel,
         )
-        interpolated_data = interp((ix, iy, iz))
         return FourierData(
             _input.orientation,
             _input.voxel_dimensions,
@@ -0,0 +1,214 @@
+"""
+Content addressed on-disk cache of step outputs.
+
+Every step has a provenance: a digest of the loaded files' contents and the
+settings of that step and every step above it. Two outputs with the same
+provenance are the same data, so a step with a cache attached first looks its
+provenance up on disk and only recalculates on a miss. Reopening a scan with
+the same settings therefore skips the FFT, filtering and interpolation.
+
+Each entry is a <provenance>.npy of the voxel data, memory mapped read-only
+when loaded, beside a <provenance>.json of the rest of the tuple. Chunked
+volumes are written a slab at a time and come back chunked. Once the
+directory grows past max_bytes the least recently used entries are removed.
+
+Dragging a slider recalculates a step every frame or so, and writing every
+one of those outputs to disk would cost far more than it ever saves. With
+defer_writes only the newest output of each step is kept, in memory, until
+persist is called once the settings have settled.
+"""
+
+from __future__ import annotations
+import json
+import os
+from hashlib import blake2b
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from pyMRI.processing.chunked import ChunkedVolume
+from pyMRI.processing.data import FileData, FourierData, Unit
+
+_DIGEST_SIZE = 16
+_READ_CHUNK = 2**22
+_PARTIAL_SUFFIX = ".partial"
+
+# (resolved path, size, modification time) -> digest
+_file_digests: dict[tuple[str, int, int], str] = {}
+
+
+def default_cache_directory() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "pyMRI"
+
+
+def file_digest(path: str | Path) -> str:
+    """Hash the contents of a file, remembered until the file changes."""
+    path = Path(path).resolve()
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_digests:
+        digest = blake2b(digest_size=_DIGEST_SIZE)
+        with open(path, "rb") as f:
+            while chunk := f.read(_READ_CHUNK):
+                digest.update(chunk)
+        _file_digests[key] = digest.hexdigest()
+    return _file_digests[key]
+
+
+def settings_digest(upstream: str | None, name: str, settings: dict) -> str:
+    digest = blake2b(digest_size=_DIGEST_SIZE)
+    digest.update((upstream or "").encode())
+    digest.update(name.encode())
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class PipelineCache:
+
+    def __init__(
+        self,
+        directory: str | Path = None,
+        max_bytes: int = 2 * 2**30,
+        defer_writes: bool = False,
+    ):
+        self.directory: Path = Path(directory or default_cache_directory())
+        self.max_bytes: int = max_bytes
+        self.defer_writes: bool = defer_writes
+        # slot (i.e. the step) -> its newest entry not yet written
+        self._pending: dict[Any, tuple[str, FileData | FourierData]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        return self.directory / f"{key}.npy", self.directory / f"{key}.json"
+
+    def attach(self, *steps) -> None:
+        for step in steps:
+            step._safe_set("_pipeline_cache", self)
+
+    def detach(self, *steps) -> None:
+        for step in steps:
+            if step._pipeline_cache is self:
+                step._safe_set("_pipeline_cache", None)
+
+    def __contains__(self, key: str) -> bool:
+        data_path, meta_path = self._paths(key)
+        return data_path.is_file() and meta_path.is_file()
+
+    @property
+    def pending(self) -> int:
+        """How many outputs are waiting to be persisted."""
+        return len(self._pending)
+
+    def get(self, key: str) -> FileData | FourierData | None:
+        for pending_key, data in tuple(self._pending.values()):
+            if pending_key == key:
+                self.hits += 1
+                return data
+
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r") as meta_file:
+                meta = json.load(meta_file)
+            voxel_data = np.load(data_path, mmap_mode="r")
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # Refresh the entry so it is the last to be evicted
+        for path in (data_path, meta_path):
+            path.touch()
+        self.hits += 1
+
+        if meta.get("chunked", False):
+            voxel_data = ChunkedVolume(voxel_data)
+
+        tuple_type = FileData if meta["type"] == FileData.__name__ else FourierData
+        return tuple_type(
+            meta["orientation"],
+            tuple(meta["voxel_dimensions"]),
+            Unit[meta["voxel_unit"]],
+            tuple(meta["voxel_counts"]),
+            voxel_data,
+        )
+
+    def put(self, key: str, data: FileData | FourierData, slot: Any = None) -> None:
+        """
+        Store data under key. When writes are deferred it replaces the last
+        output put in the same slot instead, until persist writes it.
+        """
+        if data.voxel_data.nbytes > self.max_bytes:
+            return
+        if self.defer_writes:
+            self._pending[slot] = (key, data)
+            return
+        self._write(key, data)
+
+    def persist(self) -> None:
+        """Write every deferred output to disk."""
+        pending, self._pending = self._pending, {}
+        for key, data in pending.values():
+            if key not in self:
+                self._write(key, data)
+
+    def _write(self, key: str, data: FileData | FourierData) -> None:
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data_path, meta_path = self._paths(key)
+        meta = {
+            "type": type(data).__name__,
+            "orientation": data.orientation,
+            "voxel_dimensions": list(data.voxel_dimensions),
+            "voxel_unit": data.voxel_unit.name,
+            "voxel_counts": list(data.voxel_counts),
+            "chunked": isinstance(data.voxel_data, ChunkedVolume),
+        }
+        try:
+            # Write then rename so a crash never leaves a half written entry.
+            # The partial name doesn't match *.npy, so it is never taken for one
+            partial = data_path.with_name(data_path.name + _PARTIAL_SUFFIX)
+            if isinstance(data.voxel_data, ChunkedVolume):
+                self._save_chunked(partial, data.voxel_data)
+            else:
+                # Through a handle, np.save would append .npy to the name
+                with open(partial, "wb") as partial_file:
+                    np.save(partial_file, np.asarray(data.voxel_data))
+            partial.replace(data_path)
+            with open(meta_path, "w") as meta_file:
+                json.dump(meta, meta_file)
+        except OSError as e:
+            print(f"WARNING, FAILED TO CACHE STEP OUTPUT: {e}")
+            return
+
+        self._evict()
+
+    @staticmethod
+    def _save_chunked(path: Path, volume: ChunkedVolume) -> None:
+        out = np.lib.format.open_memmap(path, "w+", volume.dtype, volume.shape)
+        for rows in volume.slabs():
+            out[rows] = volume[rows]
+        out.flush()
+        del out
+
+    def nbytes(self) -> int:
+        return sum(path.stat().st_size for path in self.directory.glob("*.npy"))
+
+    def _evict(self) -> None:
+        entries = sorted(
+            (path.stat().st_mtime_ns, path.stat().st_size, path)
+            for path in self.directory.glob("*.npy")
+        )
+        total = sum(size for _, size, _ in entries)
+        for _, size, data_path in entries:
+            if total <= self.max_bytes:
+                break
+            data_path.unlink(missing_ok=True)
+            data_path.with_suffix(".json").unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        for pattern in ("*.npy", "*.json", f"*{_PARTIAL_SUFFIX}"):
+            for path in self.directory.glob(pattern):
+                path.unlink(missing_ok=True)
@@ -0,0 +1,178 @@
+"""
+Out-of-core volumes for the processing pipeline.
+
+A ChunkedVolume is a 3D array, normally a memmap, that is only ever touched a
+slab of rows (along the first axis) at a time. Steps given one as their
+voxel_data work through it slab by slab and write their result to a new
+ChunkedVolume backed by a temporary file, so no more than a few slabs are
+ever in memory at once and a scan larger than RAM can still be processed.
+The results are identical to processing the whole array in memory.
+"""
+
+from __future__ import annotations
+import os
+from shutil import disk_usage
+from tempfile import NamedTemporaryFile, gettempdir
+from typing import Callable, Iterator
+from weakref import finalize
+
+import numpy as np
+
+from pyMRI.processing.data import FourierNorm, FFTBackend
+from pyMRI.processing.fft import fftn as _fftn
+
+# Roughly how large each slab read or written at once is
+CHUNK_BYTES = 64 * 2**20
+
+
+def chunk_rows(shape: tuple[int, ...], dtype: np.dtype, chunk_bytes: int = CHUNK_BYTES) -> int:
+    row_bytes = int(np.prod(shape[1:])) * np.dtype(dtype).itemsize
+    return max(1, min(shape[0], chunk_bytes // max(row_bytes, 1)))
+
+
+def free_bytes(directory: str = None) -> int:
+    """How much room is left for temporary volumes."""
+    return disk_usage(directory or gettempdir()).free
+
+
+def _remove(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass  # still mapped somewhere (windows), the OS cleans up temp files
+
+
+class ChunkedVolume:
+
+    def __init__(self, array: np.ndarray, chunk: int = None):
+        if array.ndim != 3:
+            raise ValueError(f"Expected a 3D volume, got shape {array.shape}")
+        self._array: np.ndarray = array
+        self.chunk: int = chunk or chunk_rows(array.shape, array.dtype)
+
+    @classmethod
+    def empty(
+        cls, shape: tuple[int, int, int], dtype: np.dtype, chunk: int = None, directory: str = None
+    ) -> ChunkedVolume:
+        """A new volume backed by a temporary file, removed once it is collected."""
+        with NamedTemporaryFile(
+            prefix="pyMRI-", suffix=".volume", dir=directory or gettempdir(), delete=False
+        ) as backing:
+            path = backing.name
+        array = np.memmap(path, dtype, "w+", shape=tuple(shape))
+        volume = cls(array, chunk)
+        finalize(volume, _remove, path)
+        return volume
+
+    @classmethod
+    def from_array(cls, array: np.ndarray, chunk: int = None, directory: str = None) -> ChunkedVolume:
+        volume = cls.empty(array.shape, array.dtype, chunk, directory)
+        for rows in volume.slabs():
+            volume[rows] = array[rows]
+        return volume
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return self._array.shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._array.dtype
+
+    @property
+    def ndim(self) -> int:
+        return 3
+
+    @property
+    def size(self) -> int:
+        return self._array.size
+
+    @property
+    def itemsize(self) -> int:
+        return self._array.itemsize
+
+    @property
+    def nbytes(self) -> int:
+        return self._array.nbytes
+
+    def slabs(self, chunk: int = None, axis: int = 0) -> Iterator[slice]:
+        """Slices covering the volume chunk rows along an axis at a time."""
+        chunk = chunk or self.chunk
+        count = self.shape[axis]
+        for start in range(0, count, chunk):
+            yield slice(start, min(start + chunk, count))
+
+    def __getitem__(self, key) -> np.ndarray:
+        return np.asarray(self._array[key])
+
+    def __setitem__(self, key, value) -> None:
+        self._array[key] = value
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        # Only for volumes known to fit in memory (i.e. tests or small scans)
+        return np.array(self._array, dtype)
+
+    def map(
+        self, func: Callable[[np.ndarray, slice], np.ndarray], dtype: np.dtype = None
+    ) -> ChunkedVolume:
+        """Apply func to every slab (given its rows) writing to a new volume."""
+        out = ChunkedVolume.empty(self.shape, dtype or self.dtype, self.chunk)
+        for rows in self.slabs():
+            out[rows] = func(self[rows], rows)
+        return out
+
+    def reduce(self, func: Callable[[np.ndarray], float], combine: Callable = max) -> float:
+        """Reduce every slab with func, then combine the slab results."""
+        result = None
+        for rows in self.slabs():
+            value = func(self[rows])
+            result = value if result is None else combine(result, value)
+        return result
+
+    def astype(self, dtype: np.dtype, copy: bool = True) -> ChunkedVolume:
+        if not copy and np.dtype(dtype) == self.dtype:
+            return self
+        return self.map(lambda slab, _: slab.astype(dtype), dtype)
+
+
+def roll(volume: ChunkedVolume, shifts: tuple[int, int, int]) -> ChunkedVolume:
+    """np.roll over every axis, each output slab gathers the rows it wraps from."""
+    out = ChunkedVolume.empty(volume.shape, volume.dtype, volume.chunk)
+    count = volume.shape[0]
+    for rows in out.slabs():
+        source = (np.arange(rows.start, rows.stop) - shifts[0]) % count
+        out[rows] = np.roll(volume[source], shifts[1:], (1, 2))
+    return out
+
+
+def fftn(
+    volume: ChunkedVolume,
+    axes: tuple[int, ...],
+    norm: FourierNorm = FourierNorm.BACKWARD,
+    inverse: bool = False,
+    backend: FFTBackend = FFTBackend.SCIPY,
+    workers: int = -1,
+) -> ChunkedVolume:
+    """
+    The FFT over axes in two passes: the last two axes a slab of rows at a
+    time, then the first axis a slab of columns at a time. Every norm is a
+    product of per axis factors, so splitting the axes gives the same result.
+    """
+    axes = tuple(axis % 3 for axis in axes)
+    dtype = np.result_type(volume.dtype, np.complex64)
+    out = ChunkedVolume.empty(volume.shape, dtype, volume.chunk)
+
+    row_axes = tuple(axis for axis in axes if axis != 0)
+    for rows in volume.slabs():
+        slab = volume[rows]
+        if row_axes:
+            slab = _fftn(slab, row_axes, norm, inverse, backend, workers)
+        out[rows] = slab
+
+    if 0 in axes:
+        column_chunk = chunk_rows(
+            (volume.shape[1], volume.shape[0], volume.shape[2]), dtype
+        )
+        for columns in out.slabs(column_chunk, axis=1):
+            out[:, columns] = _fftn(out[:, columns], (0,), norm, inverse, backend, workers)
+    return out
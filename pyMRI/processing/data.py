@@ -2,7 +2,7 @@ from __future__ import annotations
 from typing import NamedTuple, Literal, Self
 from enum import Enum, StrEnum, auto
 
-from numpy import ndarray, complexfloating
+from numpy import ndarray, complexfloating, dtype, complex64, complex128
 
 from arcade.gl import Texture2D
 
@@ -23,6 +23,43 @@ class FourierMode(Enum):
                 return "3D"
 
 
+class Precision(Enum):
+    SINGLE = auto()  # complex64 / float32, what prospa stores
+    DOUBLE = auto()  # complex128 / float64
+
+    @staticmethod
+    def to_str(precision: Precision) -> str:
+        match precision:
+            case Precision.SINGLE:
+                return "single"
+            case Precision.DOUBLE:
+                return "double"
+
+    @staticmethod
+    def to_dtype(precision: Precision) -> dtype:
+        match precision:
+            case Precision.SINGLE:
+                return dtype(complex64)
+            case Precision.DOUBLE:
+                return dtype(complex128)
+
+
+class FFTBackend(Enum):
+    NUMPY = auto()  # single threaded, always available
+    SCIPY = auto()  # multi-threaded through scipy.fft workers
+    PYFFTW = auto()  # multi-threaded FFTW, only if pyfftw is installed
+
+    @staticmethod
+    def to_str(backend: FFTBackend) -> str:
+        match backend:
+            case FFTBackend.NUMPY:
+                return "numpy"
+            case FFTBackend.SCIPY:
+                return "scipy"
+            case FFTBackend.PYFFTW:
+                return "pyFFTW"
+
+
 class FilterMode(Enum):
     GAUSSIAN = auto()
     BOX = auto()
@@ -153,6 +190,25 @@ class InterpolateModes(Enum):
     MINIMUM = auto()  # make the voxels as fine as possible
 
 
+class InterpolateKernel(Enum):
+    LINEAR = auto()  # 2 taps per axis, trilinear
+    CUBIC = auto()  # 4 taps per axis, Keys/Catmull-Rom
+    LANCZOS = auto()  # 6 taps per axis, Lanczos-3 windowed sinc
+    FOURIER = auto()  # zero pad the spectrum, sinc interpolation of band limited data
+
+    @staticmethod
+    def to_str(kernel: InterpolateKernel) -> str:
+        match kernel:
+            case InterpolateKernel.LINEAR:
+                return "linear"
+            case InterpolateKernel.CUBIC:
+                return "cubic"
+            case InterpolateKernel.LANCZOS:
+                return "lanczos"
+            case InterpolateKernel.FOURIER:
+                return "fourier"
+
+
 type Orientation = Literal[
     "x",  # implicit yz-x
     "y",  # implicit xz-y
@@ -0,0 +1,87 @@
+"""
+Pluggable FFT backends for the FourierStep.
+
+numpy is always available but only ever uses a single core. scipy.fft and
+pyFFTW can both split a transform across worker threads. When a backend
+can't be imported it is quietly swapped for numpy.
+"""
+
+from os import cpu_count
+
+import numpy as np
+
+from pyMRI.processing.data import FFTBackend, FourierNorm
+
+try:
+    import scipy.fft as scipy_fft
+except ImportError:
+    scipy_fft = None
+
+try:
+    import pyfftw
+    import pyfftw.interfaces.numpy_fft as fftw_fft
+
+    # Keep the FFTW plans alive between calls so repeated transforms are cheap
+    pyfftw.interfaces.cache.enable()
+except ImportError:
+    pyfftw = None
+    fftw_fft = None
+
+
+def available_backends() -> tuple[FFTBackend, ...]:
+    return tuple(backend for backend in FFTBackend if is_available(backend))
+
+
+def is_available(backend: FFTBackend) -> bool:
+    match backend:
+        case FFTBackend.NUMPY:
+            return True
+        case FFTBackend.SCIPY:
+            return scipy_fft is not None
+        case FFTBackend.PYFFTW:
+            return fftw_fft is not None
+    return False
+
+
+def resolve_backend(backend: FFTBackend) -> FFTBackend:
+    if backend is None or not is_available(backend):
+        return FFTBackend.NUMPY
+    return backend
+
+
+def resolve_workers(workers: int) -> int:
+    """
+    Follows scipy.fft, so negative worker counts wrap around from the number
+    of cores (-1 being every core).
+    """
+    cores = cpu_count() or 1
+    if workers < 0:
+        workers = cores + 1 + workers
+    return max(1, min(workers, cores))
+
+
+def fftn(
+    data: np.ndarray,
+    axes: tuple[int, ...],
+    norm: FourierNorm = FourierNorm.BACKWARD,
+    inverse: bool = False,
+    backend: FFTBackend = FFTBackend.SCIPY,
+    workers: int = -1,
+) -> np.ndarray:
+    """
+    Calculate the n-dimensional (inverse) FFT of data over the given axes
+    with the first available of the requested backend or numpy.
+    """
+    norm = str(FourierNorm(norm))
+    match resolve_backend(backend):
+        case FFTBackend.SCIPY:
+            func = scipy_fft.ifftn if inverse else scipy_fft.fftn
+            return func(data, None, axes, norm, workers=resolve_workers(workers))
+        case FFTBackend.PYFFTW:
+            func = fftw_fft.ifftn if inverse else fftw_fft.fftn
+            return func(data, None, axes, norm=norm, threads=resolve_workers(workers))
+        case _:
+            # numpy before 2.0 always computes in double precision
+            func = np.fft.ifftn if inverse else np.fft.fftn
+            result = func(data, None, axes, norm)
+            return result.astype(np.result_type(data.dtype, np.complex64), copy=False)
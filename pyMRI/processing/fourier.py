@@ -1,7 +1,22 @@
+from collections import OrderedDict
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Self
+from weakref import ref
+
 import numpy as np
 
 from pyMRI.processing.step import Step
-from pyMRI.processing.data import FileData, FourierData, FourierMode, FourierNorm
+from pyMRI.processing.data import (
+    FileData,
+    FourierData,
+    FourierMode,
+    FourierNorm,
+    FFTBackend,
+)
+from pyMRI.processing.fft import fftn
+from pyMRI.processing import chunked
+from pyMRI.processing.chunked import ChunkedVolume
 
 
 # TODO
@@ -15,18 +30,34 @@ class ShiftStep(Step[FileData, FourierData]):
     def _reset(self) -> None:
         self.shifts = (0, 0, 0)
 
+    def serialise(self) -> dict:
+        return {"shifts": list(self.shifts)}
+
+    @classmethod
+    def deserialise(cls, config: dict, next_step: Step = None) -> Self:
+        step = cls(next_step)
+        with step.unready():
+            step.shifts = tuple(config.get("shifts", (0, 0, 0)))
+        return step
+
     def _recalculate(self, _input: FileData) -> FourierData:
         if not any(self.shifts):
             return _input
 
+        if isinstance(_input.voxel_data, ChunkedVolume):
+            return _input.update(voxel_data=chunked.roll(_input.voxel_data, self.shifts))
+
         return _input.update(
             voxel_data=np.roll(_input.voxel_data, self.shifts, (0, 1, 2)),
         )
 
 
+@lru_cache(maxsize=64)
 def _gaussian_kernal1d(sx, nsig, offset = 0.0):
     x = np.linspace(-0.5 * (sx - 1), 0.5 * (sx - 1), sx)
     gx = np.exp(-0.5 * np.square(np.abs(x) - offset) / np.square(nsig))
+    # Shared by every caller through the cache
+    gx.flags.writeable = False
     return gx
 
 def _gaussian_kernal2d(shape, nsig):
@@ -37,27 +68,34 @@ def _gaussian_kernal2d(shape, nsig):
     return np.einsum("i,j->jk", gx, gy)
 
 
-def _gaussian_kernal3d(shape, nsig):
-    sx, sy, sz = shape
-    gx = [1,] if sx == 1 else _gaussian_kernal1d(sx, nsig)
-    gy = [1,] if sy == 1 else _gaussian_kernal1d(sy, nsig)
-    gz = [1,] if sz == 1 else _gaussian_kernal1d(sz, nsig)
-    return np.einsum("i,j,k->ijk", gx, gy, gz)
-
-def _inverse_gaussian_kernal3d(shape, nsig):
-    sx, sy, sz = shape
-    gx = [1,] if sx == 1 else _gaussian_kernal1d(sx, nsig)
-    gy = [1,] if sy == 1 else _gaussian_kernal1d(sy, nsig)
-    gz = [1,] if sz == 1 else _gaussian_kernal1d(sz, nsig)
-    return 1 - np.einsum("i,j,k->ijk", gx, gy, gz)
-
-def _band_gaussian_kernal3d(shape, nsig, offset):
-    sx, sy, sz = shape
-    gx = [1,] if sx == 1 else _gaussian_kernal1d(sx, nsig, offset)
-    gy = [1,] if sy == 1 else _gaussian_kernal1d(sy, nsig, offset)
-    gz = [1,] if sz == 1 else _gaussian_kernal1d(sz, nsig, offset)
-    return np.einsum("i,j,k->ijk", gx, gy, gz)
-
+@lru_cache(maxsize=32)
+def _gaussian_kernal3d(
+    shape: tuple[int, int, int], nsig: float, offset: float = 0.0
+) -> tuple[tuple[np.ndarray, np.ndarray, np.ndarray], float]:
+    """
+    The 3D gaussian kernel as its three 1D factors, plus the sum of the full
+    kernel (the product of the sums of each factor). Never builds the 3D array.
+    """
+    kernals = tuple(
+        np.ones(1) if size == 1 else _gaussian_kernal1d(size, nsig, offset)
+        for size in shape
+    )
+    total = float(np.prod([np.sum(kernal) for kernal in kernals]))
+    return kernals, total
+
+
+def _apply_separable(
+    data: np.ndarray, kernals: tuple[np.ndarray, np.ndarray, np.ndarray]
+) -> np.ndarray:
+    """
+    Multiply data by the outer product of three 1D kernels as three broadcast
+    multiplies into a single new array.
+    """
+    kx, ky, kz = (kernal.astype(np.finfo(data.dtype).dtype) for kernal in kernals)
+    out = data * kx[:, None, None]
+    out *= ky[None, :, None]
+    out *= kz[None, None, :]
+    return out
 
 
 # TODO
@@ -83,29 +121,156 @@ class FilterStep(Step[FourierData, FourierData]):
         self.high_pass_radius = 1.0
         self.band_pass_radius = 1.0
         self.band_pass_target = 0.0
-        
+
+    def serialise(self) -> dict:
+        return {
+            "low_pass": self.low_pass,
+            "high_pass": self.high_pass,
+            "band_pass": self.band_pass,
+            "low_pass_radius": self.low_pass_radius,
+            "high_pass_radius": self.high_pass_radius,
+            "band_pass_radius": self.band_pass_radius,
+            "band_pass_target": self.band_pass_target,
+        }
+
+    @classmethod
+    def deserialise(cls, config: dict, next_step: Step = None) -> Self:
+        step = cls(next_step)
+        with step.unready():
+            step.low_pass = config.get("low_pass", False)
+            step.high_pass = config.get("high_pass", False)
+            step.band_pass = config.get("band_pass", False)
+            step.low_pass_radius = config.get("low_pass_radius", 1.0)
+            step.high_pass_radius = config.get("high_pass_radius", 1.0)
+            step.band_pass_radius = config.get("band_pass_radius", 1.0)
+            step.band_pass_target = config.get("band_pass_target", 0.0)
+        return step
 
     def _recalculate(self, _input: FourierData) -> FourierData:
         if not (self.low_pass or self.high_pass or self.band_pass):
             return _input
 
-        filtered = _input.voxel_data
+        shape = _input.voxel_data.shape
+
+        # The low and band pass gaussians are separable, so they are folded
+        # into one set of 1D factors along with every normalisation constant.
+        factors = [np.ones(size) for size in shape]
+        scale = 1.0
 
         if self.low_pass:
-            low_kern = _gaussian_kernal3d(_input.voxel_data.shape, self.low_pass_radius)
-            filtered = filtered * low_kern / np.sum(low_kern)
+            low_kern, low_sum = _gaussian_kernal3d(shape, self.low_pass_radius)
+            factors = [f * k for f, k in zip(factors, low_kern)]
+            scale /= low_sum
 
         if self.high_pass:
-            high_kern = _inverse_gaussian_kernal3d(
-                _input.voxel_data.shape, self.high_pass_radius
-            )
-            filtered = filtered * high_kern / np.sum(high_kern)
+            # 1 - g isn't separable, but its sum is N - sum(g)
+            high_kern, high_sum = _gaussian_kernal3d(shape, self.high_pass_radius)
+            scale /= np.prod(shape) - high_sum
 
         if self.band_pass:
-            band_kern = _band_gaussian_kernal3d(_input.voxel_data.shape, self.band_pass_radius, self.band_pass_target)
-            filtered = filtered * band_kern / np.sum(band_kern)
-
-        return _input.update(voxel_data=filtered)
+            band_kern, band_sum = _gaussian_kernal3d(
+                shape, self.band_pass_radius, self.band_pass_target
+            )
+            factors = [f * k for f, k in zip(factors, band_kern)]
+            scale /= band_sum
+
+        factors[0] = factors[0] * scale
+
+        def apply(data: np.ndarray, rows: slice) -> np.ndarray:
+            filtered = _apply_separable(data, (factors[0][rows], *factors[1:]))
+            if self.high_pass:
+                # data * k * (1 - g) = data * k - (data * k) * g
+                filtered -= _apply_separable(filtered, (high_kern[0][rows], *high_kern[1:]))
+            return filtered
+
+        if isinstance(_input.voxel_data, ChunkedVolume):
+            return _input.update(voxel_data=_input.voxel_data.map(apply))
+        return _input.update(voxel_data=apply(_input.voxel_data, slice(None)))
+
+
+class FourierCache:
+    """
+    A bounded LRU cache of fourier step results.
+
+    Entries are keyed on the input array and the transform parameters. By
+    default the input is identified by the array object itself, so an entry is
+    dropped as soon as its input is garbage collected. With hash_inputs the key
+    is a digest of the input's contents instead, which also matches equal data
+    recomputed by an earlier step at the cost of hashing every input.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 2**20, hash_inputs: bool = False):
+        self.max_bytes: int = max_bytes
+        self.hash_inputs: bool = hash_inputs
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._sources: dict[tuple, ref] = {}
+        self._nbytes: int = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _key(
+        self, data: np.ndarray, axes: tuple[int, ...], norm: FourierNorm, inverse: bool
+    ) -> tuple:
+        if self.hash_inputs:
+            source = blake2b(np.ascontiguousarray(data), digest_size=16).digest()
+        else:
+            source = id(data)
+        return (source, data.shape, data.dtype.str, axes, str(norm), inverse)
+
+    def get(
+        self, data: np.ndarray, axes: tuple[int, ...], norm: FourierNorm, inverse: bool
+    ) -> np.ndarray | None:
+        key = self._key(data, axes, norm, inverse)
+        source = self._sources.get(key)
+        if key not in self._entries or (source is not None and source() is not data):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(
+        self,
+        data: np.ndarray,
+        axes: tuple[int, ...],
+        norm: FourierNorm,
+        inverse: bool,
+        result: np.ndarray,
+    ) -> None:
+        if result.nbytes > self.max_bytes:
+            return
+
+        key = self._key(data, axes, norm, inverse)
+        self._discard(key)
+
+        # Results are shared between every hit, so nobody gets to change them
+        result.flags.writeable = False
+        self._entries[key] = result
+        self._nbytes += result.nbytes
+        if not self.hash_inputs:
+            self._sources[key] = ref(data, lambda _, key=key: self._discard(key))
+
+        while self._nbytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: tuple) -> None:
+        result = self._entries.pop(key, None)
+        self._sources.pop(key, None)
+        if result is not None:
+            self._nbytes -= result.nbytes
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._sources.clear()
+        self._nbytes = 0
 
 
 class FourierStep(Step[FileData, FourierData]):
@@ -116,12 +281,49 @@ class FourierStep(Step[FileData, FourierData]):
             self.inverse: bool = False
             self.mode: FourierMode = FourierMode.THREE
             self.norm: FourierNorm = FourierNorm.BACKWARD
+            self.backend: FFTBackend = FFTBackend.SCIPY
+            self.workers: int = -1  # every core
+            self._cache: FourierCache = FourierCache()
 
     def _reset(self) -> None:
         self.should = False
         self.inverse = False
         self.mode = FourierMode.THREE
         self.norm = FourierNorm.BACKWARD
+        # The backend and workers are machine preferences, so they survive resets
+
+    @property
+    def cache(self) -> FourierCache:
+        return self._cache
+
+    def serialise(self) -> dict:
+        return {
+            "should": self.should,
+            "inverse": self.inverse,
+            "mode": self.mode.name,
+            "norm": self.norm.value,
+            "backend": self.backend.name,
+            "workers": self.workers,
+        }
+
+    def _provenance_settings(self) -> dict:
+        # Which library or how many threads does the FFT doesn't change its result
+        settings = self.serialise()
+        settings.pop("backend")
+        settings.pop("workers")
+        return settings
+
+    @classmethod
+    def deserialise(cls, config: dict, next_step: Step = None) -> Self:
+        step = cls(next_step)
+        with step.unready():
+            step.should = config.get("should", False)
+            step.inverse = config.get("inverse", False)
+            step.mode = FourierMode[config.get("mode", FourierMode.THREE.name)]
+            step.norm = FourierNorm(config.get("norm", FourierNorm.BACKWARD.value))
+            step.backend = FFTBackend[config.get("backend", FFTBackend.SCIPY.name)]
+            step.workers = config.get("workers", -1)
+        return step
 
     def _recalculate(self, _input: FileData) -> FourierData | None:
         if not self.should:
@@ -134,7 +336,6 @@ class FourierStep(Step[FileData, FourierData]):
             with self.unready():
                 self.mode = FourierMode.TWO
 
-        transformed_data = np.zeros(_input.voxel_data.shape, dtype=np.complexfloating)
         match self.mode:
             case FourierMode.ONE:
                 axes = (-1,)
@@ -143,13 +344,44 @@ class FourierStep(Step[FileData, FourierData]):
             case FourierMode.THREE:
                 axes = (-3, -2, -1)
 
-        func = np.fft.ifftn if self.inverse else np.fft.fftn
-        func(_input.voxel_data, None, axes, self.norm, transformed_data)
+        if isinstance(_input.voxel_data, ChunkedVolume):
+            # Too large to keep in the in-memory cache, only the pipeline cache sees these
+            transformed_data = chunked.fftn(
+                _input.voxel_data,
+                axes,
+                self.norm,
+                self.inverse,
+                self.backend,
+                self.workers,
+            )
+            magnitude = transformed_data.map(
+                lambda slab, _: np.abs(slab), np.finfo(transformed_data.dtype).dtype
+            )
+            return FourierData(
+                _input.orientation,
+                _input.voxel_dimensions,
+                _input.voxel_unit,
+                _input.voxel_counts,
+                magnitude,
+            )
+
+        magnitude = self._cache.get(_input.voxel_data, axes, self.norm, self.inverse)
+        if magnitude is None:
+            transformed_data = fftn(
+                _input.voxel_data,
+                axes,
+                self.norm,
+                self.inverse,
+                self.backend,
+                self.workers,
+            )
+            magnitude = np.abs(transformed_data)
+            self._cache.put(_input.voxel_data, axes, self.norm, self.inverse, magnitude)
 
         return FourierData(
             _input.orientation,
             _input.voxel_dimensions,
             _input.voxel_unit,
             _input.voxel_counts,
-            np.abs(transformed_data),
+            magnitude,
         )
@@ -1,7 +1,10 @@
 from pathlib import Path
+from typing import Self
 
 from pyMRI.processing.step import Step
-from pyMRI.processing.data import FileData, Unit, Orientation
+from pyMRI.processing.cache import file_digest, settings_digest
+from pyMRI.processing.chunked import ChunkedVolume
+from pyMRI.processing.data import FileData, Unit, Orientation, Precision
 
 from pyMRI.loading.prospa import (
     ProspaData,
@@ -29,8 +32,49 @@ class FileLoaderStep(Step[None, FileData]):
             self.dimension_override: tuple[int, int, int] = None
             self.unit_override: Unit = None
 
+            self.memory_map: bool = False
+            self.chunked: bool = False  # stream every step over slabs, for scans larger than RAM
+            self.precision: Precision = Precision.SINGLE
+
             self.load_data = False
 
+        # Only set by a load, so the GUI changing a setting never changes it
+        self._provenance: str = None
+
+    @property
+    def requires_main_thread(self) -> bool:
+        # A missing path means opening a file dialog
+        return self.data_path is None or (
+            self.parameter_path is None and not self.exclude_parameter_file
+        )
+
+    @property
+    def provenance(self) -> str | None:
+        # The head of the chain, so identified by what was loaded not where from
+        return self._provenance
+
+    def _loaded_provenance(
+        self,
+        parameter_loader: ProspaParametersLoader | None,
+        orient: Orientation,
+        dimensions: tuple[float, float, float],
+        unit: Unit,
+        precision: Precision,
+    ) -> str:
+        """Digest the files and settings a load actually used, not the live ones."""
+        digest = file_digest(self._data_loader.path)
+        if parameter_loader is not None:
+            digest = settings_digest(digest, "parameters", {
+                "digest": file_digest(parameter_loader.path)
+            })
+        return settings_digest(digest, type(self).__name__, {
+            "exclude_parameter_file": parameter_loader is None,
+            "orient_override": orient,
+            "dimension_override": list(dimensions),
+            "unit_override": unit.name,
+            "precision": precision.name,
+        })
+
     def _reset(self) -> None:
         self.data_path = ""
         self._data_loader = None
@@ -45,7 +89,44 @@ class FileLoaderStep(Step[None, FileData]):
         self.dimension_override = None
         self.unit_override = None
 
+        self.memory_map = False
+        self.chunked = False
+        self.precision = Precision.SINGLE
+
         self.load_data = False
+        self._provenance = None
+
+    def serialise(self) -> dict:
+        return {
+            "data_path": self.data_path,
+            "parameter_path": self.parameter_path,
+            "exclude_parameter_file": self.exclude_parameter_file,
+            "orient_override": self.orient_override,
+            "dimension_override": (
+                None if self.dimension_override is None else list(self.dimension_override)
+            ),
+            "unit_override": None if self.unit_override is None else self.unit_override.name,
+            "memory_map": self.memory_map,
+            "chunked": self.chunked,
+            "precision": self.precision.name,
+        }
+
+    @classmethod
+    def deserialise(cls, config: dict, next_step: Step = None) -> Self:
+        step = cls(next_step)
+        dimensions = config.get("dimension_override")
+        unit = config.get("unit_override")
+        with step.unready():
+            step.data_path = config.get("data_path", "")
+            step.parameter_path = config.get("parameter_path", "")
+            step.exclude_parameter_file = config.get("exclude_parameter_file", False)
+            step.orient_override = config.get("orient_override")
+            step.dimension_override = None if dimensions is None else tuple(dimensions)
+            step.unit_override = None if unit is None else Unit[unit]
+            step.memory_map = config.get("memory_map", False)
+            step.chunked = config.get("chunked", False)
+            step.precision = Precision[config.get("precision", Precision.SINGLE.name)]
+        return step
 
     def _recalculate(self, _input: None) -> FileData | None:
         # If the data path is invalid then we are done here
@@ -64,19 +145,22 @@ class FileLoaderStep(Step[None, FileData]):
                 if self.parameter_path is None
                 else Path(self.parameter_path).parent
             )
-            if self._next is not None:
-                self._next.reset()
-            self._data_loader = ProspaDataLoader.fetch(start_folder)
+            self._reset_next()
+            self._data_loader = ProspaDataLoader.fetch(
+                start_folder, memory_map=self.memory_map
+            )
             with self.unready():
                 self.parameter_path = ""
                 self._parameter_loader = None
         elif self._data_loader is None or self.data_path != self._data_loader.path:
-            if self._next is not None:
-                self._next.reset()
-            self._data_loader = ProspaDataLoader(self.data_path)
+            self._reset_next()
+            self._data_loader = ProspaDataLoader(self.data_path, self.memory_map)
             with self.unready():
                 self.parameter_path = ""
                 self._parameter_loader = None
+        elif self.memory_map != self._data_loader.memory_map:
+            # Same file, just a different way of accessing it
+            self._data_loader = ProspaDataLoader(self.data_path, self.memory_map)
 
         # If the data loader failed to be created then we bounce
         if self._data_loader is None:
@@ -146,9 +230,10 @@ class FileLoaderStep(Step[None, FileData]):
         unit = Unit.MM
 
         # If we actually want to use the parameter file
-        if not self.exclude_parameter_file:
+        parameter_loader = None if self.exclude_parameter_file else self._parameter_loader
+        if parameter_loader is not None:
             # load the parameter file
-            parameters: ProspaParameters = self._parameter_loader.data
+            parameters: ProspaParameters = parameter_loader.data
 
             # Get the actual values from the parameter file
             orient = parameters.orient
@@ -160,23 +245,27 @@ class FileLoaderStep(Step[None, FileData]):
             dimensions = (parameters.phase_2, parameters.phase_1, parameters.read)
 
         # Use the override values if they have been set
+        if self.orient_override is not None:
+            orient = self.orient_override
+        if self.dimension_override is not None:
+            dimensions = self.dimension_override
+        if self.unit_override is not None:
+            unit = self.unit_override
         with self.unready():
-            self.orient_override = (
-                orient if self.orient_override is None else self.orient_override
-            )
-            self.dimension_override = (
-                dimensions
-                if self.dimension_override is None
-                else self.dimension_override
-            )
-            self.unit_override = (
-                unit if self.unit_override is None else self.unit_override
+            self.orient_override = orient
+            self.dimension_override = dimensions
+            self.unit_override = unit
+
+        precision = self.precision
+        if self.chunked:
+            # Cast a slab at a time so a memory mapped file is never read in whole
+            voxel_data = ChunkedVolume(data.data).astype(
+                Precision.to_dtype(precision), copy=False
             )
+        else:
+            voxel_data = data.data.astype(Precision.to_dtype(precision), copy=False)
 
-        return FileData(
-            self.orient_override,
-            self.dimension_override,
-            self.unit_override,
-            count,
-            data.data,
+        self._provenance = self._loaded_provenance(
+            parameter_loader, orient, dimensions, unit, precision
         )
+        return FileData(orient, dimensions, unit, count, voxel_data)
@@ -0,0 +1,321 @@
+"""
+Frame based scheduling of a Step chain.
+
+Without a scheduler every public attribute set on a step runs the whole chain
+below it there and then, so changing three settings in one GUI frame processes
+the chain three times. Once a chain is scheduled, setting an attribute only
+marks its step as dirty. Calling flush (once per frame) then updates from the
+earliest dirty step downwards so each step runs at most once per frame.
+
+In background mode flush hands that work to a worker thread instead and
+returns straight away. The outputs of every step are only published, all at
+once and on the calling thread, by a later flush after the job has finished.
+Anything reading step data from the main thread therefore only ever sees a
+completed chain. A setting changed while a job is running supersedes it: the
+stale job stops at the next step boundary, the steps it finished are
+published (so nothing they consumed, i.e. the loader's load_data, is lost)
+and the next job covers the steps it hadn't reached as well as the change.
+Steps which must run on the main thread (i.e. those touching the GL context)
+end the job. Once it is published only that step runs on the main thread,
+and the steps below it are handed back to the worker by the same flush.
+Likewise a step which resets the steps below it (i.e. a new file was
+loaded) ends the job, so the reset happens on the main thread before
+anything below runs with the reset settings.
+"""
+
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from threading import local
+from time import perf_counter
+from typing import Any, NamedTuple
+
+from pyMRI.processing.step import Step, StepTiming
+
+
+class _JobResult(NamedTuple):
+    outputs: tuple[tuple[Step, Any, Any], ...]  # (step, input, output)
+    resume: int | None  # index of the main thread step the job stopped at
+    resume_input: Any
+    resets: tuple[Step, ...] = ()  # steps whose following steps must be reset
+    pending: tuple[int, ...] = ()  # indices of steps still to run afterwards
+    superseded: bool = False  # stopped early as a newer setting changed
+
+
+class StepScheduler:
+
+    def __init__(self, head: Step, background: bool = False):
+        steps = []
+        step = head
+        while step is not None:
+            steps.append(step)
+            step = step._next
+        self._steps: tuple[Step, ...] = tuple(steps)
+        self._dirty: set[int] = set()
+        self._last_flush: float = 0.0
+
+        self.background: bool = background
+        # A single worker, so only one job ever touches the steps at a time
+        self._executor: ThreadPoolExecutor = None
+        self._job: Future[_JobResult] = None
+        self._job_dirty: tuple[int, ...] = ()
+        self._generation: int = 0
+        self._progress: tuple[int, int] = (0, 0)
+        # The resets asked for by, and generation of, the running job. Only
+        # set on the worker
+        self._worker: local = local()
+
+        for step in self._steps:
+            step._safe_set("_scheduler", self)
+
+    @property
+    def steps(self) -> tuple[Step, ...]:
+        return self._steps
+
+    @property
+    def is_dirty(self) -> bool:
+        return len(self._dirty) > 0
+
+    @property
+    def busy(self) -> bool:
+        return self._job is not None
+
+    @property
+    def progress(self) -> float:
+        """How far through its steps the current background job is, from 0 to 1."""
+        done, total = self._progress
+        if self._job is None or total == 0:
+            return 1.0
+        return done / total
+
+    @property
+    def last_flush_time(self) -> float:
+        return self._last_flush
+
+    @property
+    def timings(self) -> tuple[tuple[Step, StepTiming], ...]:
+        return tuple((step, step.timing) for step in self._steps)
+
+    def reset_timings(self) -> None:
+        for step in self._steps:
+            step.reset_timing()
+
+    def mark_dirty(self, step: Step) -> None:
+        self._dirty.add(self._steps.index(step))
+
+    def defer_reset(self, step: Step) -> bool:
+        """
+        Whether the steps after step will be reset when the job is published,
+        False when not called from the worker so they should be reset now.
+        """
+        resets = getattr(self._worker, "resets", None)
+        if resets is None:
+            return False
+        resets.append(step)
+        return True
+
+    def is_current(self) -> bool:
+        """
+        Whether no setting has changed since the running job was submitted,
+        so what it calculates matches the settings it was keyed by. Always
+        True when not called from the worker.
+        """
+        generation = getattr(self._worker, "generation", None)
+        if generation is None:
+            return True
+        return generation == self._generation and not self._dirty
+
+    def detach(self) -> None:
+        """Return every step to updating as soon as an attribute changes."""
+        self.background = False
+        self.flush()
+        for step in self._steps:
+            step._safe_set("_scheduler", None)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def run(self, func, *args) -> Future:
+        """
+        Call func on the worker, after any job already running, or straight
+        away when not in background mode. For work which belongs with the
+        pipeline's but isn't a step, i.e. preparing its output for drawing.
+        """
+        if not self.background:
+            future = Future()
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(1, "step-scheduler")
+        return self._executor.submit(func, *args)
+
+    def wait(self, timeout: float = None) -> None:
+        """Block until the current background job (if any) has finished."""
+        if self._job is not None:
+            wait((self._job,), timeout)
+
+    def flush(self) -> None:
+        """Run every dirty step (and those below it) at most once."""
+        start = perf_counter()
+        if self.background:
+            self._publish()
+            if self._dirty:
+                self._submit()
+        else:
+            if self._job is not None:
+                self.wait()
+                self._publish()
+            if self._dirty:
+                self._run()
+        self._last_flush = perf_counter() - start
+
+    def _run(self) -> None:
+        dirty = sorted(self._dirty)
+        self._dirty.clear()
+
+        processed: set[int] = set()
+        for idx in dirty:
+            if idx in processed:
+                continue
+            # An update cascades down the chain, unless a step has nothing to
+            # output. Any dirty step it didn't reach still needs its own update.
+            calls = [step.timing.calls for step in self._steps]
+            step = self._steps[idx]
+            step.update(step._input)
+            processed.update(
+                i for i, step in enumerate(self._steps) if step.timing.calls != calls[i]
+            )
+
+    def _submit(self) -> None:
+        # A newer setting supersedes the current job. If it hasn't started the
+        # new job covers everything it would have done. Otherwise it stops at
+        # the next step and is published first, its unfinished steps then
+        # joining the dirty ones.
+        if self._job is not None:
+            if not self._job.cancel():
+                self._generation += 1
+                return
+            self._dirty.update(self._job_dirty)
+        dirty = tuple(sorted(self._dirty))
+        self._dirty = set()
+
+        # The cache keys the job's outputs by the settings it was submitted
+        # with, as the GUI can change them again while it is running
+        settings = None
+        if any(step.pipeline_cache is not None for step in self._steps):
+            settings = tuple(step._provenance_settings() for step in self._steps)
+
+        self._generation += 1
+        self._job_dirty = dirty
+        self._progress = (0, len(self._steps) - dirty[0])
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(1, "step-scheduler")
+        self._job = self._executor.submit(self._execute, self._generation, dirty, settings)
+
+    def _execute(
+        self, generation: int, dirty: tuple[int, ...], settings: tuple[dict, ...] | None
+    ) -> _JobResult:
+        self._worker.resets = resets = []
+        self._worker.generation = generation
+        try:
+            return self._execute_steps(generation, dirty, settings, resets)
+        finally:
+            self._worker.resets = None
+            self._worker.generation = None
+
+    def _provenance(self, idx: int, settings: tuple[dict, ...]) -> str | None:
+        """The provenance of step idx with the settings of the job."""
+        # Only a load changes the head's provenance, and loads run on the worker
+        digest = self._steps[0].provenance
+        for step, step_settings in zip(self._steps[1 : idx + 1], settings[1 : idx + 1]):
+            digest = step._digest(digest, step_settings)
+        return digest
+
+    def _execute_steps(
+        self,
+        generation: int,
+        dirty: tuple[int, ...],
+        settings: tuple[dict, ...] | None,
+        resets: list[Step],
+    ) -> _JobResult:
+        outputs = []
+        idx = dirty[0]
+        _input = self._steps[idx]._input
+        while idx < len(self._steps):
+            if generation != self._generation:
+                later = tuple(i for i in dirty if i > idx)
+                return _JobResult(tuple(outputs), None, None, (), (idx, *later), True)
+
+            step = self._steps[idx]
+            if step.requires_main_thread:
+                later = tuple(i for i in dirty if i > idx)
+                return _JobResult(tuple(outputs), idx, _input, (), later)
+
+            key = None if settings is None else self._provenance(idx, settings)
+            _output = step._process(_input, key)
+            self._progress = (idx + 1 - dirty[0], len(self._steps) - dirty[0])
+            if resets:
+                # Everything below was just reset, so it all runs again anyway
+                if _output is not None:
+                    outputs.append((step, _input, _output))
+                following = ()
+                if _output is not None and idx + 1 < len(self._steps):
+                    following = (idx + 1,)
+                return _JobResult(tuple(outputs), None, None, tuple(resets), following)
+            if _output is None:
+                # The cascade stops here, but later dirty steps still need to run
+                later = [i for i in dirty if i > idx]
+                if not later:
+                    break
+                idx = later[0]
+                _input = self._steps[idx]._input
+                continue
+
+            outputs.append((step, _input, _output))
+            _input = _output
+            idx += 1
+
+        return _JobResult(tuple(outputs), None, None)
+
+    def _publish(self) -> None:
+        if self._job is None or not self._job.done():
+            return
+
+        job = self._job
+        self._job = None
+        self._job_dirty = ()
+        if job.cancelled():
+            return
+
+        result = job.result()
+        for step, _input, _output in result.outputs:
+            step._safe_set("_input", _input)
+            step._safe_set("_output", _output)
+        if result.resets:
+            for step in result.resets:
+                step._next.reset()
+        if result.resets or result.superseded:
+            self._continue(result.outputs)
+        self._dirty.update(result.pending)
+
+        if result.resume is not None:
+            # Only the main thread step runs here, the rest goes back to the worker
+            idx = result.resume
+            step = self._steps[idx]
+            _output = step._process(result.resume_input)
+            if _output is not None:
+                step._safe_set("_input", result.resume_input)
+                step._safe_set("_output", _output)
+                self._continue(((step, result.resume_input, _output),))
+                if idx + 1 < len(self._steps):
+                    self._dirty.add(idx + 1)
+
+    def _continue(self, outputs: tuple[tuple[Step, Any, Any], ...]) -> None:
+        # The next step after the last published one runs on its output
+        if outputs:
+            step, _, _output = outputs[-1]
+            if step._next is not None:
+                step._next._safe_set("_input", _output)
@@ -0,0 +1,135 @@
+"""
+Magnitude statistics of a volume, gathered once and shared.
+
+The renderer needs the largest magnitude to normalise the densities and the
+colouring tab wants a histogram of them. Both come from volume_statistics,
+which works through the volume a slab at a time across a pool of threads so
+neither a full sized copy of the magnitudes nor a second scan by another
+consumer is ever needed. Results are remembered for as long as the voxel
+data they describe is alive. A scheduled InterpolateStep gathers them on the
+pipeline's worker, so they are ready before its output is published.
+
+The histogram covers 0 to the largest magnitude, the same range the renderer
+normalises densities to. The percentiles are read from it so they are only
+as precise as one bin.
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+from weakref import ref
+
+import numpy as np
+
+from pyMRI.processing.chunked import ChunkedVolume, chunk_rows
+from pyMRI.processing.fft import resolve_workers
+
+PERCENTILES: tuple[float, ...] = (1.0, 5.0, 50.0, 95.0, 99.0)
+HISTOGRAM_BINS = 256
+
+
+class VolumeStatistics(NamedTuple):
+    count: int
+    minimum: float
+    maximum: float
+    percentiles: tuple[float, ...]  # at each of PERCENTILES
+    histogram: np.ndarray  # voxels per bin, evenly spaced from 0 to maximum
+
+    @property
+    def bin_width(self) -> float:
+        return self.maximum / len(self.histogram)
+
+    def percentile(self, q: float) -> float:
+        """The magnitude q percent of voxels are at or below, to within a bin."""
+        if self.count == 0:
+            return 0.0
+        cumulative = np.cumsum(self.histogram)
+        target = q / 100.0 * self.count
+        index = min(int(np.searchsorted(cumulative, target)), len(self.histogram) - 1)
+        before = cumulative[index - 1] if index > 0 else 0
+        inside = self.histogram[index]
+        fraction = (target - before) / inside if inside else 0.0
+        value = (index + fraction) * self.bin_width
+        return float(min(max(value, self.minimum), self.maximum))
+
+
+# id(voxel data) -> (reference to it, its statistics)
+_statistics: dict[int, tuple[ref, VolumeStatistics]] = {}
+
+
+def _magnitude(slab: np.ndarray) -> np.ndarray:
+    # Exactly how the renderer takes magnitudes, so the maximum matches its peak
+    return np.abs(slab).astype(np.float32, copy=False)
+
+
+def _slabs(data: np.ndarray | ChunkedVolume) -> list[slice]:
+    if isinstance(data, ChunkedVolume):
+        return list(data.slabs())
+    if data.ndim == 0 or data.shape[0] == 0:
+        return [slice(None)]
+    rows = chunk_rows(data.shape, data.dtype)
+    return [slice(start, start + rows) for start in range(0, data.shape[0], rows)]
+
+
+def _range(data: np.ndarray | ChunkedVolume, rows: slice) -> tuple[float, float]:
+    magnitude = _magnitude(data[rows])
+    if magnitude.size == 0:
+        return np.inf, -np.inf
+    return float(magnitude.min()), float(magnitude.max())
+
+
+def _count(data: np.ndarray | ChunkedVolume, rows: slice, scale: float, bins: int) -> np.ndarray:
+    magnitude = _magnitude(data[rows])
+    magnitude *= np.float32(scale)
+    indices = np.minimum(magnitude.astype(np.intp).ravel(), bins - 1)
+    return np.bincount(indices, minlength=bins)
+
+
+def compute_statistics(
+    data: np.ndarray | ChunkedVolume, bins: int = HISTOGRAM_BINS, workers: int = -1
+) -> VolumeStatistics:
+    """
+    Gather the statistics without looking at or filling the cache. Finding the
+    range comes first since the histogram's bins depend on it, each sweep
+    taking the magnitude of one slab per thread at a time.
+    """
+    slabs = _slabs(data)
+    with ThreadPoolExecutor(resolve_workers(workers)) as pool:
+        ranges = list(pool.map(lambda rows: _range(data, rows), slabs))
+        minimum = min((low for low, _ in ranges), default=np.inf)
+        maximum = max((high for _, high in ranges), default=-np.inf)
+        if minimum > maximum:
+            minimum = maximum = 0.0
+
+        scale = bins / maximum if maximum > 0.0 else 0.0
+        histogram = sum(
+            pool.map(lambda rows: _count(data, rows, scale, bins), slabs),
+            np.zeros(bins, np.int64),
+        )
+
+    statistics = VolumeStatistics(int(histogram.sum()), minimum, maximum, (), histogram)
+    return statistics._replace(
+        percentiles=tuple(statistics.percentile(q) for q in PERCENTILES)
+    )
+
+
+def cached_statistics(data: np.ndarray | ChunkedVolume) -> VolumeStatistics | None:
+    """The statistics of data if they have already been gathered, never scanning it."""
+    entry = _statistics.get(id(data))
+    if entry is not None and entry[0]() is data:
+        return entry[1]
+    return None
+
+
+def volume_statistics(
+    data: np.ndarray | ChunkedVolume, bins: int = HISTOGRAM_BINS, workers: int = -1
+) -> VolumeStatistics:
+    """The statistics of data, only gathered the first time they are asked for."""
+    key = id(data)
+    entry = _statistics.get(key)
+    if entry is not None and entry[0]() is data and len(entry[1].histogram) == bins:
+        return entry[1]
+
+    statistics = compute_statistics(data, bins, workers)
+    _statistics[key] = (ref(data, lambda _, key=key: _statistics.pop(key, None)), statistics)
+    return statistics
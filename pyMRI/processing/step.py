@@ -1,26 +1,66 @@
 from __future__ import annotations
 from contextlib import contextmanager
-from typing import NamedTuple, Self, Any
+from threading import local
+from time import perf_counter
+from typing import NamedTuple, Self, Any, TYPE_CHECKING
+
+from pyMRI.instrumentation import INSTRUMENTS
+from pyMRI.processing.cache import settings_digest
+
+if TYPE_CHECKING:
+    from pyMRI.processing.scheduler import StepScheduler
+    from pyMRI.processing.cache import PipelineCache
+
+
+class StepTiming(NamedTuple):
+    calls: int  # number of times _recalculate has run
+    total: float  # seconds spent in _recalculate over every call
+    last: float  # seconds the most recent call took
 
 
 class Step[I: NamedTuple | None, O: NamedTuple]:
 
     def __init__(self, next_step: Step):
-        self._ready: bool = True
+        # How deeply each thread is inside unready(), so settings the worker
+        # overrides never swallow a change the GUI makes at the same time
+        self._unready: local = local()
         self._next: Step = next_step
+        self._previous: Step = None
+        if next_step is not None:
+            next_step._safe_set("_previous", self)
         self._input: I = None
         self._output: O = None
+        self._scheduler: StepScheduler = None
+        self._timing: StepTiming = StepTiming(0, 0.0, 0.0)
+        self._pipeline_cache: PipelineCache = None
+        self._name: str = type(self).__name__
 
     def _safe_set(self, attr: str, value: Any) -> None:
         object.__setattr__(self, attr, value)
 
     @contextmanager
     def unready(self):
+        """Set attributes without processing, only on the calling thread."""
+        depth = getattr(self._unready, "depth", 0)
         try:
-            self._ready = False
+            self._unready.depth = depth + 1
             yield self
         finally:
-            self._ready = True
+            self._unready.depth = depth
+
+    @property
+    def _ready(self) -> bool:
+        return getattr(self._unready, "depth", 0) == 0
+
+    @property
+    def name(self) -> str:
+        """Identifies the step in timings, the class name unless named."""
+        return self._name
+
+    def named(self, name: str) -> Self:
+        """Tell apart steps of the same type within a chain."""
+        self._safe_set("_name", name)
+        return self
 
     @property
     def has_processed(self) -> bool:
@@ -33,6 +73,42 @@ class Step[I: NamedTuple | None, O: NamedTuple]:
 
         return self._output
 
+    @property
+    def requires_main_thread(self) -> bool:
+        """If _recalculate has to run on the main thread (dialogs, GL objects)."""
+        return False
+
+    @property
+    def timing(self) -> StepTiming:
+        return self._timing
+
+    def reset_timing(self) -> None:
+        self._timing = StepTiming(0, 0.0, 0.0)
+
+    @property
+    def pipeline_cache(self) -> PipelineCache | None:
+        return self._pipeline_cache
+
+    @property
+    def provenance(self) -> str | None:
+        """
+        Digest of everything the output of this step depends on, or None if
+        that can't be known (i.e. nothing is loaded at the head of the chain).
+        """
+        if self._previous is None:
+            return None
+        return self._digest(self._previous.provenance, self._provenance_settings())
+
+    def _digest(self, upstream: str | None, settings: dict) -> str | None:
+        """The provenance of this step with the given settings below upstream's."""
+        if upstream is None:
+            return None
+        return settings_digest(upstream, type(self).__name__, settings)
+
+    def _provenance_settings(self) -> dict:
+        """The settings which change the output, by default all of them."""
+        return self.serialise()
+
     def reset(self) -> None:
         with self.unready():
             self._reset()
@@ -43,8 +119,53 @@ class Step[I: NamedTuple | None, O: NamedTuple]:
         self._input = None
         self._output = None
 
+    def _reset_next(self) -> None:
+        """
+        Reset every step below this one. On the scheduler's worker that would
+        clear outputs the main thread is drawing, so it is left to the
+        scheduler to do once this step's output is published.
+        """
+        if self._next is None:
+            return
+        if self._scheduler is not None and self._scheduler.defer_reset(self):
+            return
+        self._next.reset()
+
+    def _process(self, _input: I, key: str | None = None) -> O | None:
+        """
+        Calculate the output for _input, from the cache when one is attached.
+        The scheduler's worker passes the key of the settings its job was
+        submitted with, otherwise it is worked out from the current settings.
+        """
+        start = perf_counter()
+        try:
+            cache = self._pipeline_cache
+            if cache is None:
+                return self._recalculate(_input)
+
+            if key is None:
+                key = self.provenance
+            if key is not None and (cached := cache.get(key)) is not None:
+                return cached
+            _output = self._recalculate(_input)
+            # Steps which pass their input straight through aren't worth
+            # storing, nor is anything calculated after the settings changed
+            if (
+                key is not None
+                and _output is not None
+                and _output is not _input
+                and (self._scheduler is None or self._scheduler.is_current())
+            ):
+                cache.put(key, _output, self)
+            return _output
+        finally:
+            elapsed = perf_counter() - start
+            calls, total, _ = self._timing
+            self._timing = StepTiming(calls + 1, total + elapsed, elapsed)
+            INSTRUMENTS.record(f"step/{self._name}", elapsed)
+
     def update(self, _input: NamedTuple) -> O:
-        _output = self._recalculate(_input)
+        _output = self._process(_input)
         if _output is None:
             return
         self._input = _input
@@ -59,11 +180,15 @@ class Step[I: NamedTuple | None, O: NamedTuple]:
         raise NotImplementedError
 
     @classmethod
-    def deserialise(self, config: dict) -> Self:
+    def deserialise(cls, config: dict, next_step: Step = None) -> Self:
         raise NotImplementedError
 
     def __setattr__(self, name: str, value: Any):
         object.__setattr__(self, name, value)
-        if not self._ready or name.startswith("_"):
+        if name.startswith("_") or not self._ready:
+            return
+        if self._scheduler is not None:
+            # Let the scheduler coalesce every change made this frame
+            self._scheduler.mark_dirty(self)
             return
         self.update(self._input)
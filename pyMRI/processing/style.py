@@ -1,3 +1,5 @@
+from typing import Self
+
 import numpy as np
 
 from arcade import get_window, ArcadeContext
@@ -25,11 +27,30 @@ class ColourStep(Step[FourierData, RenderData]):
             self.density_scalar: float = 0.05
             self.emission_brightness: float = 1.0
 
+    @property
+    def requires_main_thread(self) -> bool:
+        # Creates the colour texture with the window's GL context
+        return True
+
     def _reset(self):
         self._colour_points = []
         self.density_scalar = 0.05
         self.emission_brightness = 1.0
 
+    def serialise(self) -> dict:
+        return {
+            "density_scalar": self.density_scalar,
+            "emission_brightness": self.emission_brightness,
+        }
+
+    @classmethod
+    def deserialise(cls, config: dict, next_step: Step = None) -> Self:
+        step = cls(next_step)
+        with step.unready():
+            step.density_scalar = config.get("density_scalar", 0.05)
+            step.emission_brightness = config.get("emission_brightness", 1.0)
+        return step
+
     def _recalculate(self, _input: FourierData):
         if self._ctx is None:
             self._ctx = get_window().ctx
@@ -61,5 +82,12 @@ class ColourStep(Step[FourierData, RenderData]):
 
 class CameraStep(Step):
 
+    def serialise(self) -> dict:
+        return {}
+
+    @classmethod
+    def deserialise(cls, config: dict, next_step: Step = None) -> Self:
+        return cls(next_step)
+
     def _recalculate(self, _input):
         return _input
@@ -0,0 +1,155 @@
+"""
+Reusable memory for getting volumes onto the GPU.
+
+Every new volume used to allocate its own host temporaries and orphan or
+recreate its GPU buffers whenever the size changed. Flipping between two
+interpolation modes would then churn both the allocator and the driver.
+
+The StagingPool keeps one flat host array per named slot, grown to the
+largest request seen, so later volumes are written into the same memory.
+The GpuPool does the same for the renderer's storage buffers and keeps a
+few recently used 3D textures by size, since a texture's size is part of
+how it is sampled. Textures are also kept per slot so the front and back of
+a double buffered upload never share one. Both stay under a byte cap: past
+it the least recently used spare resources are freed and oversized ones are
+shrunk.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable
+
+import numpy as np
+import arcade.gl as gl
+
+from pyMRI.rendering.texture import VolumeTexture
+from pyMRI.rendering.volume import VolumeFormat
+
+
+class StagingPool:
+
+    def __init__(self, max_bytes: int = 1 * 2**30):
+        self.max_bytes: int = max_bytes
+        self._arrays: dict[str, np.ndarray] = {}
+        # New volumes are prepared on the pipeline's worker while the render
+        # thread quantises slices, each in their own slots
+        self._lock: Lock = Lock()
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return self._nbytes()
+
+    def _nbytes(self) -> int:
+        return sum(array.nbytes for array in self._arrays.values())
+
+    def take(self, slot: str, size: int, dtype: np.dtype) -> np.ndarray:
+        """
+        A flat array of size elements. The same memory comes back for a slot
+        until a larger one is asked for, so whatever was in it is overwritten.
+        Requests that would take the pool past its cap get a fresh array.
+        """
+        dtype = np.dtype(dtype)
+        with self._lock:
+            array = self._arrays.get(slot)
+            if array is not None and array.dtype == dtype and array.size >= size:
+                return array[:size]
+
+            others = self._nbytes() - (0 if array is None else array.nbytes)
+            self._arrays.pop(slot, None)
+            array = np.empty(size, dtype)
+            if others + array.nbytes <= self.max_bytes:
+                self._arrays[slot] = array
+            return array
+
+    def clear(self) -> None:
+        with self._lock:
+            self._arrays.clear()
+
+
+class GpuPool:
+
+    def __init__(
+        self,
+        ctx: gl.Context,
+        max_bytes: int = 1 * 2**30,
+        texture_factory: Callable[
+            [tuple[int, int, int], VolumeFormat], VolumeTexture
+        ] = VolumeTexture,
+    ):
+        self._ctx: gl.Context = ctx
+        self.max_bytes: int = max_bytes
+        self._texture_factory = texture_factory
+        self._buffers: dict[str, gl.Buffer] = {}
+        # (size, format) -> texture, least recently used first
+        self._textures: OrderedDict[tuple, VolumeTexture] = OrderedDict()
+        # slot -> the texture last handed out for it, i.e. the front and back
+        self._current: dict[int, tuple] = {}
+        self.allocations: int = 0  # how many buffers/textures were ever made
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buffer.size for buffer in self._buffers.values()) + sum(
+            texture.nbytes for texture in self._textures.values()
+        )
+
+    def buffer(self, slot: str, nbytes: int) -> gl.Buffer:
+        """
+        A storage buffer of at least nbytes. The shaders only read as far as
+        the header's counts, so a slot's buffer only grows, unless the pool
+        is over its cap and the buffer is more than twice what is needed.
+        """
+        buffer = self._buffers.get(slot)
+        if buffer is not None and buffer.size >= nbytes:
+            oversized = buffer.size > 2 * nbytes and self.nbytes > self.max_bytes
+            if not oversized:
+                return buffer
+
+        if buffer is not None:
+            buffer.delete()
+        buffer = self._buffers[slot] = self._ctx.buffer(reserve=nbytes)
+        self.allocations += 1
+        self._evict()
+        return buffer
+
+    def texture(
+        self, size: tuple[int, int, int], volume_format: VolumeFormat, slot: int = 0
+    ) -> VolumeTexture:
+        """
+        A texture of exactly this size and format, reused if one was kept.
+        Different slots never share a texture, so one can be drawn while
+        another of the same size is written.
+        """
+        key = (slot, tuple(size), volume_format)
+        self._current[slot] = key
+        texture = self._textures.get(key)
+        if texture is not None:
+            self._textures.move_to_end(key)
+            return texture
+
+        texture = self._textures[key] = self._texture_factory(tuple(size), volume_format)
+        self.allocations += 1
+        self._evict()
+        return texture
+
+    def release_textures(self) -> None:
+        """Free every texture, i.e. after switching to the buffer format."""
+        for texture in self._textures.values():
+            texture.delete()
+        self._textures.clear()
+        self._current.clear()
+
+    def _evict(self) -> None:
+        # Only spare textures can go, the buffers are always the ones being drawn
+        for key in list(self._textures):
+            if self.nbytes <= self.max_bytes:
+                break
+            if key not in self._current.values():
+                self._textures.pop(key).delete()
+
+    def clear(self) -> None:
+        for buffer in self._buffers.values():
+            buffer.delete()
+        self._buffers.clear()
+        self.release_textures()
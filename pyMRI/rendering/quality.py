@@ -0,0 +1,106 @@
+"""
+How much work each ray of the raymarcher is allowed to do.
+
+Rays stop once they have taken max_steps cells or once so little light gets
+through that nothing behind could show (transmission below min_transmission).
+With progressive refinement on, a moving camera uses the much cheaper moving
+budget so large volumes stay interactive. Once it stops the budget doubles
+every frame until it is back to the full quality settings.
+
+The volume can also be drawn at a fraction of the window's resolution and
+upscaled. The scale is either fixed or, when dynamic, follows the measured
+frame time: dropping quickly when frames run long and creeping back up while
+there is time to spare.
+"""
+
+from math import sqrt
+from typing import NamedTuple
+
+
+class RayLimits(NamedTuple):
+    max_steps: int
+    min_transmission: float
+
+
+class RayBudget:
+
+    def __init__(
+        self,
+        max_steps: int = 4096,
+        min_transmission: float = 0.01,
+        progressive: bool = True,
+        moving_max_steps: int = 256,
+        moving_min_transmission: float = 0.05,
+    ):
+        self.max_steps: int = max_steps
+        self.min_transmission: float = min_transmission
+        self.progressive: bool = progressive
+        self.moving_max_steps: int = moving_max_steps
+        self.moving_min_transmission: float = moving_min_transmission
+
+        self._steps: int = max_steps
+
+    @property
+    def full(self) -> RayLimits:
+        return RayLimits(self.max_steps, self.min_transmission)
+
+    @property
+    def converged(self) -> bool:
+        return not self.progressive or self._steps >= self.max_steps
+
+    def update(self, moving: bool) -> RayLimits:
+        """The limits to draw this frame with."""
+        if not self.progressive:
+            self._steps = self.max_steps
+            return self.full
+
+        if moving:
+            self._steps = min(self.moving_max_steps, self.max_steps)
+        else:
+            self._steps = min(2 * max(self._steps, 1), self.max_steps)
+
+        if self._steps >= self.max_steps:
+            return self.full
+        return RayLimits(
+            self._steps, max(self.moving_min_transmission, self.min_transmission)
+        )
+
+
+class RenderScale:
+
+    _QUANTUM = 1.0 / 32.0  # scales snap to this so the target isn't remade every frame
+    _TOLERANCE = 0.15  # how far over the target a frame can run before scaling down
+    _GROWTH = 1.0 / 32.0  # how much the scale rises each frame under the target
+
+    def __init__(
+        self,
+        scale: float = 1.0,
+        dynamic: bool = False,
+        target_frame_time: float = 1.0 / 60.0,
+        min_scale: float = 0.25,
+        max_scale: float = 1.0,
+    ):
+        self.scale: float = scale
+        self.dynamic: bool = dynamic
+        self.target_frame_time: float = target_frame_time
+        self.min_scale: float = min_scale
+        self.max_scale: float = max_scale
+
+    def update(self, frame_time: float) -> float:
+        """The scale to draw this frame at given how long the last frame took."""
+        if self.dynamic and frame_time > 0.0:
+            if frame_time > self.target_frame_time * (1.0 + self._TOLERANCE):
+                # The cost goes with the pixel count, so with the square of the scale
+                scale = self.scale * max(sqrt(self.target_frame_time / frame_time), 0.5)
+                scale = self._QUANTUM * (scale // self._QUANTUM)
+            elif frame_time <= self.target_frame_time:
+                scale = self.scale + self._GROWTH
+            else:
+                scale = self.scale
+            self.scale = scale
+        self.scale = min(max(self.scale, self.min_scale), self.max_scale)
+        return self.scale
+
+    def resolution(self, size: tuple[int, int]) -> tuple[int, int]:
+        width, height = size
+        return max(1, round(width * self.scale)), max(1, round(height * self.scale))
@@ -0,0 +1,61 @@
+from ctypes import byref
+
+from pyglet import gl
+
+from pyMRI.instrumentation import Instruments, INSTRUMENTS
+
+
+class GpuTimer:
+    """
+    Times the GPU work issued inside a with block. arcade's queries wait for
+    their result as soon as the block ends, so this keeps a few GL timer
+    queries in flight and records each one once the GPU says it is done.
+
+    Only one timer query can be running at once, so GpuTimers must not be
+    nested. Like VolumeTexture it talks to GL directly and must only be used
+    on the thread owning the context.
+    """
+
+    def __init__(
+        self, name: str, depth: int = 4, instruments: Instruments = INSTRUMENTS
+    ):
+        self.name: str = name
+        self._instruments: Instruments = instruments
+        self._queries = (gl.GLuint * depth)()
+        gl.glGenQueries(depth, self._queries)
+        self._pending: list[int] = []  # indices of queries still in flight, oldest first
+        self._next: int = 0
+
+    @staticmethod
+    def available(ctx) -> bool:
+        """Timer queries are core from GL 3.3."""
+        return tuple(ctx.gl_version) >= (3, 3)
+
+    def _collect(self) -> None:
+        available = gl.GLint()
+        elapsed = gl.GLuint64()
+        while self._pending:
+            query = self._queries[self._pending[0]]
+            gl.glGetQueryObjectiv(query, gl.GL_QUERY_RESULT_AVAILABLE, byref(available))
+            if not available.value:
+                break
+            gl.glGetQueryObjectui64v(query, gl.GL_QUERY_RESULT, byref(elapsed))
+            self._instruments.record(self.name, elapsed.value * 1e-9)
+            self._pending.pop(0)
+
+    def __enter__(self):
+        self._collect()
+        if len(self._pending) == len(self._queries):
+            # Every query is still in flight, drop the oldest rather than wait on it
+            self._pending.pop(0)
+        gl.glBeginQuery(gl.GL_TIME_ELAPSED, self._queries[self._next])
+        return self
+
+    def __exit__(self, *_):
+        gl.glEndQuery(gl.GL_TIME_ELAPSED)
+        self._pending.append(self._next)
+        self._next = (self._next + 1) % len(self._queries)
+
+    def delete(self) -> None:
+        gl.glDeleteQueries(len(self._queries), self._queries)
+        self._pending.clear()
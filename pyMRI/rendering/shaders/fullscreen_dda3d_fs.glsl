@@ -10,7 +10,22 @@ uniform sampler2D gradient;
 uniform float density_scalar;
 uniform float emission_brightness;
 
-readonly buffer density_data {
+// Replaced by the VoxelRenderer, 1 samples a 3D texture instead of the buffer
+#define DENSITY_TEXTURE 0
+
+#if DENSITY_TEXTURE
+uniform sampler3D density_texture;
+uniform ivec3 voxel_counts;
+uniform vec3 volume_size;
+
+#define i_width voxel_counts.x
+#define i_height voxel_counts.y
+#define i_depth voxel_counts.z
+#define width volume_size.x
+#define height volume_size.y
+#define depth volume_size.z
+#else
+layout(std430, binding = 0) readonly buffer density_data {
     int i_width;
     int i_height;
     int i_depth;
@@ -19,6 +34,23 @@ readonly buffer density_data {
     float depth;
     float density[];
 };
+#endif
+
+// The largest density within each brick of voxels
+layout(std430, binding = 1) readonly buffer brick_data {
+    int b_width;
+    int b_height;
+    int b_depth;
+    int brick_size;
+    float brick_max[];
+};
+
+// Bricks with nothing denser than this are skipped over, negative skips none
+uniform float empty_threshold;
+
+// Rays stop after this many cells, or once this little light still gets through
+uniform int max_steps;
+uniform float min_transmission;
 
 in vec3 ray_pos;
 in vec3 direction;
@@ -30,6 +62,24 @@ int get_idx(int x, int y, int z){
     return (min(z, i_depth-1) * i_width * i_height) + (min(y, i_height-1) * i_width) + min(x, i_width-1);
 }
 
+bool brick_is_empty(ivec3 cell){
+    ivec3 brick = min(cell / brick_size, ivec3(b_width, b_height, b_depth) - 1);
+    return brick_max[(brick.z * b_width * b_height) + (brick.y * b_width) + brick.x] <= empty_threshold;
+}
+
+bool cell_in_bounds(ivec3 cell){
+    return 0 <= cell.x && cell.x < i_width && 0 <= cell.y && cell.y < i_height && 0 <= cell.z && cell.z < i_depth;
+}
+
+// The density of the cell, point is the middle of the ray's path through it
+float sample_density(ivec3 cell, vec3 point){
+#if DENSITY_TEXTURE
+    return texture(density_texture, point / vec3(width, height, depth)).r;
+#else
+    return density[get_idx(cell.x, cell.y, cell.z)];
+#endif
+}
+
 bool in_bounds(vec3 point){
     return (0 <= point.x && point.x <= width) && (0 <= point.y && point.y <= height) && (0 <= point.z && point.z <= depth);
 }
@@ -72,7 +122,27 @@ vec4 dda(in vec3 enter_pos, in vec3 direction){
     float t_o = 0.0;
     ivec3 n = i;
     ivec3 l = i;
-    while (true){
+    for (int steps = 0; steps < max_steps; steps++){
+        if (brick_is_empty(l)) {
+            // Jump straight to the first cell the ray enters after the brick
+            ivec3 lo = (l / brick_size) * brick_size;
+            vec3 t_exits = (vec3(lo + max(s, 0) * brick_size) * cell_size - enter_pos) * vec3(s) / abs(direction);
+            t_c = min(t_exits.x, min(t_exits.y, t_exits.z));
+
+            n = clamp(ivec3(floor((enter_pos + direction * t_c) / cell_size)), lo, lo + brick_size - 1);
+            if (t_exits.x == t_c) n.x = s.x > 0 ? lo.x + brick_size : lo.x - 1;
+            else if (t_exits.y == t_c) n.y = s.y > 0 ? lo.y + brick_size : lo.y - 1;
+            else n.z = s.z > 0 ? lo.z + brick_size : lo.z - 1;
+            t = (vec3(n + max(s, 0)) * cell_size - enter_pos) * vec3(s) / abs(direction);
+
+            if (!cell_in_bounds(n)){
+                return vec4(emission, 1.0);
+            }
+            l = n;
+            t_o = t_c;
+            continue;
+        }
+
         if (t.x < min(t.y, t.z)) {
             t_c = t.x;
             t.x = t.x + dt.x;
@@ -89,15 +159,20 @@ vec4 dda(in vec3 enter_pos, in vec3 direction){
             n.z = n.z + s.z;
         }
 
-        int idx = get_idx(l.x, l.y, l.z);
+        float cell_density = sample_density(l, enter_pos + direction * 0.5 * (t_o + t_c));
 
-        vec4 colour = texture(gradient, vec2(density[idx], 0.5));
-        float voxel_density = density[idx] * colour.a * density_scalar;
+        vec4 colour = texture(gradient, vec2(cell_density, 0.5));
+        float voxel_density = cell_density * colour.a * density_scalar;
         float voxel_transmition = exp(-voxel_density * (t_c - t_o));
         emission = emission + colour.rgb * transmission * (1 - voxel_transmition) * emission_brightness;
         transmission *= voxel_transmition;
 
-        if (!(0 <= n.x && n.x < i_width && 0 <= n.y && n.y < i_height && 0 <= n.z && n.z < i_depth)){
+        // Nothing further along the ray can be seen through what is in front
+        if (transmission < min_transmission){
+            return vec4(emission, 1.0);
+        }
+
+        if (!cell_in_bounds(n)){
             return vec4(emission, 1.0);  // colour based on density and transmission
             // return vec4(transmission);  // Darken based on transmission
             // return vec4(1 - transmission);  // Lighten based on transmission
@@ -106,6 +181,7 @@ vec4 dda(in vec3 enter_pos, in vec3 direction){
         l = n;
         t_o = t_c;
     }
+    return vec4(emission, 1.0);
 }
 
 void main() {
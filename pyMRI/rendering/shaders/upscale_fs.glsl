@@ -0,0 +1,12 @@
+#version 430
+
+// The volume drawn at a reduced resolution, linearly filtered up to the window
+uniform sampler2D volume;
+
+in vec2 uv;
+
+out vec4 colour_fs;
+
+void main() {
+    colour_fs = texture(volume, uv);
+}
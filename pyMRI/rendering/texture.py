@@ -0,0 +1,108 @@
+from ctypes import byref, c_void_p
+
+import numpy as np
+from pyglet import gl
+
+from pyMRI.rendering.volume import VolumeFormat
+
+# volume format -> (internal format, pixel format, pixel type)
+_GL_FORMATS = {
+    VolumeFormat.HALF: (gl.GL_R16F, gl.GL_RED, gl.GL_HALF_FLOAT),
+    VolumeFormat.BYTE: (gl.GL_R8, gl.GL_RED, gl.GL_UNSIGNED_BYTE),
+}
+
+
+class VolumeTexture:
+    """
+    A single channel 3D texture. arcade only wraps 2D textures so this talks
+    to GL directly, it must only be used on the thread owning the context.
+    """
+
+    def __init__(self, size: tuple[int, int, int], volume_format: VolumeFormat):
+        if volume_format not in _GL_FORMATS:
+            raise ValueError(f"{VolumeFormat.to_str(volume_format)} is not a texture format")
+        self._size: tuple[int, int, int] = size
+        self._format: VolumeFormat = volume_format
+        self._internal_format, self._pixel_format, self._pixel_type = _GL_FORMATS[volume_format]
+
+        self._glo = gl.GLuint()
+        gl.glGenTextures(1, byref(self._glo))
+        gl.glBindTexture(gl.GL_TEXTURE_3D, self._glo)
+        for wrap in (gl.GL_TEXTURE_WRAP_S, gl.GL_TEXTURE_WRAP_T, gl.GL_TEXTURE_WRAP_R):
+            gl.glTexParameteri(gl.GL_TEXTURE_3D, wrap, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_3D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_3D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+
+        width, height, depth = size
+        gl.glTexImage3D(
+            gl.GL_TEXTURE_3D,
+            0,
+            self._internal_format,
+            width,
+            height,
+            depth,
+            0,
+            self._pixel_format,
+            self._pixel_type,
+            None,
+        )
+
+    @property
+    def size(self) -> tuple[int, int, int]:
+        return self._size
+
+    @property
+    def volume_format(self) -> VolumeFormat:
+        return self._format
+
+    @property
+    def nbytes(self) -> int:
+        width, height, depth = self._size
+        return width * height * depth * VolumeFormat.to_dtype(self._format).itemsize
+
+    def write(self, data: np.ndarray, z_offset: int = 0) -> None:
+        """
+        Upload whole z planes of an x fastest volume already quantised to the
+        texture's format, starting at plane z_offset.
+        """
+        width, height, depth = self._size
+        plane = width * height
+        planes = data.size // plane if plane else 0
+        if (
+            data.dtype != VolumeFormat.to_dtype(self._format)
+            or data.size != planes * plane
+            or z_offset < 0
+            or z_offset + planes > depth
+        ):
+            raise ValueError(
+                f"Expected whole planes of {VolumeFormat.to_dtype(self._format)} "
+                f"within the {width}x{height}x{depth} texture"
+            )
+        data = np.ascontiguousarray(data)
+
+        gl.glBindTexture(gl.GL_TEXTURE_3D, self._glo)
+        # Rows of bytes/halves are rarely a multiple of the default 4 byte alignment
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        gl.glTexSubImage3D(
+            gl.GL_TEXTURE_3D,
+            0,
+            0,
+            0,
+            z_offset,
+            width,
+            height,
+            planes,
+            self._pixel_format,
+            self._pixel_type,
+            data.ctypes.data_as(c_void_p),
+        )
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 4)
+
+    def use(self, unit: int = 0) -> None:
+        gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+        gl.glBindTexture(gl.GL_TEXTURE_3D, self._glo)
+
+    def delete(self) -> None:
+        if self._glo.value != 0:
+            gl.glDeleteTextures(1, byref(self._glo))
+            self._glo = gl.GLuint()
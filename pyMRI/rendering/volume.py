@@ -0,0 +1,405 @@
+"""
+CPU side preparation of a volume for the VoxelRenderer.
+
+Nothing here touches the GL context so it can be used (and tested) without a
+window. The renderer's storage buffer is a header of the voxel counts and
+sizes followed by the normalised magnitude of every voxel as float32, x
+fastest (Fortran order) after reorientation:
+
+    int i_width, i_height, i_depth;
+    float width, height, depth;
+    float density[];
+
+The 3D texture formats use the same x fastest layout, which is what
+glTexImage3D expects, quantised to half floats or bytes.
+
+Beside the densities sits a coarse grid of the largest density within each
+brick of voxels, again x fastest, so the raymarcher can jump over bricks
+with nothing in them:
+
+    int b_width, b_height, b_depth, brick_size;
+    float brick_max[];
+
+Volumes too large for the GPU (or too far away to need every voxel) are drawn
+from a level of a mip pyramid instead, each level half the resolution of the
+last along every axis. Chunked volumes too large for memory only ever have
+the levels that fit built, streamed from the volume a slab at a time.
+
+Everything a new volume needs before any of it reaches the GPU (the
+normalised densities, every level of the pyramid laid out x fastest and
+their brick grids) is made by prepare_volume, which the renderer runs on the
+pipeline's worker. The render thread then only uploads a level a few z
+planes (whole x, y slices of the x fastest layout) per frame so no single
+frame pays for the whole volume.
+"""
+
+from __future__ import annotations
+from enum import Enum, auto
+from math import floor, log2
+from struct import pack, calcsize
+from typing import NamedTuple
+
+import numpy as np
+
+from pyMRI.processing.chunked import ChunkedVolume
+from pyMRI.processing.data import Orientation, ORIENTATION_MAP, RenderData
+
+HEADER_FORMAT = "<3i3f"
+HEADER_SIZE = calcsize(HEADER_FORMAT)  # std430 puts density[] straight after
+
+BRICK_HEADER_FORMAT = "<4i"
+BRICK_HEADER_SIZE = calcsize(BRICK_HEADER_FORMAT)
+
+
+class VolumeFormat(Enum):
+    BUFFER = auto()  # float32 storage buffer indexed by hand
+    HALF = auto()  # R16F 3D texture, trilinear filtered
+    BYTE = auto()  # R8 3D texture, trilinear filtered
+
+    @staticmethod
+    def to_str(volume_format: VolumeFormat) -> str:
+        match volume_format:
+            case VolumeFormat.BUFFER:
+                return "float buffer"
+            case VolumeFormat.HALF:
+                return "half texture"
+            case VolumeFormat.BYTE:
+                return "byte texture"
+
+    @staticmethod
+    def to_dtype(volume_format: VolumeFormat) -> np.dtype:
+        match volume_format:
+            case VolumeFormat.BUFFER:
+                return np.dtype(np.float32)
+            case VolumeFormat.HALF:
+                return np.dtype(np.float16)
+            case VolumeFormat.BYTE:
+                return np.dtype(np.uint8)
+
+    @staticmethod
+    def is_texture(volume_format: VolumeFormat) -> bool:
+        return volume_format != VolumeFormat.BUFFER
+
+
+def pack_header(counts: tuple[int, int, int], sizes: tuple[float, float, float]) -> bytes:
+    return pack(HEADER_FORMAT, *counts, *sizes)
+
+
+class Reduction(Enum):
+    MAX = auto()  # keeps small bright features visible from afar
+    MEAN = auto()  # keeps the overall density of each region
+
+    @staticmethod
+    def to_str(reduction: Reduction) -> str:
+        match reduction:
+            case Reduction.MAX:
+                return "max"
+            case Reduction.MEAN:
+                return "mean"
+
+
+class RenderChanges(NamedTuple):
+    uniforms: bool  # density scalar or emission brightness
+    sizes: bool  # the voxel dimensions, only the header/size uniform
+    payload: bool  # the voxels themselves, their counts or their orientation
+
+
+def diff_render_data(previous: RenderData | None, current: RenderData) -> RenderChanges:
+    """What has to be sent to the GPU to go from drawing previous to current."""
+    if previous is None:
+        return RenderChanges(True, True, True)
+    return RenderChanges(
+        previous.density_scalar != current.density_scalar
+        or previous.emission_brightness != current.emission_brightness,
+        previous.voxel_dimensions != current.voxel_dimensions,
+        # The colour step passes the voxels through, so unchanged data is the same object
+        previous.voxel_data is not current.voxel_data
+        or previous.voxel_counts != current.voxel_counts
+        or previous.orientation != current.orientation,
+    )
+
+
+def oriented_axes(orientation: Orientation) -> tuple[int, int, int]:
+    """Which axis of the data is x, y and z."""
+    lx, ly, lz = ORIENTATION_MAP[orientation]
+    ix = 0 if lx == "i" else 1 if lx == "j" else 2
+    iy = 0 if ly == "i" else 1 if ly == "j" else 2
+    iz = 0 if lz == "i" else 1 if lz == "j" else 2
+    return ix, iy, iz
+
+
+def oriented_sizes(
+    orientation: Orientation, voxel_dimensions: tuple[float, float, float]
+) -> tuple[float, float, float]:
+    """The voxel dimensions in x, y, z order."""
+    ix, iy, iz = oriented_axes(orientation)
+    return voxel_dimensions[ix], voxel_dimensions[iy], voxel_dimensions[iz]
+
+
+def orient_volume(
+    voxel_data: np.ndarray,
+    orientation: Orientation,
+    voxel_dimensions: tuple[float, float, float],
+) -> tuple[np.ndarray, tuple[float, float, float]]:
+    """
+    Reorder the axes (and their sizes) so they are in x, y, z order. The
+    volume is only a strided view of the data, nothing is copied.
+    """
+    sizes = oriented_sizes(orientation, voxel_dimensions)
+    return np.transpose(voxel_data, oriented_axes(orientation)), sizes
+
+
+def normalised_density(
+    volume: np.ndarray, peak: float = None, out: np.ndarray = None
+) -> np.ndarray:
+    """
+    The magnitude of every voxel scaled to 0-1 as a flat x fastest float32
+    array. A known peak magnitude (i.e. from volume_statistics) saves a scan.
+
+    The magnitudes are written straight into x fastest order from any strided
+    view of the data, into the start of out when given (a flat float32 array
+    at least as large as the volume) so a staging buffer can be reused.
+    """
+    if out is None:
+        out = np.empty(volume.size, np.float32)
+    linear_data = out[: volume.size]
+    # Fortran ordered view of the flat memory, abs fills it in a single pass
+    np.abs(volume, out=linear_data.reshape(volume.shape, order="F"), casting="same_kind")
+
+    if peak is None:
+        peak = linear_data.max() if linear_data.size else 0.0
+    if peak > 0.0:
+        linear_data *= np.float32(1.0 / peak)
+    return linear_data
+
+
+def quantise_density(
+    linear_data: np.ndarray,
+    volume_format: VolumeFormat,
+    out: np.ndarray = None,
+    scratch: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Convert normalised densities to the element type of the volume format,
+    into out when given. Bytes are rounded through a float32 scratch array,
+    also reused when given.
+    """
+    size = linear_data.size
+    match volume_format:
+        case VolumeFormat.BUFFER:
+            return linear_data
+        case VolumeFormat.HALF:
+            out = np.empty(size, np.float16) if out is None else out[:size]
+            np.copyto(out, linear_data, casting="same_kind")
+            return out
+        case VolumeFormat.BYTE:
+            # R8 is read back as value / 255, so round to the nearest step
+            scratch = np.empty(size, np.float32) if scratch is None else scratch[:size]
+            np.multiply(linear_data, 255.0, out=scratch, casting="same_kind")
+            scratch += 0.5
+            out = np.empty(size, np.uint8) if out is None else out[:size]
+            np.copyto(out, scratch, casting="unsafe")
+            return out
+
+
+def brick_grid(volume: np.ndarray, brick_size: int) -> np.ndarray:
+    """
+    The largest value within each brick_size³ brick of an x, y, z volume. The
+    bricks at the far edges are smaller when the counts aren't a multiple of
+    the brick size.
+    """
+    grid = volume
+    for axis in range(3):
+        # Reduce one axis at a time, so each pass works on an already shrunk grid
+        starts = np.arange(0, volume.shape[axis], brick_size)
+        grid = np.maximum.reduceat(grid, starts, axis)
+    return grid
+
+
+def pack_bricks(
+    linear_data: np.ndarray, counts: tuple[int, int, int], brick_size: int
+) -> tuple[bytes, np.ndarray]:
+    """Build the header and x fastest brick maxima from the normalised densities."""
+    grid = brick_grid(linear_data.reshape(counts, order="F"), brick_size)
+    header = pack(BRICK_HEADER_FORMAT, *grid.shape, brick_size)
+    return header, np.ravel(grid, "F").astype(np.float32, copy=False)
+
+
+def downsample(volume: np.ndarray, reduction: Reduction) -> np.ndarray:
+    """Halve an x, y, z volume along every axis, odd edges keep a 1 voxel wide block."""
+    if reduction == Reduction.MAX:
+        return brick_grid(volume, 2)
+
+    grid = volume
+    for axis in range(3):
+        count = volume.shape[axis]
+        starts = np.arange(0, count, 2)
+        widths = np.diff(starts, append=count).astype(volume.dtype)
+        shape = [1, 1, 1]
+        shape[axis] = len(starts)
+        grid = np.add.reduceat(grid, starts, axis) / widths.reshape(shape)
+    return grid
+
+
+def build_pyramid(volume: np.ndarray, reduction: Reduction) -> list[np.ndarray]:
+    """Every level from the volume itself down to a single voxel."""
+    levels = [volume]
+    while any(count > 1 for count in levels[-1].shape):
+        levels.append(downsample(levels[-1], reduction))
+    return levels
+
+
+def pyramid_shapes(shape: tuple[int, int, int]) -> list[tuple[int, int, int]]:
+    """The shape of every level build_pyramid makes from a volume of this shape."""
+    shapes = [tuple(shape)]
+    while any(count > 1 for count in shapes[-1]):
+        shapes.append(tuple((count + 1) // 2 for count in shapes[-1]))
+    return shapes
+
+
+def stream_pyramid(
+    volume: ChunkedVolume,
+    orientation: Orientation,
+    reduction: Reduction,
+    max_bytes: int,
+    peak: float = None,
+) -> list[np.ndarray | None]:
+    """
+    The pyramid of a chunked volume, normalised and in x, y, z order like
+    build_pyramid(normalised_density(...)). Levels with more than max_bytes of
+    float32 are never held in memory and are None. The first level that fits
+    is downsampled straight from slabs of the volume whose rows are a multiple
+    of the reduction so no block straddles two slabs.
+    """
+    shapes = pyramid_shapes(volume.shape)
+    skipped = 0
+    while skipped < len(shapes) - 1 and np.prod(shapes[skipped]) * 4 > max_bytes:
+        skipped += 1
+
+    if peak is None:
+        peak = volume.reduce(
+            lambda slab: float(np.abs(slab).astype(np.float32, copy=False).max(initial=0.0))
+        )
+    step = 2**skipped
+    rows = max(step, volume.chunk - volume.chunk % step)
+
+    slabs = []
+    for chunk in volume.slabs(rows):
+        slab = np.abs(volume[chunk]).astype(np.float32, copy=False)
+        if peak > 0.0:
+            slab *= np.float32(1.0 / peak)
+        for _ in range(skipped):
+            slab = downsample(slab, reduction)
+        slabs.append(slab)
+
+    # Downsampling each axis on its own commutes with reordering them
+    first = np.transpose(np.concatenate(slabs), oriented_axes(orientation))
+    return [None] * skipped + build_pyramid(first, reduction)
+
+
+class PreparedVolume(NamedTuple):
+    levels: list[np.ndarray | None]  # flat x fastest densities, None if never built
+    shapes: list[tuple[int, int, int]]  # x, y, z counts of every level
+    first_level: int  # the finest level which was built
+    bricks: dict[int, tuple[bytes, np.ndarray]]  # level -> pack_bricks of it
+    brick_size: int
+
+
+def prepare_volume(
+    data: RenderData,
+    reduction: Reduction,
+    max_bytes: int,
+    brick_size: int,
+    peak: float = None,
+    out: np.ndarray = None,
+) -> PreparedVolume:
+    """
+    Build everything the renderer uploads for a new volume. Nothing here
+    touches the GL context, so it runs off the render thread. The full
+    resolution densities are written into out when given, which is reused
+    as a staging buffer.
+    """
+    voxel_data = data.voxel_data
+    if isinstance(voxel_data, ChunkedVolume):
+        pyramid = stream_pyramid(voxel_data, data.orientation, reduction, max_bytes, peak)
+    else:
+        volume, _ = orient_volume(voxel_data, data.orientation, data.voxel_dimensions)
+        linear_data = normalised_density(volume, peak, out)
+        # The densities are x fastest, so this x, y, z view of them is free
+        pyramid = build_pyramid(linear_data.reshape(volume.shape, order="F"), reduction)
+
+    levels = []
+    bricks = {}
+    for index, level in enumerate(pyramid):
+        if level is None:
+            levels.append(None)
+            continue
+        # Coarser levels come out C ordered, each is laid out x fastest once here
+        linear_data = np.ravel(level, "F")
+        levels.append(linear_data)
+        bricks[index] = pack_bricks(linear_data, level.shape, brick_size)
+
+    first_level = next(index for index, level in enumerate(levels) if level is not None)
+    shape = voxel_data.shape
+    shapes = pyramid_shapes(tuple(shape[axis] for axis in oriented_axes(data.orientation)))
+    return PreparedVolume(levels, shapes, first_level, bricks, brick_size)
+
+
+def pick_level(
+    shapes: list[tuple[int, int, int]],
+    itemsize: int,
+    memory_budget: int,
+    distance: float = 0.0,
+    extent: float = 1.0,
+    lod_distance: float = 2.0,
+) -> int:
+    """
+    The finest level that fits in the memory budget, dropping another level
+    every time the camera's distance doubles past lod_distance times the
+    volume's largest extent.
+    """
+    level = 0
+    while level < len(shapes) - 1 and np.prod(shapes[level]) * itemsize > memory_budget:
+        level += 1
+
+    near = lod_distance * extent
+    if near > 0.0 and distance > near:
+        level += floor(log2(distance / near)) + 1
+    return min(level, len(shapes) - 1)
+
+
+class SliceUpload:
+    """
+    Which z planes of a level to upload next. Each plane is contiguous in the
+    x fastest layout, so a run of them is one buffer write or texture update.
+    """
+
+    def __init__(self, level: int, counts: tuple[int, int, int], itemsize: int):
+        self.level: int = level
+        self.counts: tuple[int, int, int] = counts
+        width, height, depth = counts
+        self.plane_size: int = width * height  # elements in one z plane
+        self.plane_bytes: int = self.plane_size * itemsize
+        self.depth: int = depth
+        self.next_plane: int = 0
+
+    @property
+    def done(self) -> bool:
+        return self.next_plane >= self.depth
+
+    @property
+    def remaining_bytes(self) -> int:
+        return (self.depth - self.next_plane) * self.plane_bytes
+
+    def take(self, byte_budget: int) -> tuple[int, int]:
+        """
+        The next planes to upload as (first, end), as many as fit in the
+        budget but always at least one so the upload finishes. A budget of 0
+        or less takes everything left.
+        """
+        planes = self.depth - self.next_plane
+        if byte_budget > 0:
+            planes = min(planes, max(1, byte_budget // max(self.plane_bytes, 1)))
+        first = self.next_plane
+        self.next_plane += planes
+        return first, self.next_plane
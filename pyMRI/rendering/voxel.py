@@ -1,7 +1,11 @@
 from array import array
 from struct import pack
 from enum import Enum
+from typing import NamedTuple
 from math import radians, tan, atan
+from time import perf_counter
+from contextlib import nullcontext
+from concurrent.futures import Future
 
 from importlib.resources import read_text, path
 import pyMRI.rendering.shaders as shaders
@@ -10,9 +14,32 @@ import numpy as np
 
 from arcade import get_window
 from arcade.camera import PerspectiveProjector
+from pyglet.math import Mat4
 import arcade.gl as gl
 
-from pyMRI.processing import COLOUR_STEP, RenderData, ORIENTATION_MAP
+from pyMRI.instrumentation import INSTRUMENTS
+from pyMRI.processing import COLOUR_STEP, SCHEDULER, RenderData
+from pyMRI.processing.chunked import ChunkedVolume
+from pyMRI.processing.statistics import VolumeStatistics, cached_statistics, volume_statistics
+from pyMRI.rendering.quality import RayBudget, RayLimits, RenderScale
+from pyMRI.rendering.texture import VolumeTexture
+from pyMRI.rendering.pool import GpuPool, StagingPool
+from pyMRI.rendering.query import GpuTimer
+from pyMRI.rendering.volume import (
+    HEADER_SIZE,
+    BRICK_HEADER_SIZE,
+    pack_bricks,
+    Reduction,
+    PreparedVolume,
+    prepare_volume,
+    pick_level,
+    VolumeFormat,
+    pack_header,
+    diff_render_data,
+    oriented_sizes,
+    quantise_density,
+    SliceUpload,
+)
 
 
 class Mode(Enum):
@@ -126,19 +153,80 @@ class VoxelRendererOld:
         super().__setattr__(key, value)
 
 
+_VOLUME_TEXTURE_UNIT = 1  # the colour map is on unit 0
+_BRICK_BUFFER_BINDING = 1  # the densities are on binding 0
+_PREVIEW_BYTES = 4 * 2**20  # the most a new volume's first upload is allowed
+
+
+class UploadStats(NamedTuple):
+    frame: int  # bytes uploaded during the last draw
+    total: int  # bytes uploaded since the renderer was made
+    payloads: int  # number of times the whole volume was uploaded
+
+
 class VoxelRenderer:
 
-    def __init__(self):
+    def __init__(self, volume_format: VolumeFormat = VolumeFormat.BUFFER):
         self._win = get_window()
         self._ctx = ctx = self._win.ctx
 
+        self._volume_format: VolumeFormat = volume_format
+        # The front resources being drawn, new levels are written to the back ones
+        # a few planes a frame and swapped in once complete
         self._point_buffer: gl.Buffer = None
-
-        self._dda_shader = ctx.program(
-            vertex_shader=read_text(shaders, "fullscreen_dda3d_vs.glsl"),
-            fragment_shader=read_text(shaders, "fullscreen_dda3d_fs.glsl"),
+        self._volume_texture: VolumeTexture = None
+        self.upload_budget: int = 16 * 2**20  # bytes a frame, 0 uploads a level at once
+        self._upload: SliceUpload = None
+        self._upload_data: np.ndarray = None
+        self._back: tuple[gl.Buffer | VolumeTexture, gl.Buffer] = None
+        self._back_slot: int = 1
+
+        # Host arrays and GPU resources reused between volumes instead of reallocated
+        self.staging_pool: StagingPool = StagingPool()
+        self.gpu_pool: GpuPool = GpuPool(ctx)
+
+        # Coarse grid of the densest voxel in each brick for skipping empty space
+        self._brick_buffer: gl.Buffer = None
+        self._brick_size: int = 8
+        self._skip_empty_space: bool = True
+        self._empty_threshold: float = 0.0
+
+        # Per ray step/opacity limits, cheaper while the camera moves
+        self.ray_budget: RayBudget = RayBudget()
+        self._last_view: Mat4 = None
+        self._ray_limits: RayLimits = None
+
+        # Levels of detail, halving the resolution each level
+        self.memory_budget: int = 512 * 2**20
+        self.lod_distance: float = 2.0  # volume sizes away before dropping a level, 0 never
+        self._lod_reduction: Reduction = Reduction.MAX
+        # Flat x fastest levels, chunked volumes only hold the ones that fit
+        self._pyramid: list[np.ndarray | None] = []
+        self._shapes: list[tuple[int, int, int]] = []
+        self._first_level: int = 0
+        self._bricks: dict[int, tuple[bytes, np.ndarray]] = {}
+        self._level: int = None
+        # A new volume is prepared on the pipeline's worker, the old one is
+        # drawn until it is ready. Each keeps its densities in its own staging slot
+        self._preparing: Future[PreparedVolume] = None
+        self._staging_slot: int = 0
+        self._sizes: tuple[float, float, float] = None
+
+        # The volume can be drawn offscreen at a lower resolution then upscaled
+        self.render_scale: RenderScale = RenderScale()
+        self._render_target: gl.Framebuffer = None
+        self._last_draw: float = None
+        # Times how long the GPU spends drawing the volume, where timer queries exist
+        self._gpu_timer = GpuTimer("gpu/volume") if GpuTimer.available(ctx) else nullcontext()
+        self._upscale_shader = ctx.program(
+            vertex_shader=read_text(shaders, "upscale_vs.glsl"),
+            fragment_shader=read_text(shaders, "upscale_fs.glsl"),
         )
 
+        # A program for the buffer and one for the textures, made when first used
+        self._programs: dict[bool, gl.Program] = {}
+        self._dda_shader = self._get_program(volume_format)
+
         self._dda_geometry = ctx.geometry(
             content=[
                 gl.BufferDescription(
@@ -152,62 +240,393 @@ class VoxelRenderer:
             mode=ctx.TRIANGLE_STRIP,
         )
         self.render_data: RenderData = None
+        self._counts: tuple[int, int, int] = None
+        self._upload_stats: UploadStats = UploadStats(0, 0, 0)
+
+    def _get_program(self, volume_format: VolumeFormat) -> gl.Program:
+        is_texture = VolumeFormat.is_texture(volume_format)
+        if is_texture not in self._programs:
+            program = self._ctx.program(
+                vertex_shader=read_text(shaders, "fullscreen_dda3d_vs.glsl"),
+                fragment_shader=read_text(shaders, "fullscreen_dda3d_fs.glsl"),
+                defines={"DENSITY_TEXTURE": str(int(is_texture))},
+            )
+            if is_texture:
+                program["density_texture"] = _VOLUME_TEXTURE_UNIT
+            program["empty_threshold"] = self._shader_threshold
+            self._programs[is_texture] = program
+            self._ray_limits = None  # so the new program gets them too
+        return self._programs[is_texture]
+
+    @property
+    def volume_format(self) -> VolumeFormat:
+        return self._volume_format
+
+    @volume_format.setter
+    def volume_format(self, volume_format: VolumeFormat) -> None:
+        if volume_format == self._volume_format:
+            return
+        self._volume_format = volume_format
+        self._dda_shader = self._get_program(volume_format)
+
+        # Free whatever the old format used and upload again in the new one
+        self._point_buffer = None
+        self._volume_texture = None
+        self._brick_buffer = None
+        self._upload = None
+        self._back = None
+        self.gpu_pool.release_textures()
+        self.render_data = None
+
+    @property
+    def _shader_threshold(self) -> float:
+        # Every density is at least 0, so a negative threshold skips nothing
+        return self._empty_threshold if self._skip_empty_space else -1.0
+
+    @property
+    def skip_empty_space(self) -> bool:
+        return self._skip_empty_space
+
+    @skip_empty_space.setter
+    def skip_empty_space(self, skip: bool) -> None:
+        self._skip_empty_space = skip
+        for program in self._programs.values():
+            program["empty_threshold"] = self._shader_threshold
+
+    @property
+    def empty_threshold(self) -> float:
+        """Bricks with no normalised density above this are treated as empty."""
+        return self._empty_threshold
+
+    @empty_threshold.setter
+    def empty_threshold(self, threshold: float) -> None:
+        self._empty_threshold = threshold
+        for program in self._programs.values():
+            program["empty_threshold"] = self._shader_threshold
+
+    @property
+    def brick_size(self) -> int:
+        return self._brick_size
+
+    @brick_size.setter
+    def brick_size(self, brick_size: int) -> None:
+        if brick_size == self._brick_size:
+            return
+        self._brick_size = max(1, brick_size)
+        # The grids only depend on the levels already staged, so only the one
+        # being drawn is rebuilt now, the rest when they are next uploaded
+        self._bricks = {}
+        if self._upload is not None:
+            self._upload = None  # its back grid has the old size, so start it again
+        if self._level is not None and self._brick_buffer is not None:
+            self._brick_buffer = self._upload_bricks(self._level, 1 - self._back_slot)
+
+    @property
+    def lod_reduction(self) -> Reduction:
+        return self._lod_reduction
+
+    @lod_reduction.setter
+    def lod_reduction(self, reduction: Reduction) -> None:
+        if reduction == self._lod_reduction:
+            return
+        self._lod_reduction = reduction
+        self.render_data = None  # rebuild the pyramid with the next upload
+
+    @property
+    def level(self) -> int | None:
+        """The level of detail being drawn, 0 is full resolution."""
+        return self._level
+
+    @property
+    def level_count(self) -> int:
+        return len(self._pyramid)
+
+    @property
+    def statistics(self) -> VolumeStatistics | None:
+        """
+        Magnitude statistics of the volume being drawn, None until they have
+        been gathered. The pipeline gathers them off the render thread.
+        """
+        if self.render_data is None:
+            return None
+        return cached_statistics(self.render_data.voxel_data)
+
+    @property
+    def upload_stats(self) -> UploadStats:
+        return self._upload_stats
+
+    def _count_upload(self, nbytes: int, payload: bool = False) -> None:
+        frame, total, payloads = self._upload_stats
+        self._upload_stats = UploadStats(frame + nbytes, total + nbytes, payloads + payload)
 
     def validate_data(self):
         if not COLOUR_STEP.has_processed or COLOUR_STEP.data is self.render_data:
             return
 
-        self.render_data = data = COLOUR_STEP.data
-        self._dda_shader["density_scalar"] = data.density_scalar
-        self._dda_shader["emission_brightness"] = data.emission_brightness
-
-        orientation_shape = lx,ly, lz = ORIENTATION_MAP[self.render_data.orientation]
-        ix = 0 if lx == 'i' else 1 if lx == 'j' else 2
-        iy = 0 if ly == 'i' else 1 if ly == 'j' else 2
-        iz = 0 if lz == 'i' else 1 if lz == 'j' else 2
-
-        x_size = data.voxel_dimensions[ix]
-        y_size = data.voxel_dimensions[iy]
-        z_size = data.voxel_dimensions[iz]
+        data = COLOUR_STEP.data
+        changes = diff_render_data(self.render_data, data)
+        self.render_data = data
+
+        if changes.uniforms:
+            self._dda_shader["density_scalar"] = data.density_scalar
+            self._dda_shader["emission_brightness"] = data.emission_brightness
+
+        if changes.payload:
+            # Everything up to the per frame uploads happens off the render thread
+            if self._preparing is not None:
+                self._preparing.cancel()
+            slot = 1 - self._staging_slot
+            out = None
+            if not isinstance(data.voxel_data, ChunkedVolume):
+                out = self.staging_pool.take(f"density{slot}", data.voxel_data.size, np.float32)
+            self._preparing = SCHEDULER.run(
+                self._prepare, data, self._lod_reduction, self.memory_budget, self._brick_size, out
+            )
+        elif changes.sizes:
+            self._sizes = sizes = oriented_sizes(data.orientation, data.voxel_dimensions)
+            if self._volume_texture is not None:
+                self._dda_shader["volume_size"] = sizes
+            elif self._point_buffer is not None:
+                header = pack_header(self._counts, sizes)
+                self._point_buffer.write(header)
+                self._count_upload(len(header))
+
+    @staticmethod
+    def _prepare(
+        data: RenderData, reduction: Reduction, max_bytes: int, brick_size: int, out: np.ndarray
+    ) -> PreparedVolume:
+        # The pipeline has usually gathered the statistics already, sparing a scan
+        peak = volume_statistics(data.voxel_data).maximum
+        return prepare_volume(data, reduction, max_bytes, brick_size, peak, out)
+
+    def _adopt_prepared(self) -> None:
+        """Start drawing the newly prepared volume, once the worker has finished it."""
+        if self._preparing is None or not self._preparing.done():
+            return
+        future = self._preparing
+        self._preparing = None
+        if future.cancelled():
+            return
+        try:
+            prepared = future.result()
+        except Exception as e:
+            print(f"WARNING, FAILED TO PREPARE THE VOLUME FOR DRAWING: {e}")
+            return
 
+        data = self.render_data
+        self._sizes = oriented_sizes(data.orientation, data.voxel_dimensions)
+        self._pyramid = prepared.levels
+        self._shapes = prepared.shapes
+        self._first_level = prepared.first_level
+        self._bricks = prepared.bricks if prepared.brick_size == self._brick_size else {}
+        self._staging_slot = 1 - self._staging_slot
+        self._level = None
+        self._upload = None  # any upload in progress was of the old volume
+
+    def _target_level(self) -> int:
+        inv_view = ~self._ctx.view_matrix
+        centre = np.array(self._sizes) / 2.0
+        distance = float(np.linalg.norm(np.array(inv_view[12:15]) - centre))
+        level = pick_level(
+            self._shapes,
+            VolumeFormat.to_dtype(self._volume_format).itemsize,
+            self.memory_budget,
+            distance,
+            max(self._sizes),
+            self.lod_distance,
+        )
+        # Levels of a chunked volume too large to hold in memory were never built
+        return max(level, self._first_level)
+
+    def _wanted_level(self) -> int | None:
+        """The level to upload next, None if the front one is already right."""
+        target = self._target_level()
+        if self._level is None:
+            # Show a coarse preview straight away then refine it a level at a time
+            return max(target, pick_level(
+                self._shapes,
+                VolumeFormat.to_dtype(self._volume_format).itemsize,
+                _PREVIEW_BYTES,
+            ))
+        elif target > self._level:
+            return target
+        elif target < self._level:
+            return self._level - 1
+        return None
+
+    def _update_level(self) -> None:
+        level = self._wanted_level()
+        if level is None:
+            self._upload = None
+            return
+        if self._upload is None or self._upload.level != level:
+            self._begin_upload(level)
+        self._continue_upload()
 
-        transposed = np.einsum(f'ijk...->{orientation_shape}...', data.voxel_data)
-        x_count, y_count, z_count = transposed.shape
-        print(data.voxel_counts, (x_count, y_count, z_count))
-        magnitude = np.abs(transposed)
-        linear_data = np.reshape(magnitude, -1, 'F')
-        linear_data = linear_data / np.max(linear_data)
+    def _begin_upload(self, level: int) -> None:
+        """Start writing a level into the back resources, the front keeps being drawn."""
+        linear_data = self._pyramid[level]
+        counts = self._shapes[level]
 
-        data_count = len(linear_data)
+        slot = self._back_slot
+        if VolumeFormat.is_texture(self._volume_format):
+            resource = self.gpu_pool.texture(counts, self._volume_format, slot)
+        else:
+            resource = self.gpu_pool.buffer(f"density{slot}", HEADER_SIZE + linear_data.nbytes)
 
-        _buffer_size = _BUFFER_HEADER_SIZE + data_count * 0b0100
-        if self._point_buffer is None:
-            self._point_buffer = self._ctx.buffer(reserve=_buffer_size)
-        elif self._point_buffer.size != _buffer_size:
-            self._point_buffer.orphan(_buffer_size)
+        bricks = self._upload_bricks(level, slot)
 
-        byte_data = pack(
-            f"i i i f f f {data_count}f",
-            x_count,
-            y_count,
-            z_count,
-            x_size,
-            y_size,
-            z_size,
-            *linear_data,
+        self._upload = SliceUpload(
+            level, counts, VolumeFormat.to_dtype(self._volume_format).itemsize
         )
-        self._point_buffer.write(byte_data)
+        self._upload_data = linear_data
+        self._back = (resource, bricks)
+
+    def _upload_bricks(self, level: int, slot: int) -> gl.Buffer:
+        # The brick grid is tiny next to the volume, so it goes in one write
+        if level not in self._bricks:
+            self._bricks[level] = pack_bricks(
+                self._pyramid[level], self._shapes[level], self._brick_size
+            )
+        header, brick_max = self._bricks[level]
+        _buffer_size = BRICK_HEADER_SIZE + brick_max.nbytes
+        bricks = self.gpu_pool.buffer(f"bricks{slot}", _buffer_size)
+        bricks.write(header)
+        bricks.write(brick_max, BRICK_HEADER_SIZE)
+        self._count_upload(_buffer_size)
+        return bricks
+
+    def _continue_upload(self) -> None:
+        """Write this frame's share of the back resources, swapping once they are full."""
+        upload = self._upload
+        first, end = upload.take(self.upload_budget)
+        start, stop = first * upload.plane_size, end * upload.plane_size
+        linear_data = self._upload_data[start:stop]
+        resource, _ = self._back
+
+        if VolumeFormat.is_texture(self._volume_format):
+            size = self._upload_data.size
+            scratch = None
+            if self._volume_format == VolumeFormat.BYTE:
+                scratch = self.staging_pool.take("scratch", size, np.float32)[start:stop]
+            quantised = self.staging_pool.take(
+                "quantised", size, VolumeFormat.to_dtype(self._volume_format)
+            )[start:stop]
+            resource.write(
+                quantise_density(linear_data, self._volume_format, quantised, scratch),
+                first,
+            )
+        else:
+            # The volume goes straight from the array's memory to the GPU
+            resource.write(linear_data, HEADER_SIZE + linear_data.itemsize * start)
+        self._count_upload((end - first) * upload.plane_bytes)
+
+        if upload.done:
+            self._swap()
+
+    def _swap(self) -> None:
+        """Draw from the just filled back resources, the old front becomes the back."""
+        resource, bricks = self._back
+        self._level = self._upload.level
+        self._counts = counts = self._upload.counts
+        if VolumeFormat.is_texture(self._volume_format):
+            self._volume_texture, self._point_buffer = resource, None
+            self._dda_shader["voxel_counts"] = counts
+            self._dda_shader["volume_size"] = self._sizes
+        else:
+            self._volume_texture, self._point_buffer = None, resource
+            # Written last so it has any size change made during the upload
+            header = pack_header(counts, self._sizes)
+            resource.write(header)
+            self._count_upload(len(header))
+        self._brick_buffer = bricks
+        self._count_upload(0, True)
+
+        self._back_slot = 1 - self._back_slot
+        self._upload = None
+        self._upload_data = None
+        self._back = None
+
+    def _update_ray_limits(self) -> None:
+        view = self._ctx.view_matrix
+        moving = self._last_view is not None and view != self._last_view
+        self._last_view = view
+
+        limits = self.ray_budget.update(moving)
+        if limits == self._ray_limits:
+            return
+        self._ray_limits = limits
+        for program in self._programs.values():
+            program["max_steps"] = limits.max_steps
+            program["min_transmission"] = limits.min_transmission
+
+    def _get_render_target(self, size: tuple[int, int]) -> gl.Framebuffer:
+        if self._render_target is None or self._render_target.size != size:
+            self._render_target = self._ctx.framebuffer(
+                color_attachments=[
+                    self._ctx.texture(
+                        size,
+                        components=4,
+                        wrap_x=self._ctx.CLAMP_TO_EDGE,
+                        wrap_y=self._ctx.CLAMP_TO_EDGE,
+                    )
+                ]
+            )
+        return self._render_target
+
+    @property
+    def uploading(self) -> bool:
+        """Whether a level is still being written to the back resources."""
+        return self._upload is not None
+
+    def _draw_volume(self) -> None:
+        self.render_data.colour_map.use()
+        if self._volume_texture is not None:
+            self._volume_texture.use(_VOLUME_TEXTURE_UNIT)
+        else:
+            self._point_buffer.bind_to_storage_buffer()
+        self._brick_buffer.bind_to_storage_buffer(binding=_BRICK_BUFFER_BINDING)
+        self._dda_geometry.render(self._dda_shader)
 
     def draw(self):
+        with INSTRUMENTS.time("cpu/volume"):
+            self._draw()
+
+    def _draw(self):
+        now = perf_counter()
+        frame_time = 0.0 if self._last_draw is None else now - self._last_draw
+        self._last_draw = now
+
+        # Only count what this frame uploads
+        self._upload_stats = self._upload_stats._replace(frame=0)
         self.validate_data()
         if self.render_data is None:
             return
+        self._adopt_prepared()
+        if not self._pyramid:
+            return  # the first volume is still being prepared
+        with INSTRUMENTS.time("cpu/upload"):
+            self._update_level()
+        if self._brick_buffer is None:
+            return  # the first level hasn't finished uploading
+        self._update_ray_limits()
 
         old_func = self._ctx.blend_func
         self._win.ctx.blend_func = self._ctx.BLEND_ADDITIVE
 
-        self.render_data.colour_map.use()
-        self._point_buffer.bind_to_storage_buffer()
-        self._dda_geometry.render(self._dda_shader)
+        scale = self.render_scale.update(frame_time)
+        with self._gpu_timer:
+            if scale >= 1.0:
+                self._render_target = None
+                self._draw_volume()
+            else:
+                target = self._get_render_target(
+                    self.render_scale.resolution(self._win.get_framebuffer_size())
+                )
+                with target.activate():
+                    target.clear()
+                    self._draw_volume()
+                target.color_attachments[0].use(0)
+                self._dda_geometry.render(self._upscale_shader)
 
         self._win.ctx.blend_func = old_func
@@ -1,13 +1,19 @@
+from time import perf_counter
+
 from pyMRI.config import LaunchConfig
 
 from pyMRI.rendering.camera import CameraCarousel
 from pyMRI.rendering.voxel import VoxelRenderer
 
 from pyMRI.gui.gui import GUI
+from pyMRI.instrumentation import INSTRUMENTS
+from pyMRI.processing import SCHEDULER, FOURIER_STEP, INTERPOLATE_STEP
+from pyMRI.processing.cache import PipelineCache
 
 from arcade import Window as ArcadeWindow, key, Text, get_screens
 
 SPRITE_SIZE = 8
+PERSIST_DELAY = 2.0  # seconds the pipeline has to be idle before outputs are cached to disk
 
 
 class Window(ArcadeWindow):
@@ -20,14 +26,27 @@ class Window(ArcadeWindow):
         super().__init__(
             w, h, launch_config.window_name, fullscreen=launch_config.fullscreen
         )
-        GUI.initialise()
+        self._voxel_renderer: VoxelRenderer = VoxelRenderer()
+        GUI.initialise(self._voxel_renderer)
         self.center_window()
 
         self._switch_text = Text("Press ` or ~ to toggle menu", 10, 10, font_size=12)
+        self._progress_text = Text("", 10, 30, font_size=12)
 
-        self._carousel: CameraCarousel = CameraCarousel()
+        # Process the pipeline off the render thread
+        SCHEDULER.background = launch_config.background_processing
 
-        self._voxel_renderer: VoxelRenderer = VoxelRenderer()
+        # Reopening a scan with the same settings loads its results from disk.
+        # Outputs are only written once the settings have settled, not every slider tick
+        self._pipeline_cache: PipelineCache = None
+        self._last_busy: float = perf_counter()
+        if launch_config.use_cache:
+            self._pipeline_cache = PipelineCache(
+                launch_config.cache_directory, defer_writes=True
+            )
+            self._pipeline_cache.attach(FOURIER_STEP, INTERPOLATE_STEP)
+
+        self._carousel: CameraCarousel = CameraCarousel()
 
         # self._mri: MRI = MRI(launch_config, self._voxel_renderer)
 
@@ -45,15 +64,39 @@ class Window(ArcadeWindow):
 
     def on_update(self, delta_time: float):
         GUI.update()
+        SCHEDULER.flush()
+        self._persist_when_idle()
+
+    def _persist_when_idle(self):
+        if self._pipeline_cache is None:
+            return
+        now = perf_counter()
+        if SCHEDULER.busy or SCHEDULER.is_dirty:
+            self._last_busy = now
+        elif self._pipeline_cache.pending and now - self._last_busy > PERSIST_DELAY:
+            # Written on the worker, so the frame never waits on the disk
+            SCHEDULER.run(self._pipeline_cache.persist)
+            self._last_busy = now
+
+    def on_close(self):
+        if self._pipeline_cache is not None:
+            SCHEDULER.wait()
+            self._pipeline_cache.persist()
+        super().on_close()
 
     def on_draw(self):
-        self.clear()
+        with INSTRUMENTS.time("cpu/frame"):
+            self.clear()
+
+            with self._carousel.activate():
+                self._voxel_renderer.draw()
 
-        with self._carousel.activate():
-            self._voxel_renderer.draw()
+            with self.default_camera.activate():
+                GUI.draw()
 
-        with self.default_camera.activate():
-            GUI.draw()
+                if not GUI.exclusive:
+                    self._switch_text.draw()
 
-            if not GUI.exclusive:
-                self._switch_text.draw()
+                if SCHEDULER.busy:
+                    self._progress_text.text = f"Processing... {SCHEDULER.progress:.0%}"
+                    self._progress_text.draw()
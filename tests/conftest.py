@@ -0,0 +1,33 @@
+from pathlib import Path
+from struct import pack
+from typing import Callable
+
+import numpy as np
+import pytest
+
+from pyMRI.loading.prospa import _HEADER_FORMAT
+
+
+def write_prospa_file(
+    path: Path, img_count: int, img_height: int, img_width: int, seed: int = 0
+) -> Path:
+    """Write a synthetic prospa data file filled with random complex samples."""
+    rng = np.random.default_rng(seed)
+    samples = rng.standard_normal(2 * img_count * img_height * img_width)
+    header = pack(
+        _HEADER_FORMAT, b"DATA", b"PROS", b"V1.1", 504, img_width, img_height, img_count, 0
+    )
+    path.write_bytes(header + samples.astype("<f4").tobytes())
+    return path
+
+
+@pytest.fixture
+def prospa_file(tmp_path) -> Callable[..., Path]:
+    """A factory for synthetic prospa files within the test's tmp_path."""
+
+    def factory(
+        img_count: int, img_height: int, img_width: int, name: str = "data.3d", seed: int = 0
+    ) -> Path:
+        return write_prospa_file(tmp_path / name, img_count, img_height, img_width, seed)
+
+    return factory
@@ -0,0 +1,54 @@
+from pathlib import Path
+from struct import unpack
+
+import numpy as np
+import pytest
+
+from pyMRI.loading.prospa import ProspaDataLoader, _HEADER_FORMAT, _HEADER_SIZE
+
+
+def reference_load(path: Path) -> np.ndarray:
+    """The original per-voxel struct.unpack loop the vectorised reader replaces."""
+    with open(path, "rb") as data_file:
+        _, _, _, _, img_width, img_height, img_count, _ = unpack(
+            _HEADER_FORMAT, data_file.read(_HEADER_SIZE)
+        )
+        image_chunk_size = 8 * img_width * img_height
+        image_chunk_format = "<" + "f" * (2 * img_width * img_height)
+        images = np.zeros([img_count, img_height, img_width], dtype=np.complex128)
+
+        for img in images[:]:
+            data = unpack(image_chunk_format, data_file.read(image_chunk_size))
+            for idx in range(img_width * img_height):
+                value = data[2 * idx] + 1j * data[2 * idx + 1]
+                img[idx % img_height, idx // img_height] = value
+    return images
+
+
+@pytest.mark.parametrize(
+    "count, height, width",
+    [(1, 1, 16), (1, 8, 16), (4, 8, 16), (5, 3, 7), (6, 6, 6)],
+)
+def test_vectorised_load_matches_reference_loop(prospa_file, count, height, width):
+    path = prospa_file(count, height, width)
+
+    expected = reference_load(path)
+    loaded = ProspaDataLoader(path).data
+
+    assert loaded.count == (count, height, width)
+    assert loaded.data.shape == expected.shape
+    assert loaded.data.dtype == np.complex64
+    assert np.array_equal(loaded.data, expected)
+
+
+def test_memory_mapped_load_matches_eager_load(prospa_file):
+    path = prospa_file(4, 8, 16)
+
+    eager = ProspaDataLoader(path).data
+    mapped = ProspaDataLoader(path, memory_map=True).data
+
+    assert mapped.count == eager.count
+    assert isinstance(mapped.data, np.memmap)
+    assert not mapped.data.flags.writeable
+    assert np.array_equal(mapped.data, eager.data)
+    assert np.array_equal(mapped.data[2, 3:5, ::3], eager.data[2, 3:5, ::3])
@@ -0,0 +1,152 @@
+import numpy as np
+import pytest
+
+from pyMRI.processing import (
+    InterpolateModes,
+    FileData,
+    FourierData,
+    Unit,
+    FileLoaderStep,
+    ShiftStep,
+    FilterStep,
+    FourierStep,
+    InterpolateStep,
+)
+from pyMRI.processing.cache import PipelineCache
+from pyMRI.processing.chunked import ChunkedVolume, chunk_rows, roll
+
+
+def random_volume(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(np.complex64)
+
+
+def both(step_type, data, configure, dimensions=(1.0, 1.0, 1.0)):
+    """Run a step over data in memory and chunked three rows at a time."""
+    results = []
+    for voxel_data in (data, ChunkedVolume.from_array(data, chunk=3)):
+        step = step_type(None)
+        with step.unready():
+            configure(step)
+        step.update(FileData("xyz", dimensions, Unit.MM, data.shape, voxel_data))
+        results.append(step.data)
+    return results
+
+
+def test_chunk_rows_stays_within_the_budget():
+    assert chunk_rows((100, 10, 10), np.complex64, 8 * 100 * 3) == 3
+    assert chunk_rows((100, 10, 10), np.complex64, 1) == 1
+    assert chunk_rows((4, 10, 10), np.complex64, 2**30) == 4
+
+
+def test_round_trip_and_map():
+    data = random_volume((7, 4, 5))
+    volume = ChunkedVolume.from_array(data, chunk=2)
+    assert volume.shape == data.shape and volume.dtype == data.dtype
+    assert np.array_equal(np.asarray(volume), data)
+    assert [rows.start for rows in volume.slabs()] == [0, 2, 4, 6]
+
+    doubled = volume.map(lambda slab, rows: slab * 2)
+    assert np.array_equal(np.asarray(doubled), data * 2)
+    assert volume.reduce(lambda slab: float(np.abs(slab).max())) == pytest.approx(
+        float(np.abs(data).max())
+    )
+
+
+def test_temporary_file_is_removed(tmp_path):
+    volume = ChunkedVolume.empty((2, 2, 2), np.float32, directory=tmp_path)
+    assert len(list(tmp_path.iterdir())) == 1
+    del volume
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("shifts", [(3, -1, 2), (-8, 0, 0), (0, 5, 1)])
+def test_roll_matches_numpy(shifts):
+    data = random_volume((10, 6, 8))
+    rolled = roll(ChunkedVolume.from_array(data, chunk=3), shifts)
+    assert np.array_equal(np.asarray(rolled), np.roll(data, shifts, (0, 1, 2)))
+
+
+def test_shift_and_filter_match_in_memory():
+    data = random_volume((10, 6, 8))
+
+    def shift(step):
+        step.shifts = (4, -2, 1)
+
+    memory, chunked = both(ShiftStep, data, shift)
+    assert isinstance(chunked.voxel_data, ChunkedVolume)
+    assert np.array_equal(np.asarray(chunked.voxel_data), memory.voxel_data)
+
+    def filtering(step):
+        step.low_pass = step.high_pass = step.band_pass = True
+        step.band_pass_target = 1.0
+
+    memory, chunked = both(FilterStep, data, filtering)
+    assert np.array_equal(np.asarray(chunked.voxel_data), memory.voxel_data)
+
+
+@pytest.mark.parametrize("inverse", [False, True])
+@pytest.mark.parametrize("norm", ["backward", "ortho", "forward"])
+def test_fourier_matches_in_memory(inverse, norm):
+    data = random_volume((10, 6, 8))
+
+    def fourier(step):
+        step.should = True
+        step.inverse = inverse
+        step.norm = norm
+
+    memory, chunked = both(FourierStep, data, fourier)
+    assert chunked.voxel_data.dtype == memory.voxel_data.dtype == np.float32
+    assert np.allclose(np.asarray(chunked.voxel_data), memory.voxel_data, rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize(
+    "mode", [InterpolateModes.DOUBLE, InterpolateModes.TRIPLE, InterpolateModes.CUBE]
+)
+def test_interpolate_matches_in_memory(mode):
+    data = random_volume((10, 6, 8))
+
+    def interpolate(step):
+        step.mode = mode
+
+    memory, chunked = both(InterpolateStep, data, interpolate, (10.0, 3.0, 4.0))
+    assert chunked.voxel_counts == memory.voxel_counts
+    assert np.array_equal(np.asarray(chunked.voxel_data), memory.voxel_data)
+
+
+def test_chunked_pipeline_matches_in_memory(prospa_file, tmp_path):
+    path = prospa_file(10, 6, 8)
+    results = []
+    for chunked in (False, True):
+        interpolate = InterpolateStep(None)
+        fourier = FourierStep(interpolate)
+        filtering = FilterStep(fourier)
+        shift = ShiftStep(filtering)
+        loader = FileLoaderStep(shift)
+        with loader.unready():
+            loader.exclude_parameter_file = True
+            loader.memory_map = chunked
+            loader.chunked = chunked
+            loader.data_path = str(path)
+        loader.load_data = True
+        with interpolate.unready():
+            interpolate.mode = InterpolateModes.DOUBLE
+        with fourier.unready():
+            fourier.should = True
+        with filtering.unready():
+            filtering.low_pass = True
+        shift.shifts = (1, 2, 3)
+        results.append(interpolate.data)
+
+    memory, chunked = results
+    assert isinstance(chunked.voxel_data, ChunkedVolume)
+    assert chunked._replace(voxel_data=None) == memory._replace(voxel_data=None)
+    assert np.allclose(np.asarray(chunked.voxel_data), memory.voxel_data, rtol=1e-4, atol=1e-4)
+
+    # Chunked outputs go through the pipeline cache a slab at a time
+    cache = PipelineCache(tmp_path / "cache")
+    cache.put("key", chunked)
+    cached = cache.get("key")
+    assert isinstance(cached, FourierData)
+    assert isinstance(cached.voxel_data, ChunkedVolume)
+    assert np.array_equal(np.asarray(cached.voxel_data), np.asarray(chunked.voxel_data))
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import pyMRI.processing.fft as fft
+from pyMRI.processing import FFTBackend, FourierNorm
+
+
+@pytest.fixture
+def volume() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    shape = (6, 10, 12)
+    data = rng.standard_normal(shape) + 1j * rng.standard_normal(shape)
+    return data.astype(np.complex64)
+
+
+@pytest.mark.parametrize("backend", fft.available_backends())
+@pytest.mark.parametrize("axes", [(-1,), (-2, -1), (-3, -2, -1)])
+@pytest.mark.parametrize("norm", list(FourierNorm))
+@pytest.mark.parametrize("inverse", [False, True])
+def test_backends_match_numpy(volume, backend, axes, norm, inverse):
+    func = np.fft.ifftn if inverse else np.fft.fftn
+    expected = func(volume.astype(np.complex128), None, axes, norm)
+
+    result = fft.fftn(volume, axes, norm, inverse, backend, workers=2)
+
+    assert result.dtype == np.complex64
+    assert np.allclose(result, expected, rtol=1e-4, atol=1e-4 * np.abs(expected).max())
+
+
+def test_unavailable_backend_falls_back_to_numpy(monkeypatch, volume):
+    monkeypatch.setattr(fft, "fftw_fft", None)
+    monkeypatch.setattr(fft, "scipy_fft", None)
+
+    assert fft.available_backends() == (FFTBackend.NUMPY,)
+    assert fft.resolve_backend(FFTBackend.PYFFTW) == FFTBackend.NUMPY
+    result = fft.fftn(volume, (-3, -2, -1), backend=FFTBackend.SCIPY)
+    assert result.dtype == np.complex64
+    assert np.allclose(result, np.fft.fftn(volume), rtol=1e-4, atol=1e-3)
+    assert fft.fftn(volume.astype(np.complex128), (-1,)).dtype == np.complex128
+
+
+@pytest.mark.parametrize("workers", [-1, -2, 0, 1, 10_000])
+def test_resolve_workers_is_clamped_to_the_core_count(workers):
+    assert 1 <= fft.resolve_workers(workers) <= (fft.cpu_count() or 1)
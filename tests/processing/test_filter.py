@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from pyMRI.processing import FileData, Unit, FilterStep
+from pyMRI.processing.fourier import _gaussian_kernal1d, _gaussian_kernal3d
+
+
+def reference_kernel(shape, nsig, offset=0.0):
+    """The full 3D einsum kernel FilterStep used to build on every update."""
+    gx, gy, gz = (
+        [1.0] if size == 1 else _gaussian_kernal1d(size, nsig, offset) for size in shape
+    )
+    return np.einsum("i,j,k->ijk", gx, gy, gz)
+
+
+def reference_filter(data, low, high, band, radii, target):
+    filtered = data.astype(np.complex128)
+    if low:
+        kern = reference_kernel(data.shape, radii[0])
+        filtered = filtered * kern / np.sum(kern)
+    if high:
+        kern = 1 - reference_kernel(data.shape, radii[1])
+        filtered = filtered * kern / np.sum(kern)
+    if band:
+        kern = reference_kernel(data.shape, radii[2], target)
+        filtered = filtered * kern / np.sum(kern)
+    return filtered
+
+
+@pytest.mark.parametrize("shape", [(6, 8, 10), (1, 8, 10), (1, 1, 16)])
+@pytest.mark.parametrize(
+    "low, high, band",
+    [
+        (True, False, False),
+        (False, True, False),
+        (False, False, True),
+        (True, True, False),
+        (True, False, True),
+        (True, True, True),
+    ],
+)
+def test_separable_filter_matches_full_kernels(shape, low, high, band):
+    rng = np.random.default_rng(0)
+    data = (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(
+        np.complex64
+    )
+    radii = (2.0, 1.5, 3.0)
+    target = 1.0
+
+    step = FilterStep(None)
+    with step.unready():
+        step.low_pass, step.high_pass, step.band_pass = low, high, band
+        step.low_pass_radius, step.high_pass_radius, step.band_pass_radius = radii
+        step.band_pass_target = target
+    step.update(FileData("xyz", (1.0, 1.0, 1.0), Unit.MM, shape, data))
+
+    expected = reference_filter(data, low, high, band, radii, target)
+    filtered = step.data.voxel_data
+    assert filtered.dtype == np.complex64
+    assert np.allclose(filtered, expected, rtol=1e-4, atol=1e-5 * np.abs(expected).max())
+
+
+def test_kernels_are_memoised():
+    _gaussian_kernal3d.cache_clear()
+    first = _gaussian_kernal3d((4, 5, 6), 2.0, 0.5)
+    second = _gaussian_kernal3d((4, 5, 6), 2.0, 0.5)
+
+    assert first is second
+    assert _gaussian_kernal3d.cache_info().hits == 1
+    assert first[1] == pytest.approx(np.sum(reference_kernel((4, 5, 6), 2.0, 0.5)))
@@ -0,0 +1,94 @@
+import gc
+
+import numpy as np
+
+from pyMRI.processing import FileData, FourierNorm, Unit, FourierStep
+from pyMRI.processing.fourier import FourierCache
+
+AXES = (-3, -2, -1)
+
+
+def make_volume(seed: int = 0, shape: tuple[int, int, int] = (4, 6, 8)) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(
+        np.complex64
+    )
+
+
+def test_cache_hits_on_same_input_and_parameters():
+    cache = FourierCache()
+    data = make_volume()
+    result = np.abs(np.fft.fftn(data))
+
+    assert cache.get(data, AXES, FourierNorm.BACKWARD, False) is None
+    cache.put(data, AXES, FourierNorm.BACKWARD, False, result)
+
+    assert cache.get(data, AXES, FourierNorm.BACKWARD, False) is result
+    assert cache.get(data, AXES, FourierNorm.ORTHOGRAPHIC, False) is None
+    assert cache.get(data, AXES, FourierNorm.BACKWARD, True) is None
+    assert cache.get(data, (-1,), FourierNorm.BACKWARD, False) is None
+    assert cache.get(data.copy(), AXES, FourierNorm.BACKWARD, False) is None
+    assert (cache.hits, cache.misses) == (1, 5)
+    assert not result.flags.writeable
+
+
+def test_cache_evicts_least_recently_used_past_ceiling():
+    data = make_volume()
+    result = np.abs(np.fft.fftn(data))
+    cache = FourierCache(max_bytes=2 * result.nbytes)
+
+    cache.put(data, AXES, FourierNorm.BACKWARD, False, result)
+    cache.put(data, AXES, FourierNorm.FORWARD, False, result.copy())
+    cache.get(data, AXES, FourierNorm.BACKWARD, False)
+    cache.put(data, AXES, FourierNorm.ORTHOGRAPHIC, False, result.copy())
+
+    assert len(cache) == 2
+    assert cache.nbytes == 2 * result.nbytes
+    assert cache.get(data, AXES, FourierNorm.FORWARD, False) is None
+    assert cache.get(data, AXES, FourierNorm.BACKWARD, False) is result
+
+
+def test_cache_ignores_results_larger_than_ceiling():
+    data = make_volume()
+    cache = FourierCache(max_bytes=16)
+    cache.put(data, AXES, FourierNorm.BACKWARD, False, np.abs(data))
+    assert len(cache) == 0
+
+
+def test_cache_drops_entries_when_input_is_collected():
+    cache = FourierCache()
+    data = make_volume()
+    cache.put(data, AXES, FourierNorm.BACKWARD, False, np.abs(data))
+    assert len(cache) == 1
+
+    del data
+    gc.collect()
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+
+
+def test_hashed_cache_matches_equal_content():
+    cache = FourierCache(hash_inputs=True)
+    data = make_volume()
+    result = np.abs(data)
+    cache.put(data, AXES, FourierNorm.BACKWARD, False, result)
+
+    assert cache.get(data.copy(), AXES, FourierNorm.BACKWARD, False) is result
+    assert cache.get(make_volume(1), AXES, FourierNorm.BACKWARD, False) is None
+
+
+def test_fourier_step_reuses_results_when_settings_flip_back():
+    step = FourierStep(None)
+    data = FileData("xyz", (1.0, 1.0, 1.0), Unit.MM, (4, 6, 8), make_volume())
+    with step.unready():
+        step.should = True
+    step.update(data)
+    first = step.data.voxel_data
+
+    step.inverse = True
+    assert step.data.voxel_data is not first
+    step.inverse = False
+
+    assert step.data.voxel_data is first
+    assert np.allclose(first, np.abs(np.fft.fftn(data.voxel_data)), rtol=1e-4, atol=1e-3)
+    assert (step.cache.hits, step.cache.misses) == (1, 2)
@@ -0,0 +1,152 @@
+import numpy as np
+import pytest
+from scipy.interpolate import RegularGridInterpolator
+
+from pyMRI.processing import (
+    InterpolateModes,
+    InterpolateKernel,
+    FileData,
+    Unit,
+    InterpolateStep,
+)
+from pyMRI.processing import adjust
+from pyMRI.processing.chunked import ChunkedVolume
+from pyMRI.processing.scheduler import StepScheduler
+from pyMRI.processing.statistics import cached_statistics
+
+
+def reference_interpolate(data, dimensions, new_counts):
+    """The RegularGridInterpolator InterpolateStep used to evaluate on a full meshgrid."""
+    spaces = [np.linspace(0, dim, count) for dim, count in zip(dimensions, data.shape)]
+    new_spaces = [np.linspace(0, dim, count) for dim, count in zip(dimensions, new_counts)]
+    interp = RegularGridInterpolator(spaces, data, "linear")
+    ix, iy, iz = np.meshgrid(*new_spaces, sparse=True, indexing="ij")
+    return interp((ix, iy, iz)).astype(data.dtype, copy=False)
+
+
+@pytest.mark.parametrize("shape", [(5, 6, 7), (1, 6, 7), (1, 1, 9)])
+@pytest.mark.parametrize(
+    "mode, factor",
+    [
+        (InterpolateModes.DOUBLE, 2),
+        (InterpolateModes.TRIPLE, 3),
+        (InterpolateModes.QUADRUPLE, 4),
+    ],
+)
+@pytest.mark.parametrize("dtype", [np.complex64, np.complex128, np.float32])
+def test_separable_resampler_matches_regular_grid_interpolator(shape, mode, factor, dtype):
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal(shape)
+    if np.issubdtype(dtype, np.complexfloating):
+        data = data + 1j * rng.standard_normal(shape)
+    data = data.astype(dtype)
+    dimensions = (2.0, 3.0, 4.5)
+
+    step = InterpolateStep(None)
+    with step.unready():
+        step.mode = mode
+    step.update(FileData("xyz", dimensions, Unit.MM, shape, data))
+
+    new_counts = tuple(1 if count == 1 else factor * count for count in shape)
+    result = step.data.voxel_data
+    assert step.data.voxel_counts == new_counts
+    assert result.dtype == dtype
+    expected = reference_interpolate(data, dimensions, new_counts)
+    tolerance = 1e-12 if dtype == np.complex128 else 1e-5
+    assert np.allclose(result, expected, rtol=tolerance, atol=tolerance)
+
+
+def test_resampler_reproduces_the_grid_points():
+    data = np.random.default_rng(1).random((4, 5, 6), np.float32)
+    step = InterpolateStep(None)
+    with step.unready():
+        step.mode = InterpolateModes.CUBE
+    # Already cubic voxels, so every output lands on an input grid point
+    step.update(FileData("xyz", (4.0, 5.0, 6.0), Unit.MM, data.shape, data))
+    assert step.data.voxel_counts == (4, 5, 6)
+    assert np.array_equal(step.data.voxel_data, data)
+
+
+def interpolate(data, mode, kernel, dimensions=(2.0, 3.0, 4.5), memory_budget=2**30):
+    step = InterpolateStep(None)
+    with step.unready():
+        step.mode = mode
+        step.kernel = kernel
+        step.memory_budget = memory_budget
+    step.update(FileData("xyz", dimensions, Unit.MM, data.shape, data))
+    return step.data
+
+
+def test_cubic_reproduces_quadratics_between_the_edges():
+    x = np.linspace(0, 2.0, 9)
+    data = np.broadcast_to((x**2 - x)[:, None, None], (9, 4, 4)).astype(np.float64)
+
+    result = interpolate(data, InterpolateModes.DOUBLE, InterpolateKernel.CUBIC).voxel_data
+    nx = np.linspace(0, 2.0, 18)
+    inside = (nx > x[1]) & (nx < x[-2])  # the edges repeat, so lose a point of accuracy
+    assert np.allclose(result[inside, 0, 0], (nx**2 - nx)[inside])
+
+
+def test_lanczos_keeps_constants_and_grid_points():
+    data = np.full((5, 6, 7), 3 + 2j, np.complex64)
+    result = interpolate(data, InterpolateModes.TRIPLE, InterpolateKernel.LANCZOS).voxel_data
+    assert np.allclose(result, 3 + 2j)
+
+    data = np.random.default_rng(2).random((4, 5, 6))
+    result = interpolate(
+        data, InterpolateModes.CUBE, InterpolateKernel.LANCZOS, (4.0, 5.0, 6.0)
+    ).voxel_data
+    assert np.allclose(result, data)
+
+
+def test_fourier_interpolates_band_limited_data_exactly():
+    n = 16
+    x = np.arange(n) / n
+    wave = np.exp(2j * np.pi * 3 * x)
+    data = (wave[:, None, None] * wave[None, :, None] * np.ones(4)).astype(np.complex128)
+
+    result = interpolate(data, InterpolateModes.DOUBLE, InterpolateKernel.FOURIER).voxel_data
+    assert result.shape == (2 * n, 2 * n, 8)
+    fine = np.exp(2j * np.pi * 3 * np.arange(2 * n) / (2 * n))
+    assert np.allclose(result, fine[:, None, None] * fine[None, :, None])
+
+
+@pytest.mark.parametrize("kernel", list(InterpolateKernel))
+def test_tiling_over_the_memory_budget_matches_in_memory(kernel):
+    rng = np.random.default_rng(3)
+    data = (rng.standard_normal((9, 6, 7)) + 1j * rng.standard_normal((9, 6, 7))).astype(
+        np.complex64
+    )
+    in_memory = interpolate(data, InterpolateModes.DOUBLE, kernel)
+    tiled = interpolate(data, InterpolateModes.DOUBLE, kernel, memory_budget=1024)
+
+    assert isinstance(in_memory.voxel_data, np.ndarray)
+    assert isinstance(tiled.voxel_data, ChunkedVolume)
+    assert tiled.voxel_counts == in_memory.voxel_counts
+    assert np.array_equal(np.asarray(tiled.voxel_data), in_memory.voxel_data)
+
+
+def test_refuses_outputs_larger_than_the_free_space(monkeypatch, capsys):
+    monkeypatch.setattr(adjust, "free_bytes", lambda: 4096)
+    data = np.ones((10, 10, 10), np.complex64)
+
+    # Half a millimetre becomes 500 samples along every axis
+    result = interpolate(
+        data, InterpolateModes.MINIMUM, InterpolateKernel.LINEAR, (0.5, 0.5, 0.5), 0
+    )
+    assert result.voxel_counts == (10, 10, 10)
+    assert result.voxel_data is data
+    assert "WARNING" in capsys.readouterr().out
+
+
+def test_scheduled_steps_gather_statistics_before_publishing():
+    data = np.random.default_rng(4).random((4, 5, 6), np.float32)
+    step = InterpolateStep(None)
+    scheduler = StepScheduler(step, background=True)
+    step._safe_set("_input", FileData("xyz", (2.0, 3.0, 4.5), Unit.MM, data.shape, data))
+    step.mode = InterpolateModes.DOUBLE
+    scheduler.flush()
+    scheduler.wait(5.0)
+    scheduler.flush()
+    assert cached_statistics(step.data.voxel_data) is not None
+    scheduler.detach()
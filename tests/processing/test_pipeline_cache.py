@@ -0,0 +1,189 @@
+from threading import Event
+
+import numpy as np
+import pytest
+
+from pyMRI.processing import (
+    InterpolateModes,
+    FileLoaderStep,
+    FilterStep,
+    FourierStep,
+    InterpolateStep,
+)
+from pyMRI.processing.cache import PipelineCache
+from pyMRI.processing.scheduler import StepScheduler
+
+
+def build_pipeline(cache: PipelineCache):
+    interpolate = InterpolateStep(None)
+    fourier = FourierStep(interpolate)
+    filtering = FilterStep(fourier)
+    loader = FileLoaderStep(filtering)
+    cache.attach(fourier, interpolate)
+    return loader, filtering, fourier, interpolate
+
+
+def process(cache, path, low_pass=True):
+    loader, filtering, fourier, interpolate = build_pipeline(cache)
+    with loader.unready():
+        loader.exclude_parameter_file = True
+        loader.data_path = str(path)
+    loader.load_data = True
+
+    # Each setting updates the chain, so set the last first to only run once
+    with interpolate.unready():
+        interpolate.mode = InterpolateModes.DOUBLE
+    with fourier.unready():
+        fourier.should = True
+    filtering.low_pass = low_pass
+    return loader, fourier, interpolate
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PipelineCache(tmp_path / "cache")
+
+
+def test_reopening_a_scan_loads_from_the_cache(cache, prospa_file):
+    path = prospa_file(4, 6, 8)
+    _, fourier, interpolate = process(cache, path)
+    assert cache.hits == 0
+    assert len(list(cache.directory.glob("*.npy"))) == 2
+
+    _, cached_fourier, cached_interpolate = process(cache, path)
+    assert cache.hits == 2
+
+    result = cached_interpolate.data
+    assert isinstance(result.voxel_data, np.memmap)
+    assert result._replace(voxel_data=None) == interpolate.data._replace(voxel_data=None)
+    assert np.array_equal(result.voxel_data, interpolate.data.voxel_data)
+    assert np.array_equal(cached_fourier.data.voxel_data, fourier.data.voxel_data)
+
+
+def test_provenance_depends_on_settings_and_contents(cache, prospa_file):
+    path = prospa_file(4, 6, 8)
+    loader, fourier, _ = process(cache, path)
+    key = fourier.provenance
+
+    with fourier.unready():
+        fourier.workers = 1
+    assert fourier.provenance == key
+
+    # The loader's part is what it last loaded with, not its current settings
+    with loader.unready():
+        loader.dimension_override = (9.0, 9.0, 9.0)
+    assert fourier.provenance == key
+
+    _, other_fourier, _ = process(cache, path, low_pass=False)
+    assert other_fourier.provenance != key
+
+    # Same settings, different file contents
+    _, changed_fourier, _ = process(cache, prospa_file(4, 6, 8, name="other.3d", seed=1))
+    assert changed_fourier.provenance != key
+
+
+def test_provenance_is_independent_of_the_file_location(cache, prospa_file):
+    first = prospa_file(4, 6, 8, name="first.3d")
+    second = prospa_file(4, 6, 8, name="second.3d")
+
+    _, fourier, _ = process(cache, first)
+    _, other_fourier, _ = process(cache, second)
+    assert fourier.provenance == other_fourier.provenance
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path, prospa_file):
+    cache = PipelineCache(tmp_path / "cache", max_bytes=4 * 6 * 8 * 4 * 3)
+    for seed in range(3):
+        process(cache, prospa_file(4, 6, 8, name=f"{seed}.3d", seed=seed))
+
+    assert cache.nbytes() <= cache.max_bytes
+    assert len(list(cache.directory.glob("*.json"))) == len(
+        list(cache.directory.glob("*.npy"))
+    )
+
+
+def test_leftover_partial_files_are_not_entries(cache, prospa_file):
+    _, fourier, _ = process(cache, prospa_file(4, 6, 8))
+    assert not list(cache.directory.glob("*.partial"))
+
+    # As if a write had been interrupted
+    (cache.directory / "0123.npy.partial").write_bytes(b"\0" * 64)
+    nbytes = sum(path.stat().st_size for path in cache.directory.glob("*.npy"))
+    assert cache.nbytes() == nbytes
+    assert "0123" not in cache
+
+    cache.clear()
+    assert not any(cache.directory.iterdir())
+
+
+def test_deferred_writes_keep_only_the_newest_output_until_persisted(tmp_path, prospa_file):
+    cache = PipelineCache(tmp_path / "cache", defer_writes=True)
+    path = prospa_file(4, 6, 8)
+    loader, fourier, interpolate = process(cache, path)
+    filtering = loader._next
+    for low_pass in (False, True, False):
+        filtering.low_pass = low_pass  # like dragging a slider
+
+    assert cache.pending == 2  # one per step, not one per change
+    assert not cache.directory.exists()
+
+    # Going back to a setting still pending is served from memory
+    hits = cache.hits
+    filtering.low_pass = False
+    assert cache.hits == hits + 2
+
+    cache.persist()
+    assert cache.pending == 0
+    assert len(list(cache.directory.glob("*.npy"))) == 2
+    assert fourier.provenance in cache and interpolate.provenance in cache
+
+
+def settle(scheduler: StepScheduler) -> None:
+    while scheduler.busy or scheduler.is_dirty:
+        scheduler.flush()
+        scheduler.wait(5.0)
+
+
+@pytest.mark.parametrize("gate_before", [True, False])
+def test_background_outputs_are_cached_with_the_settings_they_used(
+    cache, tmp_path, prospa_file, monkeypatch, gate_before
+):
+    path = prospa_file(4, 6, 8)
+    loader, filtering, fourier, interpolate = build_pipeline(cache)
+    scheduler = StepScheduler(loader, background=True)
+    with loader.unready():
+        loader.exclude_parameter_file = True
+        loader.data_path = str(path)
+    loader.load_data = True
+    settle(scheduler)
+    with fourier.unready():
+        fourier.should = True
+
+    # Hold the job in the filter, before or after it has read its settings
+    entered, gate = Event(), Event()
+    recalculate = filtering._recalculate
+
+    def gated(_input):
+        entered.set()
+        if gate_before:
+            assert gate.wait(5.0)
+        _output = recalculate(_input)
+        if not gate_before:
+            assert gate.wait(5.0)
+        return _output
+
+    monkeypatch.setattr(filtering, "_recalculate", gated)
+    filtering.low_pass = True
+    scheduler.flush()
+    assert entered.wait(5.0)
+    filtering.low_pass = False  # while the job is running
+    gate.set()
+    scheduler.wait(5.0)  # the job only sees it is stale once flushed again
+    settle(scheduler)
+    scheduler.detach()
+
+    # Whatever was cached has to match the settings it is found by
+    for low_pass in (True, False):
+        _, cached_fourier, _ = process(cache, path, low_pass)
+        _, fresh_fourier, _ = process(PipelineCache(tmp_path / "fresh"), path, low_pass)
+        assert np.array_equal(cached_fourier.data.voxel_data, fresh_fourier.data.voxel_data)
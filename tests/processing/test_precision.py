@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from pyMRI.processing import (
+    Precision,
+    InterpolateModes,
+    FileLoaderStep,
+    FilterStep,
+    FourierStep,
+    InterpolateStep,
+)
+
+
+def build_pipeline():
+    interpolate = InterpolateStep(None)
+    fourier = FourierStep(interpolate)
+    filtering = FilterStep(fourier)
+    loader = FileLoaderStep(filtering)
+    return loader, filtering, fourier, interpolate
+
+
+@pytest.mark.parametrize(
+    "precision, complex_type, real_type",
+    [
+        (Precision.SINGLE, np.complex64, np.float32),
+        (Precision.DOUBLE, np.complex128, np.float64),
+    ],
+)
+def test_precision_is_kept_through_the_pipeline(
+    prospa_file, precision, complex_type, real_type
+):
+    loader, filtering, fourier, interpolate = build_pipeline()
+    with loader.unready():
+        loader.exclude_parameter_file = True
+        loader.precision = precision
+        loader.data_path = str(prospa_file(4, 6, 8))
+    loader.load_data = True
+
+    # Loading a new file resets the later steps, so configure them afterwards
+    filtering.low_pass = True
+    filtering.high_pass = True
+    filtering.band_pass = True
+    fourier.should = True
+    interpolate.mode = InterpolateModes.DOUBLE
+
+    assert loader.data.voxel_data.dtype == complex_type
+    assert filtering.data.voxel_data.dtype == complex_type
+    assert fourier.data.voxel_data.dtype == real_type
+    assert interpolate.data.voxel_data.dtype == real_type
+    assert interpolate.data.voxel_counts == (8, 12, 16)
+
+
+def test_single_precision_matches_double(prospa_file):
+    path = str(prospa_file(4, 6, 8))
+    results = []
+    for precision in (Precision.SINGLE, Precision.DOUBLE):
+        loader, filtering, fourier, _ = build_pipeline()
+        with loader.unready():
+            loader.exclude_parameter_file = True
+            loader.precision = precision
+            loader.data_path = path
+        loader.load_data = True
+        filtering.low_pass = True
+        fourier.should = True
+        results.append(fourier.data.voxel_data)
+
+    single, double = results
+    assert np.allclose(single, double, rtol=1e-4, atol=1e-5 * np.max(double))
@@ -0,0 +1,345 @@
+from threading import Event, current_thread
+from typing import NamedTuple
+
+from pyMRI.processing import FileLoaderStep
+from pyMRI.processing.step import Step
+from pyMRI.processing.scheduler import StepScheduler
+
+
+class Value(NamedTuple):
+    value: int
+
+
+class AddStep(Step[Value, Value]):
+
+    def __init__(self, next_step: Step):
+        super().__init__(next_step)
+        with self.unready():
+            self.amount: int = 0
+            self.enabled: bool = True
+
+    def _recalculate(self, _input: Value) -> Value | None:
+        if not self.enabled:
+            return None
+        return Value((0 if _input is None else _input.value) + self.amount)
+
+
+def build_chain(length: int = 4) -> list[AddStep]:
+    steps = []
+    next_step = None
+    for _ in range(length):
+        next_step = AddStep(next_step)
+        steps.insert(0, next_step)
+    return steps
+
+
+def test_unscheduled_steps_update_immediately():
+    steps = build_chain()
+    steps[0].amount = 1
+    steps[0].amount = 2
+
+    assert steps[-1].data.value == 2
+    assert all(step.timing.calls == 2 for step in steps)
+
+
+def test_changes_are_coalesced_until_flush():
+    steps = build_chain()
+    scheduler = StepScheduler(steps[0])
+    steps[0].amount = 1
+    steps[2].amount = 10
+    steps[1].amount = 100
+    steps[2].amount = 1000
+
+    assert scheduler.is_dirty
+    assert not steps[-1].has_processed
+
+    scheduler.flush()
+
+    assert not scheduler.is_dirty
+    assert steps[-1].data.value == 1101
+    assert [step.timing.calls for step in steps] == [1, 1, 1, 1]
+    assert scheduler.last_flush_time > 0.0
+
+
+def test_flush_starts_from_earliest_dirty_step():
+    steps = build_chain()
+    scheduler = StepScheduler(steps[0])
+    steps[0].amount = 1
+    scheduler.flush()
+    scheduler.reset_timings()
+
+    steps[3].amount = 5
+    steps[2].amount = 5
+    scheduler.flush()
+
+    assert [step.timing.calls for step in steps] == [0, 0, 1, 1]
+    assert steps[-1].data.value == 11
+
+
+def test_dirty_steps_below_a_stalled_step_still_run():
+    steps = build_chain()
+    scheduler = StepScheduler(steps[0])
+    steps[0].amount = 1
+    scheduler.flush()
+    scheduler.reset_timings()
+
+    steps[1].enabled = False
+    steps[3].amount = 5
+    scheduler.flush()
+
+    assert [step.timing.calls for step in steps] == [0, 1, 0, 1]
+    assert steps[-1].data.value == 6
+
+
+def test_detach_flushes_and_restores_immediate_updates():
+    steps = build_chain()
+    scheduler = StepScheduler(steps[0])
+    steps[0].amount = 1
+    scheduler.detach()
+
+    assert steps[-1].data.value == 1
+    steps[0].amount = 2
+    assert steps[-1].data.value == 2
+
+
+class GatedStep(AddStep):
+    """Blocks in _recalculate until released, to hold a background job open."""
+
+    def __init__(self, next_step: Step):
+        super().__init__(next_step)
+        with self.unready():
+            self._gate = Event()
+
+    def _recalculate(self, _input: Value) -> Value | None:
+        assert self._gate.wait(5.0)
+        return super()._recalculate(_input)
+
+
+class MainThreadStep(AddStep):
+
+    @property
+    def requires_main_thread(self) -> bool:
+        return True
+
+    def _recalculate(self, _input: Value) -> Value | None:
+        with self.unready():
+            self._thread = current_thread()
+        return super()._recalculate(_input)
+
+
+def test_background_results_are_published_atomically():
+    tail = AddStep(None)
+    gated = GatedStep(tail)
+    head = AddStep(gated)
+    scheduler = StepScheduler(head, background=True)
+
+    head.amount = 1
+    tail.amount = 10
+    scheduler.flush()
+
+    assert scheduler.busy
+    assert not head.has_processed and not tail.has_processed
+
+    gated._gate.set()
+    scheduler.wait(5.0)
+    assert not head.has_processed  # finished, but not yet published
+
+    scheduler.flush()
+    assert not scheduler.busy
+    assert scheduler.progress == 1.0
+    assert (head.data.value, gated.data.value, tail.data.value) == (1, 1, 11)
+
+
+def test_newer_settings_supersede_running_jobs():
+    tail = AddStep(None)
+    gated = GatedStep(tail)
+    head = AddStep(gated)
+    scheduler = StepScheduler(head, background=True)
+
+    head.amount = 1
+    scheduler.flush()
+    tail.amount = 10
+    scheduler.flush()  # supersedes the first job, which is still running
+
+    gated._gate.set()
+    scheduler.wait(5.0)
+    scheduler.flush()
+    assert scheduler.busy and not tail.has_processed
+    scheduler.wait(5.0)
+    scheduler.flush()
+
+    assert tail.data.value == 11
+    # The stale job stopped after the gate, the new job carried on from there
+    assert [step.timing.calls for step in (head, gated, tail)] == [1, 1, 1]
+
+
+def test_jobs_superseded_before_starting_are_merged():
+    tail = AddStep(None)
+    slow = AddStep(tail)
+    head = AddStep(slow)
+    scheduler = StepScheduler(head, background=True)
+    with head.unready():
+        head.enabled = False  # like the loader without load_data
+
+    # Hold the worker so each job is still queued when the next supersedes it
+    gate = Event()
+    scheduler.run(gate.wait, 5.0)
+    slow.amount = 5
+    scheduler.flush()
+    head.amount = 1
+    scheduler.flush()
+    head.amount = 2
+    scheduler.flush()
+
+    gate.set()
+    while scheduler.busy or scheduler.is_dirty:
+        scheduler.wait(5.0)
+        scheduler.flush()
+    assert tail.data.value == 5
+    assert head.timing.calls == 1 and slow.timing.calls == 1
+
+
+class ThreadStep(AddStep):
+
+    def _recalculate(self, _input: Value) -> Value | None:
+        with self.unready():
+            self._thread = current_thread()
+        return super()._recalculate(_input)
+
+
+def test_main_thread_steps_run_when_published():
+    tail = ThreadStep(None)
+    bound = MainThreadStep(tail)
+    head = AddStep(bound)
+    scheduler = StepScheduler(head, background=True)
+
+    head.amount = 2
+    bound.amount = 3
+    scheduler.flush()
+    scheduler.wait(5.0)
+    scheduler.flush()
+
+    # Only the bound step ran on the main thread, the rest went back to the worker
+    assert bound._thread is current_thread()
+    assert scheduler.busy and not tail.has_processed
+    scheduler.wait(5.0)
+    scheduler.flush()
+    assert tail._thread is not current_thread()
+    assert tail.data.value == 5
+
+
+class OverridingStep(GatedStep):
+    """Overrides its own settings on the worker, like the file loader."""
+
+    def __init__(self, next_step: Step):
+        super().__init__(next_step)
+        with self.unready():
+            self._overriding = Event()
+
+    def _recalculate(self, _input: Value) -> Value | None:
+        with self.unready():
+            self._overriding.set()
+            self.enabled = True
+            assert self._gate.wait(5.0)
+        return AddStep._recalculate(self, _input)
+
+
+def test_settings_changed_while_the_worker_overrides_are_kept():
+    tail = AddStep(None)
+    overriding = OverridingStep(tail)
+    scheduler = StepScheduler(overriding, background=True)
+
+    overriding.amount = 1
+    scheduler.flush()
+    assert overriding._overriding.wait(5.0)
+    overriding.amount = 50  # made while the worker is inside unready
+    assert scheduler.is_dirty
+
+    overriding._gate.set()
+    scheduler.wait(5.0)
+    scheduler.flush()
+    scheduler.wait(5.0)
+    scheduler.flush()
+    assert tail.data.value == 50
+
+
+class LoadingStep(AddStep):
+    """Resets the steps below whenever it runs, like loading a new file."""
+
+    def _recalculate(self, _input: Value) -> Value | None:
+        self._reset_next()
+        return super()._recalculate(_input)
+
+
+class ResetStep(ThreadStep):
+
+    def _reset(self) -> None:
+        super()._reset()
+        self.amount = 0
+
+
+def test_resets_from_the_worker_happen_when_published():
+    tail = ResetStep(None)
+    head = LoadingStep(tail)
+    scheduler = StepScheduler(head, background=True)
+
+    head.amount = 1
+    tail.amount = 10
+    scheduler.flush()
+    scheduler.wait(5.0)
+    assert tail.amount == 10  # nothing below is touched from the worker
+
+    scheduler.flush()
+    assert tail.amount == 0 and not tail.has_processed
+    scheduler.wait(5.0)
+    scheduler.flush()
+    assert tail._thread is not current_thread()
+    assert tail.data.value == 1
+
+
+def test_run_calls_on_the_worker_only_in_background():
+    scheduler = StepScheduler(AddStep(None), background=True)
+    assert scheduler.run(current_thread).result(5.0) is not current_thread()
+
+    scheduler.background = False
+    assert scheduler.run(current_thread).result() is current_thread()
+    failed = scheduler.run(int, "not a number")
+    assert isinstance(failed.exception(), ValueError)
+
+
+def test_a_load_superseded_mid_job_is_still_published(prospa_file, monkeypatch):
+    loader = FileLoaderStep(None)
+    scheduler = StepScheduler(loader, background=True)
+    with loader.unready():
+        loader.exclude_parameter_file = True
+        loader.data_path = str(prospa_file(4, 6, 8))
+    loader.load_data = True
+    scheduler.flush()
+    scheduler.wait(5.0)
+    scheduler.flush()
+    assert loader.data.voxel_dimensions == (1.0, 1.0, 1.0)
+
+    # Hold the job once the loader has used up load_data
+    loading, gate = Event(), Event()
+    recalculate = loader._recalculate
+
+    def gated(_input):
+        _output = recalculate(_input)
+        loading.set()
+        assert gate.wait(5.0)
+        return _output
+
+    monkeypatch.setattr(loader, "_recalculate", gated)
+    loader.dimension_override = (2.0, 2.0, 2.0)
+    loader.load_data = True
+    scheduler.flush()
+    assert loading.wait(5.0)
+    loader.dimension_override = (2.0, 2.0, 2.0)  # rewritten mid-load
+    scheduler.flush()
+
+    gate.set()
+    while scheduler.busy or scheduler.is_dirty:
+        scheduler.wait(5.0)
+        scheduler.flush()
+    assert not loader.load_data
+    assert loader.data.voxel_dimensions == (2.0, 2.0, 2.0)
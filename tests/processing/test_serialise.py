@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from pyMRI.processing import (
+    FFTBackend,
+    FourierMode,
+    FourierNorm,
+    InterpolateModes,
+    Precision,
+    Unit,
+    FileLoaderStep,
+    ShiftStep,
+    FilterStep,
+    FourierStep,
+    ConvertStep,
+    ReorientStep,
+    InterpolateStep,
+    ColourStep,
+    CameraStep,
+)
+
+SETTINGS = [
+    (
+        FileLoaderStep,
+        {
+            "exclude_parameter_file": True,
+            "orient_override": "zyx",
+            "dimension_override": (1.0, 2.0, 3.0),
+            "unit_override": Unit.CM,
+            "memory_map": True,
+            "precision": Precision.DOUBLE,
+        },
+    ),
+    (ShiftStep, {"shifts": (1, -2, 3)}),
+    (
+        FilterStep,
+        {
+            "low_pass": True,
+            "band_pass": True,
+            "low_pass_radius": 4.0,
+            "band_pass_radius": 2.0,
+            "band_pass_target": 5.0,
+        },
+    ),
+    (
+        FourierStep,
+        {
+            "should": True,
+            "inverse": True,
+            "mode": FourierMode.TWO,
+            "norm": FourierNorm.ORTHOGRAPHIC,
+            "backend": FFTBackend.NUMPY,
+            "workers": 2,
+        },
+    ),
+    (ConvertStep, {"new_unit": Unit.ME}),
+    (ReorientStep, {"new_orientation": "yxz"}),
+    (InterpolateStep, {"cubify": True, "mode": InterpolateModes.TRIPLE}),
+    (ColourStep, {"density_scalar": 0.2, "emission_brightness": 3.0}),
+    (CameraStep, {}),
+]
+
+
+@pytest.mark.parametrize("step_type, settings", SETTINGS)
+def test_serialise_round_trips_through_json(step_type, settings):
+    step = step_type(None)
+    with step.unready():
+        for name, value in settings.items():
+            setattr(step, name, value)
+
+    config = json.loads(json.dumps(step.serialise()))
+    restored = step_type.deserialise(config)
+
+    assert restored.serialise() == step.serialise()
+    for name, value in settings.items():
+        assert getattr(restored, name) == value
+
+
+@pytest.mark.parametrize("step_type, settings", SETTINGS)
+def test_deserialise_defaults_missing_settings(step_type, settings):
+    assert step_type.deserialise({}).serialise() == step_type(None).serialise()
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from pyMRI.processing.chunked import ChunkedVolume
+from pyMRI.processing.statistics import (
+    PERCENTILES,
+    cached_statistics,
+    compute_statistics,
+    volume_statistics,
+)
+
+
+def random_volume(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(np.complex64)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_statistics_match_numpy(workers):
+    data = random_volume((12, 10, 9))
+    magnitude = np.abs(data)
+
+    statistics = compute_statistics(data, bins=64, workers=workers)
+
+    assert statistics.count == data.size
+    assert statistics.minimum == magnitude.min()
+    assert statistics.maximum == magnitude.max()
+    expected, _ = np.histogram(magnitude, 64, (0.0, magnitude.max()))
+    assert np.array_equal(statistics.histogram, expected)
+    # Read from the histogram, so only good to within a bin
+    for value, q in zip(statistics.percentiles, PERCENTILES):
+        assert value == pytest.approx(np.percentile(magnitude, q), abs=statistics.bin_width)
+
+
+def test_chunked_statistics_match_in_memory():
+    data = random_volume((12, 10, 9))
+    chunked = compute_statistics(ChunkedVolume.from_array(data, chunk=5))
+    in_memory = compute_statistics(data)
+
+    assert chunked._replace(histogram=None) == in_memory._replace(histogram=None)
+    assert np.array_equal(chunked.histogram, in_memory.histogram)
+
+
+def test_empty_and_zero_volumes():
+    zeros = compute_statistics(np.zeros((3, 4, 5), np.complex64), bins=8)
+    assert zeros.minimum == zeros.maximum == 0.0
+    assert zeros.histogram[0] == 60 and zeros.histogram[1:].sum() == 0
+    assert zeros.percentiles == (0.0,) * len(PERCENTILES)
+
+    empty = compute_statistics(np.zeros((0, 4, 5), np.complex64))
+    assert empty.count == 0 and empty.maximum == 0.0
+
+
+def test_statistics_are_cached_per_volume():
+    data = random_volume((6, 5, 4))
+    first = volume_statistics(data)
+    assert volume_statistics(data) is first
+
+    # An equal but different array is a different volume
+    assert volume_statistics(data.copy()) is not first
+    assert volume_statistics(data, bins=16) is not first
+
+
+def test_cached_statistics_never_scan():
+    data = random_volume((4, 4, 4), seed=3)
+    assert cached_statistics(data) is None
+    statistics = volume_statistics(data)
+    assert cached_statistics(data) is statistics
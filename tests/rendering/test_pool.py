@@ -0,0 +1,104 @@
+import numpy as np
+
+from pyMRI.rendering.pool import GpuPool, StagingPool
+from pyMRI.rendering.volume import VolumeFormat
+
+
+class FakeBuffer:
+
+    def __init__(self, reserve: int):
+        self.size = reserve
+        self.deleted = False
+
+    def delete(self):
+        self.deleted = True
+
+
+class FakeContext:
+
+    def buffer(self, reserve: int) -> FakeBuffer:
+        return FakeBuffer(reserve)
+
+
+class FakeTexture:
+
+    def __init__(self, size, volume_format):
+        self.size = size
+        self.nbytes = int(np.prod(size)) * VolumeFormat.to_dtype(volume_format).itemsize
+        self.deleted = False
+
+    def delete(self):
+        self.deleted = True
+
+
+def test_staging_reuses_the_largest_array():
+    pool = StagingPool()
+    large = pool.take("density", 1000, np.float32)
+    small = pool.take("density", 10, np.float32)
+    assert small.size == 10 and np.shares_memory(small, large)
+    assert pool.nbytes == 4000
+
+    # Slots don't share memory, and a new dtype replaces the slot's array
+    other = pool.take("level", 10, np.float32)
+    assert not np.shares_memory(other, large)
+    half = pool.take("density", 10, np.float16)
+    assert half.dtype == np.float16 and pool.take("density", 10, np.float16) is not half
+    assert np.shares_memory(pool.take("density", 10, np.float16), half)
+
+
+def test_staging_past_the_cap_is_not_kept():
+    pool = StagingPool(max_bytes=100)
+    kept = pool.take("a", 20, np.float32)
+    unkept = pool.take("b", 20, np.float32)
+    assert pool.nbytes == 80
+    assert not np.shares_memory(pool.take("b", 20, np.float32), unkept)
+    assert np.shares_memory(pool.take("a", 20, np.float32), kept)
+
+
+def test_buffers_only_grow():
+    pool = GpuPool(FakeContext())
+    first = pool.buffer("density", 100)
+    assert pool.buffer("density", 50) is first
+    larger = pool.buffer("density", 200)
+    assert larger is not first and first.deleted
+    # Flipping between the two sizes no longer touches the driver
+    for nbytes in (100, 200, 100, 200):
+        assert pool.buffer("density", nbytes) is larger
+    assert pool.allocations == 2
+
+
+def test_oversized_buffers_shrink_over_the_cap():
+    pool = GpuPool(FakeContext(), max_bytes=150)
+    big = pool.buffer("density", 200)
+    small = pool.buffer("density", 50)
+    assert small is not big and small.size == 50 and big.deleted
+
+
+def test_textures_are_kept_by_size_and_evicted_least_recent_first():
+    pool = GpuPool(FakeContext(), max_bytes=3 * 8**3, texture_factory=FakeTexture)
+    a = pool.texture((8, 8, 8), VolumeFormat.BYTE)
+    b = pool.texture((4, 8, 16), VolumeFormat.BYTE)
+    assert pool.texture((8, 8, 8), VolumeFormat.BYTE) is a
+    assert pool.texture((4, 8, 16), VolumeFormat.BYTE) is b
+    assert pool.allocations == 2
+
+    # a is the least recently used, b is still being drawn
+    c = pool.texture((16, 8, 8), VolumeFormat.BYTE)
+    assert a.deleted and not b.deleted and not c.deleted
+
+    # Even when the texture being drawn is over the cap it is never freed
+    d = pool.texture((16, 16, 16), VolumeFormat.HALF)
+    assert not d.deleted and b.deleted and c.deleted
+
+    pool.release_textures()
+    assert d.deleted and pool.nbytes == 0
+
+
+def test_slots_never_share_a_texture():
+    pool = GpuPool(FakeContext(), max_bytes=8**3, texture_factory=FakeTexture)
+    front = pool.texture((8, 8, 8), VolumeFormat.BYTE, slot=0)
+    back = pool.texture((8, 8, 8), VolumeFormat.BYTE, slot=1)
+    assert back is not front
+    # Over the cap, but both are in use
+    assert not front.deleted and not back.deleted
+    assert pool.texture((8, 8, 8), VolumeFormat.BYTE, slot=0) is front
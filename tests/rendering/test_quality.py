@@ -0,0 +1,61 @@
+from pyMRI.rendering.quality import RayBudget, RayLimits, RenderScale
+
+
+def test_moving_uses_the_cheaper_budget():
+    budget = RayBudget(max_steps=1024, min_transmission=0.01, moving_max_steps=128, moving_min_transmission=0.1)
+
+    assert budget.update(moving=False) == RayLimits(1024, 0.01)
+    assert budget.update(moving=True) == RayLimits(128, 0.1)
+    assert not budget.converged
+
+
+def test_budget_converges_after_the_camera_stops():
+    budget = RayBudget(max_steps=1024, min_transmission=0.01, moving_max_steps=128, moving_min_transmission=0.1)
+    budget.update(moving=True)
+
+    steps = [budget.update(moving=False).max_steps for _ in range(4)]
+
+    assert steps == [256, 512, 1024, 1024]
+    assert budget.update(moving=False) == RayLimits(1024, 0.01)
+    assert budget.converged
+
+
+def test_without_progressive_refinement_the_full_budget_is_always_used():
+    budget = RayBudget(max_steps=1024, min_transmission=0.01, progressive=False)
+
+    assert budget.update(moving=True) == RayLimits(1024, 0.01)
+    assert budget.converged
+
+
+def test_moving_budget_never_exceeds_the_full_budget():
+    budget = RayBudget(max_steps=64, moving_max_steps=256)
+
+    assert budget.update(moving=True) == budget.full
+
+
+def test_fixed_scale_ignores_frame_time():
+    scale = RenderScale(0.5)
+
+    assert scale.update(1.0) == 0.5
+    assert scale.resolution((1920, 1080)) == (960, 540)
+
+
+def test_dynamic_scale_drops_for_slow_frames_and_recovers():
+    scale = RenderScale(1.0, dynamic=True, target_frame_time=1 / 60, min_scale=0.25)
+
+    # Four times too slow wants half the pixels along each axis
+    assert scale.update(4 / 60) == 0.5
+    assert scale.update(1 / 60 * 1.1) == 0.5
+
+    rising = [scale.update(1 / 120) for _ in range(40)]
+    assert rising == sorted(rising)
+    assert rising[-1] == 1.0
+
+
+def test_dynamic_scale_is_clamped():
+    scale = RenderScale(0.3, dynamic=True, min_scale=0.25)
+
+    for _ in range(10):
+        scale.update(1.0)
+    assert scale.scale == 0.25
+    assert scale.resolution((3, 3)) == (1, 1)
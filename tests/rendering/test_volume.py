@@ -0,0 +1,382 @@
+from struct import pack, unpack
+
+import numpy as np
+import pytest
+
+from pyMRI.processing import ORIENTATION_MAP, RenderData, Unit
+from pyMRI.rendering.volume import (
+    HEADER_SIZE,
+    VolumeFormat,
+    pack_header,
+    orient_volume,
+    normalised_density,
+    quantise_density,
+    diff_render_data,
+    RenderChanges,
+    brick_grid,
+    pack_bricks,
+    BRICK_HEADER_FORMAT,
+    BRICK_HEADER_SIZE,
+    Reduction,
+    downsample,
+    build_pyramid,
+    pyramid_shapes,
+    stream_pyramid,
+    pick_level,
+    SliceUpload,
+    prepare_volume,
+)
+from pyMRI.processing.chunked import ChunkedVolume
+from pyMRI.processing.statistics import compute_statistics
+
+
+def reference_pack(voxel_data, orientation, voxel_dimensions) -> bytes:
+    """The original struct.pack(*list) buffer pack_header and normalised_density replace."""
+    orientation_shape = lx, ly, lz = ORIENTATION_MAP[orientation]
+    ix = 0 if lx == "i" else 1 if lx == "j" else 2
+    iy = 0 if ly == "i" else 1 if ly == "j" else 2
+    iz = 0 if lz == "i" else 1 if lz == "j" else 2
+
+    transposed = np.einsum(f"ijk...->{orientation_shape}...", voxel_data)
+    magnitude = np.abs(transposed)
+    linear_data = np.reshape(magnitude, -1, "F")
+    linear_data = linear_data / np.max(linear_data)
+    return pack(
+        f"i i i f f f {len(linear_data)}f",
+        *transposed.shape,
+        voxel_dimensions[ix],
+        voxel_dimensions[iy],
+        voxel_dimensions[iz],
+        *linear_data,
+    )
+
+
+@pytest.mark.parametrize("orientation", ["xyz", "zyx", "yzx", "xzy"])
+@pytest.mark.parametrize("dtype", [np.complex64, np.complex128, np.float32])
+def test_header_and_density_match_struct_pack(orientation, dtype):
+    rng = np.random.default_rng(0)
+    voxel_data = (rng.standard_normal((3, 5, 7)) + 1j * rng.standard_normal((3, 5, 7)))
+    voxel_data = voxel_data.astype(dtype) if dtype != np.float32 else np.abs(voxel_data).astype(dtype)
+
+    volume, sizes = orient_volume(voxel_data, orientation, (1.0, 2.0, 3.0))
+    header = pack_header(volume.shape, sizes)
+    linear_data = normalised_density(volume)
+
+    assert len(header) == HEADER_SIZE
+    assert linear_data.dtype == np.float32
+    assert linear_data.flags.c_contiguous and linear_data.flags.writeable
+
+    expected = reference_pack(voxel_data, orientation, (1.0, 2.0, 3.0))
+    packed = header + linear_data.tobytes()
+    assert packed[:HEADER_SIZE] == expected[:HEADER_SIZE]
+    assert np.allclose(
+        np.frombuffer(packed[HEADER_SIZE:], np.float32),
+        np.frombuffer(expected[HEADER_SIZE:], np.float32),
+        rtol=1e-6,
+    )
+
+
+def test_normalised_density_accepts_read_only_and_empty_volumes():
+    voxel_data = np.zeros((2, 2, 2), np.float32)
+    voxel_data.flags.writeable = False
+
+    volume, _ = orient_volume(voxel_data, "xyz", (1.0, 1.0, 1.0))
+    linear_data = normalised_density(volume)
+    assert linear_data.flags.writeable
+    assert not np.shares_memory(linear_data, voxel_data)
+    assert np.array_equal(linear_data, np.zeros(8, np.float32))
+
+
+@pytest.mark.parametrize(
+    "volume_format, tolerance",
+    [
+        (VolumeFormat.BUFFER, 0.0),
+        (VolumeFormat.HALF, 2.0**-11),
+        (VolumeFormat.BYTE, 0.5 / 255.0),
+    ],
+)
+def test_quantised_density_is_within_a_step(volume_format, tolerance):
+    linear_data = np.random.default_rng(0).random(1000, np.float32)
+    linear_data[:2] = 0.0, 1.0
+
+    quantised = quantise_density(linear_data, volume_format)
+
+    assert quantised.dtype == VolumeFormat.to_dtype(volume_format)
+    assert quantised.nbytes == linear_data.size * quantised.itemsize
+    restored = quantised.astype(np.float32)
+    if volume_format == VolumeFormat.BYTE:
+        restored /= 255.0
+    assert np.max(np.abs(restored - linear_data)) <= tolerance + 1e-7
+    assert restored[0] == 0.0 and restored[1] == 1.0
+
+
+@pytest.mark.parametrize("volume_format", list(VolumeFormat))
+def test_quantised_volume_is_x_fastest(volume_format):
+    rng = np.random.default_rng(1)
+    voxel_data = rng.random((3, 4, 5)).astype(np.float32)
+
+    volume, _ = orient_volume(voxel_data, "zyx", (1.0, 1.0, 1.0))
+    density = normalised_density(volume)
+    texels = quantise_density(density, volume_format)
+    x_count, y_count, z_count = volume.shape
+
+    # glTexImage3D reads rows of x, then y, then z slices
+    assert np.allclose(
+        density.reshape(z_count, y_count, x_count),
+        (volume / volume.max()).transpose(2, 1, 0),
+    )
+    assert texels.shape == density.shape
+    assert texels[3 + x_count * (2 + y_count * 1)] == quantise_density(
+        density[3 + x_count * (2 + y_count * 1) :][:1], volume_format
+    )[0]
+
+
+def render_data(voxel_data, **changes) -> RenderData:
+    data = RenderData(None, 0.05, 1.0, "xyz", (1.0, 2.0, 3.0), Unit.MM, voxel_data.shape, voxel_data)
+    return data._replace(**changes)
+
+
+def test_diff_render_data_only_flags_what_changed():
+    voxel_data = np.ones((2, 3, 4), np.float32)
+    previous = render_data(voxel_data)
+
+    assert diff_render_data(None, previous) == RenderChanges(True, True, True)
+    assert diff_render_data(previous, render_data(voxel_data)) == RenderChanges(False, False, False)
+    assert diff_render_data(
+        previous, render_data(voxel_data, density_scalar=0.1, emission_brightness=2.0)
+    ) == RenderChanges(True, False, False)
+    assert diff_render_data(
+        previous, render_data(voxel_data, voxel_dimensions=(2.0, 2.0, 2.0))
+    ) == RenderChanges(False, True, False)
+    assert diff_render_data(
+        previous, render_data(voxel_data, orientation="zyx")
+    ) == RenderChanges(False, False, True)
+
+
+def test_diff_render_data_compares_voxels_by_identity():
+    voxel_data = np.ones((2, 3, 4), np.float32)
+    previous = render_data(voxel_data)
+
+    assert diff_render_data(previous, render_data(voxel_data.copy())).payload
+
+
+def reference_brick_grid(volume, brick_size):
+    shape = [-(-count // brick_size) for count in volume.shape]
+    grid = np.zeros(shape, volume.dtype)
+    for bx, by, bz in np.ndindex(*shape):
+        grid[bx, by, bz] = volume[
+            bx * brick_size : (bx + 1) * brick_size,
+            by * brick_size : (by + 1) * brick_size,
+            bz * brick_size : (bz + 1) * brick_size,
+        ].max()
+    return grid
+
+
+@pytest.mark.parametrize("shape", [(8, 8, 8), (9, 5, 17), (1, 12, 3)])
+@pytest.mark.parametrize("brick_size", [1, 4, 8])
+def test_brick_grid_matches_per_brick_max(shape, brick_size):
+    volume = np.random.default_rng(0).random(shape, np.float32)
+
+    grid = brick_grid(volume, brick_size)
+
+    assert np.array_equal(grid, reference_brick_grid(volume, brick_size))
+
+
+def test_brick_grid_marks_only_occupied_bricks():
+    volume = np.zeros((16, 16, 16), np.float32)
+    volume[5, 9, 14] = 0.5
+
+    grid = brick_grid(volume, 4)
+
+    assert grid.shape == (4, 4, 4)
+    assert np.count_nonzero(grid) == 1
+    assert grid[1, 2, 3] == 0.5
+
+
+def test_pack_bricks_is_x_fastest():
+    counts = (6, 4, 2)
+    volume = np.random.default_rng(2).random(counts, np.float32)
+
+    header, brick_max = pack_bricks(np.ravel(volume, "F"), counts, 2)
+
+    assert len(header) == BRICK_HEADER_SIZE
+    assert unpack(BRICK_HEADER_FORMAT, header) == (3, 2, 1, 2)
+    assert brick_max.dtype == np.float32
+    assert np.array_equal(brick_max.reshape(1, 2, 3), brick_grid(volume, 2).transpose(2, 1, 0))
+
+
+def reference_downsample(volume, reduction):
+    shape = [-(-count // 2) for count in volume.shape]
+    reduce = np.max if reduction == Reduction.MAX else np.mean
+    result = np.zeros(shape, volume.dtype)
+    for x, y, z in np.ndindex(*shape):
+        result[x, y, z] = reduce(volume[2 * x : 2 * x + 2, 2 * y : 2 * y + 2, 2 * z : 2 * z + 2])
+    return result
+
+
+@pytest.mark.parametrize("reduction", list(Reduction))
+@pytest.mark.parametrize("shape", [(8, 8, 8), (7, 4, 5), (1, 6, 3)])
+def test_downsample_matches_per_block_reduction(reduction, shape):
+    volume = np.random.default_rng(3).random(shape, np.float32)
+
+    result = downsample(volume, reduction)
+
+    assert result.dtype == np.float32
+    assert np.allclose(result, reference_downsample(volume, reduction))
+
+
+@pytest.mark.parametrize("reduction", list(Reduction))
+def test_pyramid_halves_down_to_a_single_voxel(reduction):
+    volume = np.random.default_rng(4).random((16, 9, 4), np.float32)
+
+    levels = build_pyramid(volume, reduction)
+
+    assert levels[0] is volume
+    assert [level.shape for level in levels] == [
+        (16, 9, 4), (8, 5, 2), (4, 3, 1), (2, 2, 1), (1, 1, 1)
+    ]
+    top = volume.max() if reduction == Reduction.MAX else None
+    if top is not None:
+        assert levels[-1][0, 0, 0] == top
+
+
+def test_pyramid_shapes_match_build_pyramid():
+    volume = np.zeros((16, 9, 4), np.float32)
+    assert pyramid_shapes(volume.shape) == [
+        level.shape for level in build_pyramid(volume, Reduction.MAX)
+    ]
+
+
+@pytest.mark.parametrize("reduction", list(Reduction))
+@pytest.mark.parametrize("orientation", ["xyz", "zyx", "yxz"])
+@pytest.mark.parametrize("max_bytes", [2**20, 13 * 5 * 6 * 4 - 1, 64])
+def test_stream_pyramid_matches_in_memory(reduction, orientation, max_bytes):
+    rng = np.random.default_rng(5)
+    data = (rng.standard_normal((13, 10, 12)) + 1j * rng.standard_normal((13, 10, 12)))
+    data = data.astype(np.complex64)
+
+    volume, _ = orient_volume(data, orientation, (1.0, 1.0, 1.0))
+    expected = build_pyramid(
+        normalised_density(volume).reshape(volume.shape, order="F"), reduction
+    )
+    chunked = ChunkedVolume.from_array(data, chunk=3)
+    levels = stream_pyramid(chunked, orientation, reduction, max_bytes)
+
+    assert len(levels) == len(expected)
+    first = next(index for index, level in enumerate(levels) if level is not None)
+    assert np.prod(levels[first].shape) * 4 <= max_bytes or first == len(levels) - 1
+    assert all(level is None for level in levels[:first])
+    for level, reference in zip(levels[first:], expected[first:]):
+        assert level.shape == reference.shape
+        assert np.allclose(level, reference, rtol=1e-6, atol=1e-7)
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_prepare_volume_lays_every_level_out_for_upload(chunked):
+    rng = np.random.default_rng(6)
+    voxel_data = (rng.standard_normal((9, 6, 5)) + 1j * rng.standard_normal((9, 6, 5)))
+    voxel_data = voxel_data.astype(np.complex64)
+    volume, _ = orient_volume(voxel_data, "zxy", (1.0, 1.0, 1.0))
+    expected = build_pyramid(
+        normalised_density(volume).reshape(volume.shape, order="F"), Reduction.MEAN
+    )
+    if chunked:
+        voxel_data = ChunkedVolume.from_array(voxel_data, chunk=2)
+
+    staging = np.empty(voxel_data.size, np.float32)
+    prepared = prepare_volume(
+        render_data(voxel_data, orientation="zxy"), Reduction.MEAN, 2**20, 4, out=staging
+    )
+
+    assert prepared.first_level == 0 and prepared.brick_size == 4
+    assert prepared.shapes == [level.shape for level in expected]
+    for index, (level, reference) in enumerate(zip(prepared.levels, expected)):
+        assert level.ndim == 1 and level.flags.c_contiguous
+        assert np.allclose(level, np.ravel(reference, "F"), rtol=1e-6, atol=1e-7)
+        header, brick_max = prepared.bricks[index]
+        expected_header, expected_max = pack_bricks(level, reference.shape, 4)
+        assert header == expected_header and np.array_equal(brick_max, expected_max)
+    # The full resolution level is the staging buffer itself, not a copy
+    assert np.shares_memory(prepared.levels[0], staging) != chunked
+
+
+def test_pick_level_fits_the_memory_budget():
+    shapes = [(64, 64, 64), (32, 32, 32), (16, 16, 16), (8, 8, 8)]
+
+    assert pick_level(shapes, 4, 64**3 * 4) == 0
+    assert pick_level(shapes, 4, 64**3 * 4 - 1) == 1
+    assert pick_level(shapes, 1, 64**3) == 0
+    assert pick_level(shapes, 4, 1) == 3
+
+
+def test_pick_level_drops_detail_with_distance():
+    shapes = [(64, 64, 64), (32, 32, 32), (16, 16, 16), (8, 8, 8)]
+
+    assert pick_level(shapes, 4, 2**30, distance=1.9, extent=1.0) == 0
+    assert pick_level(shapes, 4, 2**30, distance=3.0, extent=1.0) == 1
+    assert pick_level(shapes, 4, 2**30, distance=5.0, extent=1.0) == 2
+    assert pick_level(shapes, 4, 2**30, distance=100.0, extent=1.0) == 3
+    assert pick_level(shapes, 4, 2**30, distance=100.0, extent=1.0, lod_distance=0.0) == 0
+
+
+def test_normalised_density_with_a_known_peak():
+    data = np.random.default_rng(6).standard_normal((5, 6, 7)).astype(np.complex64)
+    peak = compute_statistics(data).maximum
+    assert np.allclose(normalised_density(data, peak), normalised_density(data), rtol=1e-6)
+    assert normalised_density(data, peak).max() == pytest.approx(1.0)
+
+
+def test_orient_volume_is_a_view():
+    data = np.zeros((3, 4, 5), np.complex64)
+    for orientation in ("xyz", "zyx", "yzx", "x"):
+        volume, _ = orient_volume(data, orientation, (1.0, 1.0, 1.0))
+        assert np.shares_memory(volume, data)
+        expected = np.einsum(f"ijk->{ORIENTATION_MAP[orientation]}", data)
+        assert volume.shape == expected.shape and volume.strides == expected.strides
+
+
+@pytest.mark.parametrize("dtype", [np.complex64, np.complex128, np.float32])
+def test_normalised_density_reuses_a_staging_buffer(dtype):
+    rng = np.random.default_rng(7)
+    data = rng.standard_normal((4, 5, 6)).astype(dtype)
+    staging = np.empty(data.size + 10, np.float32)
+
+    for orientation in ("xyz", "zyx", "yxz"):
+        volume, _ = orient_volume(data, orientation, (1.0, 1.0, 1.0))
+        density = normalised_density(volume, out=staging)
+
+        assert np.shares_memory(density, staging)
+        expected = np.reshape(np.abs(volume).astype(np.float32), -1, "F")
+        assert np.allclose(density, expected / expected.max())
+
+
+@pytest.mark.parametrize("volume_format", list(VolumeFormat))
+def test_quantise_density_into_reused_arrays(volume_format):
+    linear = np.random.default_rng(8).random(100, np.float32)
+    dtype = VolumeFormat.to_dtype(volume_format)
+    out = np.empty(150, dtype)
+    scratch = np.empty(150, np.float32)
+
+    quantised = quantise_density(linear, volume_format, out, scratch)
+    assert np.array_equal(quantised, quantise_density(linear, volume_format))
+    if volume_format != VolumeFormat.BUFFER:
+        assert np.shares_memory(quantised, out)
+
+
+def test_slice_upload_covers_every_plane_within_the_budget():
+    upload = SliceUpload(2, (4, 5, 7), 4)
+    assert upload.plane_size == 20 and upload.plane_bytes == 80
+    assert upload.remaining_bytes == 7 * 80
+
+    slices = []
+    while not upload.done:
+        slices.append(upload.take(200))
+    assert slices == [(0, 2), (2, 4), (4, 6), (6, 7)]
+    assert upload.remaining_bytes == 0
+
+
+def test_slice_upload_always_progresses():
+    upload = SliceUpload(0, (64, 64, 3), 2)
+    assert upload.take(1) == (0, 1)
+    assert upload.take(0) == (1, 3)
+    assert upload.done
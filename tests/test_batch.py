@@ -0,0 +1,129 @@
+import json
+
+import numpy as np
+import pytest
+
+from pyMRI.batch import find_scans, run_batch, save_result
+from pyMRI.config import BatchConfig, configure
+from pyMRI.processing import (
+    FileData,
+    Unit,
+    InterpolateModes,
+    FileLoaderStep,
+    ShiftStep,
+    FilterStep,
+    FourierStep,
+    ConvertStep,
+    ReorientStep,
+    InterpolateStep,
+)
+from pyMRI.processing.chunked import ChunkedVolume
+
+PARAMETERS = """orient = "XYZ"
+FOVr = 16
+FOVp1 = 0
+FOVp2 = 0
+Nread = {width}
+Nphase1 = {height}
+Nphase2 = {count}
+"""
+
+SETTINGS = {
+    "filter": {"low_pass": True, "low_pass_radius": 3.0},
+    "fourier": {"should": True},
+    "interpolate": {"mode": "DOUBLE"},
+}
+
+
+@pytest.fixture
+def scan_directory(tmp_path, prospa_file):
+    for idx, name in enumerate(("first", "second")):
+        prospa_file(4, 6, 8, name=f"{name}.3d", seed=idx)
+        (tmp_path / f"{name}.par").write_text(PARAMETERS.format(width=8, height=6, count=4))
+    (tmp_path / "notes.txt").write_text("not a scan")
+
+    settings = tmp_path / "settings.json"
+    settings.write_text(json.dumps(SETTINGS))
+    return tmp_path
+
+
+def process(data_path, parameter_path) -> FileData:
+    """Work through SETTINGS on a chain built by hand, as in the GUI."""
+    interpolate = InterpolateStep(None)
+    fourier = FourierStep(ShiftStep(ConvertStep(ReorientStep(interpolate))))
+    filtering = FilterStep(fourier)
+    loader = FileLoaderStep(ShiftStep(filtering))
+
+    # Opening a data file forgets the parameter file so load them one by one
+    with loader.unready():
+        loader.data_path = str(data_path)
+        loader.exclude_parameter_file = True
+    loader.load_data = True
+    with loader.unready():
+        loader.exclude_parameter_file = False
+        loader.parameter_path = str(parameter_path)
+    loader.load_data = True
+
+    # Each setting updates the chain, so set the last first to only run once
+    with interpolate.unready():
+        interpolate.mode = InterpolateModes.DOUBLE
+    with fourier.unready():
+        fourier.should = True
+    with filtering.unready():
+        filtering.low_pass_radius = 3.0
+    filtering.low_pass = True
+    return interpolate.data
+
+
+def test_configure_parses_batch_command(tmp_path):
+    config = configure("batch", "settings.json", str(tmp_path), "--jobs", "3")
+
+    assert isinstance(config, BatchConfig)
+    assert config.output_directory == tmp_path / "processed"
+    assert config.jobs == 3
+
+
+def test_find_scans_pairs_data_and_parameter_files(scan_directory):
+    scans = find_scans(scan_directory)
+
+    assert [(data.name, par.name) for data, par in scans] == [
+        ("first.3d", "first.par"),
+        ("second.3d", "second.par"),
+    ]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_batch_matches_processing_each_scan_directly(scan_directory, jobs):
+    output = scan_directory / "out"
+    failed = run_batch(
+        BatchConfig(scan_directory / "settings.json", scan_directory, output, jobs)
+    )
+    assert failed == 0
+
+    for name in ("first", "second"):
+        expected = process(scan_directory / f"{name}.3d", scan_directory / f"{name}.par")
+        assert expected.voxel_counts == (8, 12, 16)
+
+        result = np.load(output / f"{name}.npz")
+        assert tuple(result["voxel_counts"]) == expected.voxel_counts
+        assert str(result["orientation"]) == expected.orientation
+        assert np.allclose(result["voxel_data"], expected.voxel_data)
+
+
+def test_chunked_results_are_streamed_into_the_archive(tmp_path):
+    rng = np.random.default_rng(2)
+    voxel_data = (rng.standard_normal((7, 4, 5)) + 1j * rng.standard_normal((7, 4, 5)))
+    voxel_data = voxel_data.astype(np.complex64)
+    result = FileData("xyz", (1.0, 2.0, 3.0), Unit.MM, voxel_data.shape, voxel_data)
+
+    save_result(tmp_path / "array.npz", result)
+    save_result(
+        tmp_path / "chunked.npz",
+        result._replace(voxel_data=ChunkedVolume.from_array(voxel_data, chunk=2)),
+    )
+
+    for name in ("array", "chunked"):
+        saved = np.load(tmp_path / f"{name}.npz")
+        assert np.array_equal(saved["voxel_data"], voxel_data)
+        assert str(saved["orientation"]) == "xyz" and str(saved["voxel_unit"]) == "MM"
+        assert tuple(saved["voxel_counts"]) == voxel_data.shape
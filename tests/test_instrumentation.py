@@ -0,0 +1,81 @@
+import csv
+
+import numpy as np
+import pytest
+
+from pyMRI.instrumentation import Instruments, TimingRing, PERCENTILES, INSTRUMENTS
+from pyMRI.processing import FileData, Unit
+from pyMRI.processing.adjust import ConvertStep
+from pyMRI.processing.fourier import ShiftStep
+
+
+def test_ring_keeps_the_latest_samples_oldest_first():
+    ring = TimingRing(4)
+    for seconds in range(3):
+        ring.append(seconds)
+    assert ring.samples().tolist() == [0, 1, 2]
+
+    for seconds in range(3, 7):
+        ring.append(seconds)
+    assert ring.samples().tolist() == [3, 4, 5, 6]
+    assert ring.count == 4 and ring.total == 7
+
+
+def test_summary_is_of_the_held_samples_only():
+    instruments = Instruments(ring_size=100)
+    for _ in range(100):
+        instruments.record("draw", 1.0)  # all pushed out below
+    for seconds in np.linspace(0.0, 0.099, 100):
+        instruments.record("draw", seconds)
+
+    (summary,) = instruments.summaries()
+    assert summary.name == "draw" and summary.count == 100 and summary.total == 200
+    assert summary.maximum == pytest.approx(0.099)
+    expected = np.percentile(np.linspace(0.0, 0.099, 100), PERCENTILES)
+    assert summary.percentiles == pytest.approx(tuple(expected))
+
+
+def test_time_records_even_when_the_block_raises():
+    instruments = Instruments()
+    with pytest.raises(RuntimeError):
+        with instruments.time("fails"):
+            raise RuntimeError
+    assert instruments.samples("fails").size == 1
+
+    instruments.enabled = False
+    with instruments.time("off"):
+        pass
+    assert instruments.names == ("fails",)
+
+
+def test_export_csv(tmp_path):
+    instruments = Instruments()
+    instruments.record("cpu/frame", 0.016)
+    instruments.record("gpu/volume", 0.004)
+    path = instruments.export_csv(tmp_path / "timings.csv")
+
+    with path.open() as f:
+        header, *rows = csv.reader(f)
+    assert header[:4] == ["channel", "count", "total", "mean_ms"]
+    assert [row[0] for row in rows] == ["cpu/frame", "gpu/volume"]
+    assert float(rows[0][header.index("max_ms")]) == pytest.approx(16.0)
+
+
+def test_steps_record_each_calculation():
+    INSTRUMENTS.reset()
+    step = ConvertStep(None)
+    data = FileData("XYZ", (1.0, 1.0, 1.0), Unit.MM, (2, 2, 2), np.zeros((2, 2, 2)))
+    step.update(data)
+    step.update(data)
+    assert INSTRUMENTS.samples("step/ConvertStep").size == 2
+
+
+def test_steps_of_the_same_type_record_to_their_own_channel():
+    INSTRUMENTS.reset()
+    post_shift = ShiftStep(None).named("post_shift")
+    pre_shift = ShiftStep(post_shift).named("pre_shift")
+    data = FileData("XYZ", (1.0, 1.0, 1.0), Unit.MM, (2, 2, 2), np.zeros((2, 2, 2)))
+    pre_shift.update(data)
+    assert INSTRUMENTS.samples("step/pre_shift").size == 1
+    assert INSTRUMENTS.samples("step/post_shift").size == 1
+    assert "step/ShiftStep" not in INSTRUMENTS.names